@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+""" Compare the shared memory ring buffer with multiprocessing.Queue
+
+    usage: PYTHONPATH=. python benchmarks/bench_shm.py [count]
+"""
+
+import multiprocessing
+import sys
+import time
+
+from fpack import Bytes, Message, String, Uint64, field_factory
+from fpack.shm import RingBuffer
+
+BATCH = 32
+
+
+class Tick(Message):
+    Fields = [
+        field_factory("Seq", Uint64),
+        field_factory("Symbol", String),
+        field_factory("Payload", Bytes),
+    ]
+
+
+def make_tick(i):
+    return Tick(Seq=i, Symbol="AAPL", Payload=b"x" * 64)
+
+
+def ring_producer(name, count, batch):
+    with RingBuffer(Tick, name=name, create=False) as ring:
+        if batch == 1:
+            for i in range(count):
+                ring.send(make_tick(i))
+            return
+
+        for i in range(0, count, batch):
+            ring.send_batch([make_tick(j) for j in range(i, min(i + batch, count))])
+
+
+def queue_producer(queue, count):
+    for i in range(count):
+        queue.put(make_tick(i).pack())
+
+
+def bench_ring(count, batch):
+    ring = RingBuffer(Tick, slots=1024, slot_size=BATCH * 128)
+    process = multiprocessing.Process(
+        target=ring_producer, args=(ring.name, count, batch)
+    )
+
+    start = time.perf_counter()
+    process.start()
+
+    received = 0
+    while received < count:
+        received += len(ring.recv_batch())
+
+    elapsed = time.perf_counter() - start
+    process.join()
+    ring.close()
+    ring.unlink()
+
+    return elapsed
+
+
+def bench_queue(count):
+    queue = multiprocessing.Queue(maxsize=1024)
+    process = multiprocessing.Process(target=queue_producer, args=(queue, count))
+
+    start = time.perf_counter()
+    process.start()
+
+    for _ in range(count):
+        Tick.from_bytes(queue.get())
+
+    elapsed = time.perf_counter() - start
+    process.join()
+
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    for label, elapsed in (
+        ("multiprocessing.Queue", bench_queue(count)),
+        ("RingBuffer", bench_ring(count, 1)),
+        (f"RingBuffer (batch={BATCH})", bench_ring(count, BATCH)),
+    ):
+        print(f"{label:28} {count / elapsed:12.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
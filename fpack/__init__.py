@@ -3,6 +3,11 @@
 
 from fpack.fields import *
 from fpack.msg import *
+from fpack.delta import *
+from fpack.columnar import *
+from fpack.stream import *
+from fpack.profiling import *
+from fpack import stats
 
 __version__ = "1.0.3"
 __author__ = "Frank Chang"
@@ -10,6 +15,7 @@ __author_email__ = "frank@csie.io"
 __license__ = "BSD"
 __all__ = [
     "Field",
+    "DecodeLimits",
     "Uint8",
     "Uint16",
     "Uint32",
@@ -18,10 +24,27 @@ __all__ = [
     "Int16",
     "Int32",
     "Int64",
+    "Float",
+    "Double",
     "Bytes",
     "String",
+    "FixedBytes",
+    "FixedString",
     "Array",
+    "Optional",
     "field_factory",
     "array_field_factory",
+    "fixed_array_field_factory",
+    "fixed_bytes_field_factory",
+    "fixed_string_field_factory",
+    "optional_field_factory",
+    "with_byte_order",
     "Message",
+    "DeltaEncoder",
+    "DeltaDecoder",
+    "unpack_columns",
+    "pack_columns",
+    "read_message",
+    "profile",
+    "format_profile",
 ]
@@ -0,0 +1,453 @@
+#!/usr/bin/env python
+
+""" fpack columnar array codec
+
+    Decode array fields into per-field columns, and encode columns back into
+    array fields, without creating a field or message object per element.
+
+    Primitive fields become `array.array` columns. `String` and `Bytes` fields
+    become lists, or an `(offsets, buffer)` pair where the i-th value is
+    `buffer[offsets[i]:offsets[i + 1]]`. Nested messages become nested dicts
+    of columns and nested arrays a list of per-row columns.
+"""
+
+from array import array
+
+from fpack.fields import Array, Bytes, FixedBytes, Primitive, String
+from fpack.msg import Message
+from fpack.utils import bitmap_size, pack_bitmap, unpack_bitmap
+
+_TYPECODES = {
+    "b": "b",
+    "B": "B",
+    "h": "h",
+    "H": "H",
+    "i": "i",
+    "I": "I",
+    "q": "q",
+    "Q": "Q",
+    "f": "f",
+    "d": "d",
+}
+
+
+class _Column:
+    def read_rows(self, data, offset, count):
+        for _ in range(count):
+            offset = self.read(data, offset)
+
+        return offset
+
+    def write_rows(self, out, count):
+        for i in range(count):
+            self.write(out, i)
+
+
+class _PrimitiveColumn(_Column):
+    def __init__(self, field_cls):
+        self.struct = field_cls.STRUCT
+        self.values = array(_TYPECODES[self.struct.format[-1]])
+
+    def read(self, data, offset):
+        self.values.append(self.struct.unpack_from(data, offset)[0])
+        return offset + self.struct.size
+
+    def read_rows(self, data, offset, count):
+        end = offset + count * self.struct.size
+        self.values.extend(v for (v,) in self.struct.iter_unpack(data[offset:end]))
+
+        return end
+
+    def append_default(self):
+        self.values.append(0)
+
+    def result(self):
+        return self.values
+
+    def bind(self, values):
+        self.values = values
+
+    def count(self):
+        return len(self.values)
+
+    def is_default(self, i):
+        value = self.values[i]
+        return not value and self.struct.pack(value) == self.struct.pack(0)
+
+    def write(self, out, i):
+        out += self.struct.pack(self.values[i])
+
+    # values packed by the row struct of a message
+    def extend_struct_values(self, values):
+        self.values.extend(values)
+
+    def struct_value(self, i):
+        return self.values[i]
+
+    def struct_values(self):
+        return self.values
+
+
+class _FixedColumn(_Column):
+    def __init__(self, field_cls):
+        self.field = field_cls()
+        self.struct = field_cls.STRUCT
+        self.values = []
+
+    def read(self, data, offset):
+        self.extend_struct_values(self.struct.unpack_from(data, offset))
+        return offset + self.struct.size
+
+    def append_default(self):
+        self.values.append(self.field.__class__().val)
+
+    def result(self):
+        return self.values
+
+    def bind(self, values):
+        self.values = values
+
+    def count(self):
+        return len(self.values)
+
+    def is_default(self, i):
+        self.field.val = self.values[i]
+        return self.field.is_default()
+
+    def write(self, out, i):
+        out += self.struct.pack(self.struct_value(i))
+
+    def extend_struct_values(self, values):
+        for value in values:
+            self.field._from_struct_value(value)
+            self.values.append(self.field.val)
+
+    def struct_value(self, i):
+        self.field.val = self.values[i]
+        return self.field._struct_value()
+
+    def struct_values(self):
+        return [self.struct_value(i) for i in range(len(self.values))]
+
+
+class _PrefixedColumn(_Column):
+    def __init__(self, field_cls, offsets):
+        self.struct = field_cls.LENGTH_STRUCT
+        self.text = issubclass(field_cls, String)
+        self.offsets = array("Q", [0]) if offsets else None
+        self.buffer = bytearray()
+        self.values = []
+
+    def read(self, data, offset):
+        start = offset + self.struct.size
+        end = start + self.struct.unpack_from(data, offset)[0]
+
+        if self.offsets is not None:
+            self.buffer += data[start:end]
+            self.offsets.append(len(self.buffer))
+        elif self.text:
+            self.values.append(str(data[start:end], "utf-8"))
+        else:
+            self.values.append(data[start:end].tobytes())
+
+        return end
+
+    def append_default(self):
+        if self.offsets is not None:
+            self.offsets.append(len(self.buffer))
+        else:
+            self.values.append("" if self.text else b"")
+
+    def result(self):
+        if self.offsets is not None:
+            return (self.offsets, bytes(self.buffer))
+
+        return self.values
+
+    def bind(self, values):
+        if isinstance(values, tuple) and len(values) == 2:
+            self.offsets, self.buffer = values
+        else:
+            self.offsets = None
+            self.values = values
+
+    def count(self):
+        if self.offsets is not None:
+            return len(self.offsets) - 1
+
+        return len(self.values)
+
+    def raw(self, i):
+        if self.offsets is not None:
+            return self.buffer[self.offsets[i] : self.offsets[i + 1]]
+
+        value = self.values[i]
+        return value.encode("utf-8") if self.text else value
+
+    def is_default(self, i):
+        return not self.raw(i)
+
+    def write(self, out, i):
+        raw = self.raw(i)
+        out += self.struct.pack(len(raw))
+        out += raw
+
+
+class _ArrayColumn(_Column):
+    def __init__(self, field_cls, offsets):
+        self.array_cls = field_cls
+        self.offsets = offsets
+        self.values = []
+
+    def read(self, data, offset):
+        column = _column_for(self.array_cls.TYPE, self.offsets)
+        count, offset = self.array_cls._read_count(data, offset)
+        offset = column.read_rows(data, offset, count)
+        self.values.append(column.result())
+
+        return offset
+
+    def append_default(self):
+        self.values.append(_column_for(self.array_cls.TYPE, self.offsets).result())
+
+    def result(self):
+        return self.values
+
+    def bind(self, values):
+        self.values = values
+
+    def count(self):
+        return len(self.values)
+
+    def _bound(self, i):
+        column = _column_for(self.array_cls.TYPE, False)
+        column.bind(self.values[i])
+        return column
+
+    def is_default(self, i):
+        return self._bound(i).count() == 0
+
+    def write(self, out, i):
+        column = self._bound(i)
+        count = _row_count(self.array_cls, column)
+        out += self.array_cls._count_prefix(count)
+        column.write_rows(out, count)
+
+
+class _MessageColumns(_Column):
+    def __init__(self, cls, offsets):
+        self.names = [field.__name__ for field in cls.Fields]
+        self.columns = [_column_for(field, offsets) for field in cls.Fields]
+        self.optional = cls._optional
+        self.envelope = cls._envelope
+        self.message = cls
+        # the message struct holds the padding of native aligned messages
+        self.struct = cls._struct if cls._checksum is None else None
+
+    def read(self, data, offset):
+        # checksums were verified when the array was validated
+        return self._read_body(data, offset) + self.message._checksum_size
+
+    def _read_body(self, data, offset):
+        if self.struct is not None and self.columns:
+            for column, value in zip(
+                self.columns, self.struct.unpack_from(data, offset)
+            ):
+                column.extend_struct_values((value,))
+
+            return offset + self.struct.size
+
+        if self.envelope is not None:
+            end = offset + self.envelope.size
+            end += self.envelope.unpack_from(data, offset)[0]
+            offset += self.envelope.size
+
+            for column in self.columns:
+                if offset < end:
+                    offset = column.read(data, offset)
+                else:
+                    column.append_default()
+
+            return end
+
+        if self.optional is None:
+            for column in self.columns:
+                offset = column.read(data, offset)
+
+            return offset
+
+        n = sum(self.optional)
+        bits = iter(unpack_bitmap(data[offset:], n))
+        offset += bitmap_size(n)
+
+        for column, opt in zip(self.columns, self.optional):
+            if opt and not next(bits):
+                column.append_default()
+            else:
+                offset = column.read(data, offset)
+
+        return offset
+
+    def read_rows(self, data, offset, count):
+        if self.struct is None or not self.columns:
+            return super().read_rows(data, offset, count)
+
+        end = offset + count * self.struct.size
+        rows = self.struct.iter_unpack(data[offset:end])
+        for column, values in zip(self.columns, zip(*rows)):
+            column.extend_struct_values(values)
+
+        return end
+
+    def append_default(self):
+        for column in self.columns:
+            column.append_default()
+
+    def result(self):
+        return dict(zip(self.names, (column.result() for column in self.columns)))
+
+    def bind(self, columns):
+        for name, column in zip(self.names, self.columns):
+            column.bind(columns[name])
+
+        if len(self._counts()) > 1:
+            raise ValueError("columns have different lengths.")
+
+    def _counts(self):
+        # messages without fields have no column to count their rows
+        return {column.count() for column in self.columns} - {None}
+
+    def count(self):
+        counts = self._counts()
+        return counts.pop() if counts else None
+
+    def is_default(self, i):
+        return all(column.is_default(i) for column in self.columns)
+
+    def write(self, out, i):
+        if self.message._checksum is None:
+            self._write_body(out, i)
+            return
+
+        row = bytearray()
+        self._write_body(row, i)
+        out += row
+        out += self.message._trailer(row)
+
+    def _write_body(self, out, i):
+        if self.struct is not None and self.columns:
+            out += self.struct.pack(
+                *(column.struct_value(i) for column in self.columns)
+            )
+            return
+
+        if self.envelope is not None:
+            row = bytearray()
+            for column in self.columns:
+                column.write(row, i)
+
+            out += self.envelope.pack(len(row))
+            out += row
+            return
+
+        if self.optional is None:
+            for column in self.columns:
+                column.write(out, i)
+            return
+
+        present = [
+            not (opt and column.is_default(i))
+            for column, opt in zip(self.columns, self.optional)
+        ]
+        out += pack_bitmap(p for p, opt in zip(present, self.optional) if opt)
+
+        for column, p in zip(self.columns, present):
+            if p:
+                column.write(out, i)
+
+    def write_rows(self, out, count):
+        if self.struct is None or not self.columns:
+            return super().write_rows(out, count)
+
+        pack = self.struct.pack
+        for row in zip(*(column.struct_values() for column in self.columns)):
+            out += pack(*row)
+
+
+def _row_count(array_cls, column):
+    count = column.count()
+    if count is None:
+        return getattr(array_cls, "COUNT", 0)
+
+    return count
+
+
+def _column_for(field_cls, offsets):
+    if issubclass(field_cls, Message):
+        return _MessageColumns(field_cls, offsets)
+    if issubclass(field_cls, Array):
+        return _ArrayColumn(field_cls, offsets)
+    if issubclass(field_cls, FixedBytes):
+        return _FixedColumn(field_cls)
+    if issubclass(field_cls, Primitive):
+        return _PrimitiveColumn(field_cls)
+    if issubclass(field_cls, (String, Bytes)):
+        return _PrefixedColumn(field_cls, offsets)
+
+    raise TypeError(f"unsupported field type {field_cls.__name__}.")
+
+
+def unpack_columns(array_cls, data, offsets=False):
+    """ Decode an array field into columns
+
+        Arguments:
+            array_cls (class): array field class from `array_field_factory`
+                               or `fixed_array_field_factory`
+            data (bytes): bytes to unpack
+            offsets (bool): decode `String`/`Bytes` fields into an
+                            `(offsets, buffer)` pair instead of a list
+
+        Returns:
+            tuple(columns, int): the columns and the number of processed bytes.
+                                 Columns are a dict keyed by field name for
+                                 arrays of messages, a single column otherwise.
+
+        Raises:
+            ValueError: the given data is incomplete
+    """
+    data = memoryview(data)
+    length = array_cls._validate(data, 0)
+
+    column = _column_for(array_cls.TYPE, offsets)
+    count, offset = array_cls._read_count(data, 0)
+    column.read_rows(data, offset, count)
+
+    return (column.result(), length)
+
+
+def pack_columns(array_cls, columns):
+    """ Encode columns into an array field
+
+        Arguments:
+            array_cls (class): array field class from `array_field_factory`
+                               or `fixed_array_field_factory`
+            columns: columns in the layout returned by `unpack_columns`
+
+        Returns:
+            raw (bytes): Packed data in bytes
+
+        Raises:
+            ValueError: the columns have different lengths, or a fixed-size
+                        array the wrong length
+    """
+    column = _column_for(array_cls.TYPE, False)
+    column.bind(columns)
+
+    count = _row_count(array_cls, column)
+    out = bytearray(array_cls._count_prefix(count))
+    column.write_rows(out, count)
+
+    return bytes(out)
+
+
+__all__ = ["unpack_columns", "pack_columns"]
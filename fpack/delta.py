@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+
+""" fpack delta encoding
+
+    DeltaEncoder and DeltaDecoder encode a stream of messages of one class
+    as differences against the previous message of the stream.
+
+    A frame starts with a flags byte. Keyframes carry every field in full.
+    Delta frames carry a presence bitmap (one bit per field, in `Fields`
+    order) followed by the changed fields only. Changed integer primitives
+    are sent as zigzag varint deltas, other fields are packed as usual.
+"""
+
+import struct
+
+from fpack.fields import Primitive
+from fpack.utils import bitmap_size, get_length, pack_bitmap, unpack_bitmap
+
+FLAG_KEYFRAME = 0x01
+
+_FLAGS_STRUCT = struct.Struct("B")
+_INTEGER_CODES = frozenset("bBhHiIqQ")
+
+
+def _is_integer(field_cls):
+    return (
+        issubclass(field_cls, Primitive)
+        and field_cls.STRUCT.format[-1] in _INTEGER_CODES
+    )
+
+
+def _pack_varint(n):
+    n = n << 1 if n >= 0 else ((-n) << 1) - 1
+
+    buf = bytearray()
+    while n > 0x7F:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+    return bytes(buf)
+
+
+def _unpack_varint(data, offset):
+    n = 0
+    shift = 0
+    length = get_length(data)
+
+    while True:
+        if offset >= length:
+            raise ValueError(f"incomplete varint, size too short: {length}.")
+
+        byte = data[offset]
+        offset += 1
+        n |= (byte & 0x7F) << shift
+        shift += 7
+
+        if not byte & 0x80:
+            break
+
+    n = n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+    return (n, offset)
+
+
+class _DeltaCodec:
+    def __init__(self, cls, numeric_delta=True):
+        self.cls = cls
+        self.numeric_delta = numeric_delta
+        self._primitive = [issubclass(f, Primitive) for f in cls.Fields]
+        self._integer = [numeric_delta and _is_integer(f) for f in cls.Fields]
+        self._state = None
+
+    def reset(self):
+        """ Forget the previous message, the next frame is a keyframe
+        """
+        self._state = None
+
+
+class DeltaEncoder(_DeltaCodec):
+    """ DeltaEncoder
+
+        Encode successive messages of `cls` as deltas against the previous one.
+
+        Arguments:
+            cls (class): message class to encode
+            keyframe_interval (int): emit a full keyframe every n messages,
+                                     0 emits a keyframe for the first message only
+            numeric_delta (bool): encode changed integer fields as deltas
+    """
+
+    def __init__(self, cls, keyframe_interval=0, numeric_delta=True):
+        super().__init__(cls, numeric_delta=numeric_delta)
+        self.keyframe_interval = keyframe_interval
+        self._count = 0
+
+    def reset(self):
+        super().reset()
+        self._count = 0
+
+    def encode(self, msg) -> bytes:
+        """ Encode the message against the previous one
+
+            Arguments:
+                msg (Message): message to encode
+
+            Returns:
+                raw (bytes): the encoded frame
+
+            Raises:
+                TypeError: the message is not an instance of `cls`
+        """
+        if not isinstance(msg, self.cls):
+            raise TypeError(f"Incompatible type {msg.__class__.__name__}.")
+
+        keyframe = self._state is None or (
+            self.keyframe_interval and self._count % self.keyframe_interval == 0
+        )
+        self._count += 1
+
+        fields = list(msg._fields.values())
+        # fields other than integers are compared by their packed bytes, so
+        # that e.g. 0.0 and -0.0 differ
+        state = [
+            field.val if integer else field.pack()
+            for field, integer in zip(fields, self._integer)
+        ]
+
+        if keyframe:
+            chunks = [_FLAGS_STRUCT.pack(FLAG_KEYFRAME)]
+            for field, value, integer in zip(fields, state, self._integer):
+                chunks.append(field.pack() if integer else value)
+
+            self._state = state
+            return b"".join(chunks)
+
+        present = [new != old for new, old in zip(state, self._state)]
+        chunks = [_FLAGS_STRUCT.pack(0), pack_bitmap(present)]
+
+        for i in range(len(fields)):
+            if not present[i]:
+                continue
+
+            if self._integer[i]:
+                chunks.append(_pack_varint(state[i] - self._state[i]))
+            else:
+                chunks.append(state[i])
+
+        self._state = state
+        return b"".join(chunks)
+
+
+class DeltaDecoder(_DeltaCodec):
+    """ DeltaDecoder
+
+        Decode frames produced by a DeltaEncoder of the same message class.
+
+        Arguments:
+            cls (class): message class to decode
+            numeric_delta (bool): must match the encoder setting
+    """
+
+    def decode(self, data):
+        """ Decode a frame and return message instance and the number of processed bytes
+
+            Arguments:
+                data (bytes): bytes to decode
+
+            Returns:
+                tuple(Message, int): the message instance and the number of processed bytes
+
+            Raises:
+                ValueError: the given data is incomplete or no keyframe was received
+        """
+        data = memoryview(data)
+
+        try:
+            flags = _FLAGS_STRUCT.unpack(data[: _FLAGS_STRUCT.size])[0]
+        except struct.error:
+            raise ValueError(f"size too short: {get_length(data)}.")
+
+        offset = _FLAGS_STRUCT.size
+        n = len(self.cls.Fields)
+        keyframe = bool(flags & FLAG_KEYFRAME)
+
+        if keyframe:
+            present = [True] * n
+        elif self._state is None:
+            raise ValueError("delta frame received before keyframe.")
+        else:
+            present = unpack_bitmap(data[offset:], n)
+            offset += bitmap_size(n)
+
+        msg = self.cls()
+        state = []
+
+        for i, field in enumerate(msg._fields.values()):
+            if not present[i]:
+                value = self._state[i]
+                if self._primitive[i]:
+                    field.val = value
+                else:
+                    field.unpack(value)
+            elif self._integer[i] and not keyframe:
+                delta, offset = _unpack_varint(data, offset)
+                value = field.val = self._state[i] + delta
+            else:
+                processed = field.unpack(data[offset:])
+                if self._primitive[i]:
+                    value = field.val
+                else:
+                    value = data[offset : offset + processed].tobytes()
+                offset += processed
+
+            state.append(value)
+
+        self._state = state
+        return (msg, offset)
+
+
+__all__ = ["DeltaEncoder", "DeltaDecoder"]
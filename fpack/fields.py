@@ -7,12 +7,49 @@
 """
 
 import struct
+from array import array
+from collections.abc import Sequence
 from io import BytesIO
 
-from fpack.utils import get_length
+from fpack.utils import BYTE_ORDERS, get_length, split_format, write_into
+
+
+class DecodeLimits:
+    """ DecodeLimits
+
+        Limits enforced when checking untrusted data, before any field is
+        decoded. A limit of None is disabled.
+
+        Arguments:
+            max_size (int): maximum size of an encoded message
+            max_array_count (int): maximum item count of an array
+            max_field_length (int): maximum payload length of a String or Bytes
+    """
+
+    __slots__ = ("max_size", "max_array_count", "max_field_length")
+
+    def __init__(self, max_size=None, max_array_count=None, max_field_length=None):
+        self.max_size = max_size
+        self.max_array_count = max_array_count
+        self.max_field_length = max_field_length
+
+    def check_array_count(self, count):
+        if self.max_array_count is not None and count > self.max_array_count:
+            raise ValueError(
+                f"array count {count} exceeds limit {self.max_array_count}."
+            )
+
+    def check_field_length(self, length):
+        if self.max_field_length is not None and length > self.max_field_length:
+            raise ValueError(
+                f"field length {length} exceeds limit {self.max_field_length}."
+            )
 
 
 class Field:
+    # whether the encoding holds checksums, verified when validated
+    _checksummed = False
+
     def __init__(self, val=None):
         self.val = val
 
@@ -29,10 +66,56 @@ class Field:
 
         return (obj, length)
 
+    @classmethod
+    def _validate(cls, data, offset, limits=None):
+        """ Check the field encoded at data[offset:] and return its end offset
+        """
+        return offset + cls().unpack(data[offset:])
+
+    def _unpack_trusted(self, data, offset):
+        """ Unpack a validated field at data[offset:] and return its end offset
+        """
+        return offset + self.unpack(data[offset:])
+
+    def _pack_iov(self, iov):
+        """ Pack the field into an IOVec
+        """
+        iov.write(self.pack())
+
+    def _pack_into(self, buf, offset):
+        """ Pack the field into buf[offset:] and return its end offset
+        """
+        return write_into(buf, offset, self.pack())
+
     @property
     def size(self):
         raise NotImplementedError
 
+    @classmethod
+    def fixed_size(cls):
+        """ The encoded size of the field if it is fixed, None otherwise
+        """
+        return None
+
+    @classmethod
+    def _byte_order_overrides(cls, order):
+        """ Class attributes to override for the given byte order
+        """
+        return {}
+
+    @classmethod
+    def _from_variant(cls, other):
+        """ Convert an instance of another byte order variant of the class
+        """
+        obj = cls.__new__(cls)
+        obj.val = other.val
+        return obj
+
+    def is_default(self):
+        """ Whether the field holds its default (zero or empty) value
+        """
+        return not self.val
+
     def __repr__(self):
         return f"{self.val}"
 
@@ -56,10 +139,57 @@ class Primitive(Field):
 
         return self.STRUCT.size
 
+    @classmethod
+    def _validate(cls, data, offset, limits=None):
+        end = offset + cls.STRUCT.size
+        if end > get_length(data):
+            raise ValueError(
+                f"size too small: {get_length(data) - offset}, expect {cls.STRUCT.size}."
+            )
+
+        return end
+
+    def _unpack_trusted(self, data, offset):
+        self.val = self.STRUCT.unpack_from(data, offset)[0]
+        return offset + self.STRUCT.size
+
+    def _pack_into(self, buf, offset):
+        try:
+            self.STRUCT.pack_into(buf, offset, self.val)
+        except struct.error as e:
+            raise ValueError(f"cannot pack into buffer: {e}.")
+
+        return offset + self.STRUCT.size
+
+    def is_default(self):
+        # compared packed, -0.0 is not the default value of float fields
+        return not self.val and (
+            self.val is None or self.STRUCT.pack(self.val) == self.STRUCT.pack(0)
+        )
+
+    def _struct_value(self):
+        """ The value handed to STRUCT when packed by a message struct
+        """
+        return self.val
+
+    def _from_struct_value(self, val):
+        """ Set the value unpacked by a message struct
+        """
+        self.val = val
+
     @property
     def size(self):
         return self.STRUCT.size
 
+    @classmethod
+    def fixed_size(cls):
+        return cls.STRUCT.size
+
+    @classmethod
+    def _byte_order_overrides(cls, order):
+        s = _reorder(cls.STRUCT, order)
+        return {} if s is cls.STRUCT else {"STRUCT": s}
+
 
 class Int64(Primitive):
     STRUCT = struct.Struct("!q")
@@ -101,9 +231,184 @@ class Double(Primitive):
     STRUCT = struct.Struct("!d")
 
 
-class Bytes(Field):
+class FixedBytes(Primitive):
+    """ FixedBytes
+
+        Bytes of a fixed length, encoded without length prefix. Shorter
+        values are padded with NUL bytes.
+    """
+
+    STRUCT = struct.Struct("0s")
+
+    def __init__(self, val=b""):
+        super().__init__(val)
+
+    def _struct_value(self):
+        val = self.val or b""
+        if get_length(val) > self.STRUCT.size:
+            raise ValueError(
+                f"value too long: {get_length(val)}, expect at most {self.STRUCT.size}."
+            )
+
+        return bytes(val)
+
+    def pack(self):
+        return self.STRUCT.pack(self._struct_value())
+
+    def unpack(self, data):
+        try:
+            self._from_struct_value(self.STRUCT.unpack_from(data, 0)[0])
+        except struct.error:
+            raise ValueError(
+                f"size too small: {get_length(data)}, expect {self.STRUCT.size}."
+            )
+
+        return self.STRUCT.size
+
+    def _unpack_trusted(self, data, offset):
+        self._from_struct_value(self.STRUCT.unpack_from(data, offset)[0])
+        return offset + self.STRUCT.size
+
+    def _pack_into(self, buf, offset):
+        try:
+            self.STRUCT.pack_into(buf, offset, self._struct_value())
+        except struct.error as e:
+            raise ValueError(f"cannot pack into buffer: {e}.")
+
+        return offset + self.STRUCT.size
+
+    def is_default(self):
+        return not any(self.val or b"")
+
+
+class FixedString(FixedBytes):
+    """ FixedString
+
+        UTF-8 string of a fixed encoded length, encoded without length
+        prefix. Shorter values are padded with NUL bytes, which are
+        stripped when unpacking.
+    """
+
+    def __init__(self, val=""):
+        super().__init__(val)
+
+    def _struct_value(self):
+        val = (self.val or "").encode("utf-8")
+        if len(val) > self.STRUCT.size:
+            raise ValueError(
+                f"value too long: {len(val)}, expect at most {self.STRUCT.size}."
+            )
+
+        return val
+
+    def _from_struct_value(self, val):
+        self.val = val.rstrip(b"\x00").decode("utf-8")
+
+    def is_default(self):
+        return not self.val
+
+    def __repr__(self):
+        if self.val is None:
+            return f"{self.val}"
+        return f'"{self.val}"'
+
+
+def _reorder(s, order):
+    """ Get s with the given byte order, s itself if it already has it
+    """
+    current, code = split_format(s.format)
+
+    if (current or "@") == order or (not current and code[-1] in "bBs"):
+        return s
+
+    return struct.Struct(order + code)
+
+
+_byte_order_classes = {}
+
+
+def with_byte_order(type_, order):
+    """ byte order type factory
+
+        This function generate a variant of a field or message class using
+        the given struct byte order for its values, length prefixes, array
+        items and nested messages.
+
+        Arguments:
+            type_ (class): field or message class
+            order (str): struct byte order: "!" or ">" (big endian),
+                         "<" (little endian), "=" (native) or "@" (native,
+                         aligned)
+
+        Return:
+            field or message class, type_ itself if it already uses order
+
+        Raises:
+            ValueError: the byte order is invalid
+    """
+    if order not in BYTE_ORDERS:
+        raise ValueError(f"invalid byte order: {order!r}.")
+
+    key = (type_, order)
+    if key not in _byte_order_classes:
+        overrides = type_._byte_order_overrides(order)
+        if overrides:
+            overrides["_unordered"] = vars(type_).get("_unordered", type_)
+        _byte_order_classes[key] = (
+            type(type_.__name__, (type_,), {**overrides, "__slots__": ("val",)})
+            if overrides
+            else type_
+        )
+
+    return _byte_order_classes[key]
+
+
+def _coerce(item, type_):
+    """ Get an array item or a nested message as an instance of type_
+
+        Instances of the class type_ is a byte order variant of, or of a
+        class type_ derives from (e.g. through `field_factory`), are converted.
+    """
+    if isinstance(item, type_):
+        return item
+
+    if not (
+        isinstance(item, vars(type_).get("_unordered", type_))
+        or issubclass(type_, item.__class__)
+    ):
+        raise TypeError(f"Incompatible type {item.__class__.__name__}.")
+
+    return type_._from_variant(item)
+
+
+def _validate_prefixed(length_struct, data, offset, limits=None):
+    length = get_length(data)
+
+    try:
+        payload_length = length_struct.unpack_from(data, offset)[0]
+    except struct.error:
+        raise ValueError(f"size too short: {length - offset}.")
+
+    if limits is not None:
+        limits.check_field_length(payload_length)
+
+    end = offset + length_struct.size + payload_length
+    if length < end:
+        raise ValueError(f"incomplete field, size too short: {length - offset}.")
+
+    return end
+
+
+class _Prefixed(Field):
     LENGTH_STRUCT = struct.Struct("!H")
 
+    @classmethod
+    def _byte_order_overrides(cls, order):
+        s = _reorder(cls.LENGTH_STRUCT, order)
+        return {} if s is cls.LENGTH_STRUCT else {"LENGTH_STRUCT": s}
+
+
+class Bytes(_Prefixed):
     def __init__(self, val=b""):
         super().__init__(val)
 
@@ -115,6 +420,18 @@ class Bytes(Field):
 
         return lengthBytes
 
+    def _pack_iov(self, iov):
+        iov.write(self.LENGTH_STRUCT.pack(get_length(self.val)))
+        if self.val:
+            iov.write(self.val)
+
+    def _pack_into(self, buf, offset):
+        offset = write_into(buf, offset, self.LENGTH_STRUCT.pack(get_length(self.val)))
+        if self.val:
+            offset = write_into(buf, offset, self.val)
+
+        return offset
+
     def unpack(self, data):
         data = memoryview(data)
 
@@ -136,23 +453,32 @@ class Bytes(Field):
 
         return self.LENGTH_STRUCT.size + payload_length
 
+    @classmethod
+    def _validate(cls, data, offset, limits=None):
+        return _validate_prefixed(cls.LENGTH_STRUCT, data, offset, limits)
+
+    def _unpack_trusted(self, data, offset):
+        start = offset + self.LENGTH_STRUCT.size
+        end = start + self.LENGTH_STRUCT.unpack_from(data, offset)[0]
+        self.val = data[start:end].tobytes()
+
+        return end
+
     @property
     def size(self):
         return self.LENGTH_STRUCT.size + get_length(self.val)
 
 
-class String(Field):
-    LENGTH_STRUCT = struct.Struct("!H")
-
+class String(_Prefixed):
     def __init__(self, val=""):
         super().__init__(val)
 
     def pack(self):
-        length = get_length(self.val)
-        lengthBytes = self.LENGTH_STRUCT.pack(length)
+        payload = self.val.encode("utf-8") if self.val else b""
+        lengthBytes = self.LENGTH_STRUCT.pack(get_length(payload))
 
-        if self.val:
-            return lengthBytes + self.val.encode("utf-8")
+        if payload:
+            return lengthBytes + payload
 
         return lengthBytes
 
@@ -173,9 +499,22 @@ class String(Field):
 
         return self.LENGTH_STRUCT.size + payload_length
 
+    @classmethod
+    def _validate(cls, data, offset, limits=None):
+        return _validate_prefixed(cls.LENGTH_STRUCT, data, offset, limits)
+
+    def _unpack_trusted(self, data, offset):
+        start = offset + self.LENGTH_STRUCT.size
+        end = start + self.LENGTH_STRUCT.unpack_from(data, offset)[0]
+        self.val = str(data[start:end], "utf-8")
+
+        return end
+
     @property
     def size(self):
-        return self.LENGTH_STRUCT.size + get_length(self.val)
+        return self.LENGTH_STRUCT.size + get_length(
+            self.val.encode("utf-8") if self.val else b""
+        )
 
     def __repr__(self):
         if self.val is None:
@@ -184,8 +523,8 @@ class String(Field):
 
 
 class Array(Field):
-    def __init__(self, val=[]):
-        super().__init__(val=val)
+    def __init__(self, val=None):
+        super().__init__(val=[] if val is None else val)
 
     def __repr__(self):
         item_str = ",".join(str(x) for x in self.val)
@@ -193,15 +532,218 @@ class Array(Field):
 
         return f"<{self.__class__.__name__} length={get_length(self.val)} items={item_str}>"
 
+    @classmethod
+    def _from_variant(cls, other):
+        # lazy items keep raw bytes in the byte order of the other variant
+        obj = cls.__new__(cls)
+        obj.val = list(other.val)
+        return obj
+
+
+class _LazyItems(Sequence):
+    """ Read-only sequence of array items decoded on access
+
+        Fixed-size items are located in O(1). Variable-size items are
+        located through an offset index built on the first random access.
+        Decoded items are kept, items never accessed are packed from the
+        raw bytes. Items of frozen sequences are frozen when decoded, message
+        items are attached to the cached messages owning the sequence.
+    """
+
+    __slots__ = (
+        "_type",
+        "_raw",
+        "_count",
+        "_stride",
+        "_offsets",
+        "_items",
+        "_owners",
+        "_frozen",
+    )
+
+    def __init__(self, type_, raw, count):
+        self._type = type_
+        self._raw = memoryview(raw)
+        self._count = count
+        self._stride = type_.fixed_size()
+        self._offsets = None
+        self._items = {}
+        self._owners = []
+        self._frozen = False
+
+    def __len__(self):
+        return self._count
+
+    def _spans(self):
+        """ Yield the index, start and end offsets of every item
+        """
+        start = 0
+        for i in range(self._count):
+            if self._stride is not None:
+                end = start + self._stride
+            elif self._offsets is not None:
+                end = self._offsets[i + 1]
+            else:
+                end = self._type._validate(self._raw, start)
+
+            yield (i, start, end)
+            start = end
+
+    def _item(self, i, start):
+        item = self._items.get(i)
+        if item is None:
+            item = self._type()
+            item._unpack_trusted(self._raw, start)
+
+            if self._frozen:
+                item = _freeze_item(item)
+            elif not isinstance(item, Field):
+                for owner in self._owners:
+                    item._attach(owner)
+
+            self._items[i] = item
+
+        return item
+
+    def _adopt(self, owner):
+        """ Attach decoded and future message items to a cached message
+        """
+        if self._frozen or any(o is owner for o in self._owners):
+            return
+
+        self._owners.append(owner)
+        for item in self._items.values():
+            if not isinstance(item, Field):
+                item._attach(owner)
+
+    def _freeze(self):
+        """ Get a frozen copy of the sequence, items are frozen on access
+        """
+        frozen = _LazyItems(self._type, self._raw, self._count)
+        frozen._offsets = self._offsets
+        frozen._frozen = True
+        frozen._items = {i: _freeze_item(item) for i, item in self._items.items()}
+        return frozen
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("array index out of range.")
+
+        if self._stride is not None:
+            return self._item(i, i * self._stride)
+
+        if self._offsets is None:
+            offsets = array("Q", [0])
+            offsets.extend(end for _, _, end in self._spans())
+            self._offsets = offsets
+
+        return self._item(i, self._offsets[i])
+
+    def __iter__(self):
+        for i, start, _ in self._spans():
+            yield self._item(i, start)
+
+    def pack(self):
+        """ Pack the items, without count prefix
+        """
+        if not self._items:
+            return self._raw.tobytes()
+
+        return b"".join(
+            self._items[i].pack() if i in self._items else self._raw[start:end]
+            for i, start, end in self._spans()
+        )
+
+    @property
+    def size(self):
+        if not self._items:
+            return get_length(self._raw)
+
+        return sum(
+            self._items[i].size if i in self._items else end - start
+            for i, start, end in self._spans()
+        )
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} length={self._count}>"
+
+
+_frozen_classes = {}
+
+
+def _frozen_class(cls):
+    """ Get the variant of a field class whose instances cannot be modified
+    """
+    frozen = _frozen_classes.get(cls)
+    if frozen is None:
+
+        def setattr_(self, attr, val):
+            raise AttributeError(f"{cls.__name__} is frozen.")
+
+        frozen = _frozen_classes[cls] = type(
+            cls.__name__, (cls,), {"__setattr__": setattr_, "__slots__": ()}
+        )
+
+    return frozen
+
+
+def _freeze_item(item):
+    """ Get an immutable version of an array item, messages are frozen in place
+    """
+    if not isinstance(item, Field):
+        return item.freeze()
+
+    frozen = _frozen_class(item.__class__).__new__(_frozen_class(item.__class__))
+    val = item.val
+    if isinstance(item, Array):
+        val = _freeze_items(val)
+    object.__setattr__(frozen, "val", val)
+
+    return frozen
+
+
+def _freeze_items(items):
+    """ Get an immutable version of the items of an array
+    """
+    if isinstance(items, _LazyItems):
+        return items if items._frozen else items._freeze()
+
+    return tuple(_freeze_item(item) for item in items)
+
+
+def array_field_factory(name, type_, byte_order="!", lazy=False):
+    """ array field type factory
+
+        This function generate array field classes. The item count is
+        encoded as a 2-byte prefix.
+
+        Lazy arrays keep the raw items when unpacked and decode an item on
+        access only. Their value is a read-only sequence, assign a list to
+        modify the array.
 
-def array_field_factory(name, type_):
-    array_length_struct = struct.Struct("!H")
+        Arguments:
+            name (str): name of the class
+            type_ (class): class of the items
+            byte_order (str): struct byte order of the item count
+            lazy (bool): decode items on access instead of on unpack
+
+        Return:
+            field class
+    """
 
     @property
     def size(self):
-        total_size = array_length_struct.size
+        if isinstance(self.val, _LazyItems):
+            return self.LENGTH_STRUCT.size + self.val.size
+
+        total_size = self.LENGTH_STRUCT.size
         for v in self.val:
-            total_size += v.size
+            total_size += _coerce(v, self.TYPE).size
 
         return total_size
 
@@ -209,45 +751,330 @@ def array_field_factory(name, type_):
         return get_length(self.val)
 
     def pack(self):
+        if isinstance(self.val, _LazyItems):
+            return self.LENGTH_STRUCT.pack(len(self.val)) + self.val.pack()
+
         buf = BytesIO()
-        buf.write(array_length_struct.pack(get_length(self.val)))
+        buf.write(self.LENGTH_STRUCT.pack(get_length(self.val)))
 
-        payload_size = array_length_struct.size
         for v in self.val:
-            if not isinstance(v, type_):
-                raise TypeError(f"Incompatible type {v.__class__.__name__}.")
-            buf.write(v.pack())
-            payload_size += v.size
+            buf.write(_coerce(v, self.TYPE).pack())
 
         return buf.getvalue()
 
+    def _pack_iov(self, iov):
+        iov.write(self.LENGTH_STRUCT.pack(get_length(self.val)))
+
+        if isinstance(self.val, _LazyItems):
+            iov.write(self.val.pack())
+            return
+
+        for v in self.val:
+            _coerce(v, self.TYPE)._pack_iov(iov)
+
+    def _pack_into(self, buf, offset):
+        offset = write_into(buf, offset, self.LENGTH_STRUCT.pack(get_length(self.val)))
+
+        if isinstance(self.val, _LazyItems):
+            return write_into(buf, offset, self.val.pack())
+
+        for v in self.val:
+            offset = _coerce(v, self.TYPE)._pack_into(buf, offset)
+
+        return offset
+
     def unpack(self, data):
         data = memoryview(data)
 
+        if self.LAZY:
+            end = self._validate(data, 0)
+            self._set_lazy(data, 0, end)
+            return end
+
         self.val = []
         offset = 0
 
         try:
-            array_length, *_ = array_length_struct.unpack(
-                data[0 : array_length_struct.size]
+            array_length, *_ = self.LENGTH_STRUCT.unpack(
+                data[0 : self.LENGTH_STRUCT.size]
             )
-            offset += array_length_struct.size
+            offset += self.LENGTH_STRUCT.size
         except struct.error:
             raise ValueError(f"incomplete field, size too small: {get_length(data)}.")
 
         for _ in range(array_length):
-            unpacked, len_ = type_.from_bytes(data[offset:])
+            unpacked, len_ = self.TYPE.from_bytes(data[offset:])
+            self.val.append(unpacked)
+            offset += len_
+
+        return offset
+
+    @classmethod
+    def _validate(cls, data, offset, limits=None):
+        try:
+            array_length, *_ = cls.LENGTH_STRUCT.unpack_from(data, offset)
+            offset += cls.LENGTH_STRUCT.size
+        except struct.error:
+            raise ValueError(
+                f"incomplete field, size too small: {get_length(data) - offset}."
+            )
+
+        if limits is not None:
+            limits.check_array_count(array_length)
+
+        for _ in range(array_length):
+            offset = cls.TYPE._validate(data, offset, limits)
+
+        return offset
+
+    def _unpack_trusted(self, data, offset):
+        if self.LAZY:
+            end = self._validate(data, offset)
+            self._set_lazy(data, offset, end)
+            return end
+
+        array_length, *_ = self.LENGTH_STRUCT.unpack_from(data, offset)
+        offset += self.LENGTH_STRUCT.size
+
+        self.val = []
+        for _ in range(array_length):
+            obj = self.TYPE()
+            offset = obj._unpack_trusted(data, offset)
+            self.val.append(obj)
+
+        return offset
+
+    def _set_lazy(self, data, offset, end):
+        count, start = self._read_count(data, offset)
+        # keep a copy, the buffer may be reused once unpacked
+        self.val = _LazyItems(self.TYPE, data[start:end].tobytes(), count)
+
+    @classmethod
+    def _read_count(cls, data, offset):
+        array_length, *_ = cls.LENGTH_STRUCT.unpack_from(data, offset)
+        return (array_length, offset + cls.LENGTH_STRUCT.size)
+
+    @classmethod
+    def _count_prefix(cls, count):
+        return cls.LENGTH_STRUCT.pack(count)
+
+    @classmethod
+    def _byte_order_overrides(cls, order):
+        type_ = with_byte_order(cls.TYPE, order)
+        length_struct = _reorder(cls.LENGTH_STRUCT, order)
+
+        if type_ is cls.TYPE and length_struct is cls.LENGTH_STRUCT:
+            return {}
+
+        return {"TYPE": type_, "LENGTH_STRUCT": length_struct}
+
+    return type(
+        name,
+        (Array,),
+        {
+            "TYPE": type_,
+            "LENGTH_STRUCT": struct.Struct(f"{byte_order}H"),
+            "LAZY": lazy,
+            "_checksummed": type_._checksummed,
+            "pack": pack,
+            "unpack": unpack,
+            "_validate": _validate,
+            "_unpack_trusted": _unpack_trusted,
+            "_set_lazy": _set_lazy,
+            "_pack_iov": _pack_iov,
+            "_pack_into": _pack_into,
+            "_read_count": _read_count,
+            "_count_prefix": _count_prefix,
+            "_byte_order_overrides": _byte_order_overrides,
+            "__len__": len_,
+            "size": size,
+            "__slots__": ("val",),
+        },
+    )
+
+
+def _items_struct(type_, n):
+    if issubclass(type_, Primitive) and type_._struct_value is Primitive._struct_value:
+        order, code = split_format(type_.STRUCT.format)
+        return struct.Struct(f"{order}{n}{code}")
+
+    return None
+
+
+def fixed_array_field_factory(name, type_, n):
+    """ fixed-size array field type factory
+
+        This function generate array field classes holding exactly n items.
+        The item count is not encoded. Arrays of fixed-size items have a
+        fixed size, arrays of primitives are packed with a single struct.
+
+        Arguments:
+            name (str): name of the class
+            type_ (class): class of the items
+            n (int): number of items
+
+        Return:
+            field class
+    """
+
+    def init(self, val=None):
+        Array.__init__(
+            self, [self.TYPE() for _ in range(self.COUNT)] if val is None else val
+        )
+
+    def check(self):
+        if get_length(self.val) != self.COUNT:
+            raise ValueError(
+                f"invalid array length: {get_length(self.val)}, expect {self.COUNT}."
+            )
+
+        return [_coerce(v, self.TYPE) for v in self.val]
+
+    @property
+    def size(self):
+        fixed_size = self.fixed_size()
+        if fixed_size is not None:
+            return fixed_size
+
+        return sum(_coerce(v, self.TYPE).size for v in self.val)
+
+    @classmethod
+    def fixed_size(cls):
+        item_size = cls.TYPE.fixed_size()
+        return None if item_size is None else item_size * cls.COUNT
+
+    def len_(self):
+        return get_length(self.val)
+
+    def pack(self):
+        items = check(self)
+
+        if self.ITEMS_STRUCT is not None:
+            return self.ITEMS_STRUCT.pack(*[v.val for v in items])
+
+        return b"".join(v.pack() for v in items)
+
+    def _pack_iov(self, iov):
+        items = check(self)
+
+        if self.ITEMS_STRUCT is not None:
+            iov.write(self.ITEMS_STRUCT.pack(*[v.val for v in items]))
+            return
+
+        for v in items:
+            v._pack_iov(iov)
+
+    def _pack_into(self, buf, offset):
+        items = check(self)
+
+        if self.ITEMS_STRUCT is not None:
+            try:
+                self.ITEMS_STRUCT.pack_into(buf, offset, *[v.val for v in items])
+            except struct.error as e:
+                raise ValueError(f"cannot pack into buffer: {e}.")
+
+            return offset + self.ITEMS_STRUCT.size
+
+        for v in items:
+            offset = v._pack_into(buf, offset)
+
+        return offset
+
+    def unpack(self, data):
+        data = memoryview(data)
+
+        if self.ITEMS_STRUCT is not None:
+            try:
+                values = self.ITEMS_STRUCT.unpack_from(data, 0)
+            except struct.error:
+                raise ValueError(
+                    f"incomplete field, size too small: {get_length(data)}."
+                )
+
+            self.val = [self.TYPE(v) for v in values]
+            return self.ITEMS_STRUCT.size
+
+        self.val = []
+        offset = 0
+        for _ in range(self.COUNT):
+            unpacked, len_ = self.TYPE.from_bytes(data[offset:])
             self.val.append(unpacked)
             offset += len_
 
         return offset
 
+    @classmethod
+    def _validate(cls, data, offset, limits=None):
+        fixed_size = cls.fixed_size()
+
+        if fixed_size is None or cls._checksummed:
+            for _ in range(cls.COUNT):
+                offset = cls.TYPE._validate(data, offset, limits)
+
+            return offset
+
+        end = offset + fixed_size
+        if end > get_length(data):
+            raise ValueError(
+                f"incomplete field, size too small: {get_length(data) - offset}."
+            )
+
+        return end
+
+    def _unpack_trusted(self, data, offset):
+        if self.ITEMS_STRUCT is not None:
+            self.val = [
+                self.TYPE(v) for v in self.ITEMS_STRUCT.unpack_from(data, offset)
+            ]
+            return offset + self.ITEMS_STRUCT.size
+
+        self.val = []
+        for _ in range(self.COUNT):
+            obj = self.TYPE()
+            offset = obj._unpack_trusted(data, offset)
+            self.val.append(obj)
+
+        return offset
+
+    @classmethod
+    def _read_count(cls, data, offset):
+        return (cls.COUNT, offset)
+
+    @classmethod
+    def _count_prefix(cls, count):
+        if count != cls.COUNT:
+            raise ValueError(f"invalid array length: {count}, expect {cls.COUNT}.")
+
+        return b""
+
+    @classmethod
+    def _byte_order_overrides(cls, order):
+        type_ = with_byte_order(cls.TYPE, order)
+
+        if type_ is cls.TYPE:
+            return {}
+
+        return {"TYPE": type_, "ITEMS_STRUCT": _items_struct(type_, cls.COUNT)}
+
     return type(
         name,
         (Array,),
         {
+            "TYPE": type_,
+            "COUNT": n,
+            "ITEMS_STRUCT": _items_struct(type_, n),
+            "_checksummed": type_._checksummed,
+            "__init__": init,
             "pack": pack,
             "unpack": unpack,
+            "fixed_size": fixed_size,
+            "_validate": _validate,
+            "_unpack_trusted": _unpack_trusted,
+            "_pack_iov": _pack_iov,
+            "_pack_into": _pack_into,
+            "_read_count": _read_count,
+            "_count_prefix": _count_prefix,
+            "_byte_order_overrides": _byte_order_overrides,
             "__len__": len_,
             "size": size,
             "__slots__": ("val",),
@@ -255,6 +1082,51 @@ def array_field_factory(name, type_):
     )
 
 
+def fixed_bytes_field_factory(name, length):
+    """ fixed-length bytes field type factory
+
+        Arguments:
+            name (str): name of the class
+            length (int): encoded length in bytes
+
+        Return:
+            field class
+    """
+    return type(
+        name,
+        (FixedBytes,),
+        {"STRUCT": struct.Struct(f"{length}s"), "__slots__": ("val",)},
+    )
+
+
+def fixed_string_field_factory(name, length):
+    """ fixed-length string field type factory
+
+        Arguments:
+            name (str): name of the class
+            length (int): encoded length in bytes
+
+        Return:
+            field class
+    """
+    return type(
+        name,
+        (FixedString,),
+        {"STRUCT": struct.Struct(f"{length}s"), "__slots__": ("val",)},
+    )
+
+
+class Optional:
+    """ Optional
+
+        Marker mixin for optional fields. A message containing optional fields
+        is prefixed by a presence bitmap with one bit per optional field;
+        optional fields holding their default value are not encoded.
+    """
+
+    __slots__ = ()
+
+
 def field_factory(name, type_):
     """ field type factory
 
@@ -272,7 +1144,26 @@ def field_factory(name, type_):
     return type(name, (type_,), {"__slots__": ("val",)})
 
 
+def optional_field_factory(name, type_):
+    """ optional field type factory
+
+        This function generate custom optional field classes for
+        designated types. Optional fields holding their default value
+        cost a single bit in the message presence bitmap.
+
+        Arguments:
+            name (str): name of the class
+            type (class): class from which the custom field class
+                          inherit
+
+        Return:
+            field class
+    """
+    return type(name, (type_, Optional), {"__slots__": ("val",)})
+
+
 __all__ = [
+    "DecodeLimits",
     "Field",
     "Uint8",
     "Uint16",
@@ -282,9 +1173,19 @@ __all__ = [
     "Int16",
     "Int32",
     "Int64",
+    "Float",
+    "Double",
     "Bytes",
     "String",
+    "FixedBytes",
+    "FixedString",
     "Array",
+    "Optional",
     "field_factory",
     "array_field_factory",
+    "fixed_array_field_factory",
+    "fixed_bytes_field_factory",
+    "fixed_string_field_factory",
+    "optional_field_factory",
+    "with_byte_order",
 ]
@@ -1,8 +1,33 @@
 #!/usr/bin/env python
 
+import struct
+import weakref
 from collections import OrderedDict
 from io import BytesIO
 
+from fpack.fields import (
+    Array,
+    Bytes,
+    Optional,
+    Primitive,
+    String,
+    _LazyItems,
+    _coerce,
+    _freeze_items,
+    with_byte_order,
+)
+from fpack.utils import (
+    IOVec,
+    bitmap_size,
+    checksum_factory,
+    combine_structs,
+    get_length,
+    pack_bitmap,
+    split_format,
+    unpack_bitmap,
+    write_into,
+)
+
 
 class Message:
     """ Message
@@ -13,6 +38,106 @@ class Message:
 
     Fields = []
 
+    # struct byte order of the fields, see `with_byte_order`
+    ByteOrder = "!"
+
+    # encode the fields in a length envelope, so that readers of older and
+    # newer versions of the message can skip or default trailing fields
+    Extensible = False
+    _envelope = None
+
+    # append a checksum of the encoded message, computed while packing and
+    # verified while unpacking: "crc32", "adler32" or a hashlib algorithm
+    ChecksumAlgorithm = None
+    _checksum = None
+    _checksum_size = 0
+
+    # whether the message or a nested message has a checksum
+    _checksummed = False
+
+    # per-field optional flags, None if the message has no optional field
+    _optional = None
+
+    # encoded size and field offsets of fixed-layout messages, None otherwise
+    _fixed_size = 0
+    _offsets = None
+
+    # single struct packing all fields when they are all primitives
+    _struct = None
+    _struct_plain = False
+
+    # frozen messages are immutable and keep their packed bytes
+    _frozen = False
+    _packed = None
+
+    # messages with cache enabled keep their packed bytes until modified
+    _cache_enabled = False
+    _parents = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        if "ByteOrder" in cls.__dict__ or cls.ByteOrder != "!":
+            cls.Fields = [with_byte_order(field, cls.ByteOrder) for field in cls.Fields]
+
+        optional = [issubclass(field, Optional) for field in cls.Fields]
+        cls._optional = optional if any(optional) else None
+
+        sizes = [field.fixed_size() for field in cls.Fields]
+        cls._fixed_size = cls._offsets = cls._struct = None
+
+        if cls._optional is None and None not in sizes:
+            cls._fixed_size = sum(sizes)
+            cls._offsets = {}
+            offset = 0
+            for field, size in zip(cls.Fields, sizes):
+                cls._offsets[field.__name__] = offset
+                offset += size
+
+        if (
+            cls.Fields
+            and cls._optional is None
+            and all(issubclass(field, Primitive) for field in cls.Fields)
+        ):
+            cls._struct = combine_structs(field.STRUCT for field in cls.Fields)
+            cls._struct_plain = all(
+                field._struct_value is Primitive._struct_value for field in cls.Fields
+            )
+
+        if cls._struct is not None:
+            # the struct may align fields in native aligned ("@") byte order
+            order = cls._struct.format[0]
+            codes = [split_format(field.STRUCT.format)[1] for field in cls.Fields]
+
+            cls._fixed_size = cls._struct.size
+            for i, field in enumerate(cls.Fields):
+                end = struct.calcsize(order + "".join(codes[: i + 1]))
+                cls._offsets[field.__name__] = end - struct.calcsize(order + codes[i])
+
+        cls._envelope = None
+        if cls.Extensible:
+            if cls._optional is not None:
+                raise TypeError(
+                    f"{cls.__name__}: extensible messages cannot have optional fields."
+                )
+
+            # the encoded size depends on the version of the writer
+            cls._envelope = struct.Struct(f"{cls.ByteOrder}I")
+            cls._fixed_size = cls._offsets = cls._struct = None
+
+        cls._checksum, cls._checksum_size = None, 0
+        if cls.ChecksumAlgorithm is not None:
+            new, cls._checksum_size = checksum_factory(
+                cls.ChecksumAlgorithm, cls.ByteOrder
+            )
+            cls._checksum = staticmethod(new)
+            if cls._fixed_size is not None:
+                cls._fixed_size += cls._checksum_size
+
+        cls._checksummed = cls._checksum is not None or any(
+            field._checksummed for field in cls.Fields
+        )
+
     def __init__(self, *_, **kwargs):
         # Initialize fields
         self._fields = OrderedDict()
@@ -34,27 +159,246 @@ class Message:
             Returns:
                 raw (bytes): Packed data in bytes
         """
+        if self._packed is not None:
+            return self._packed
+
+        if self._cache_enabled:
+            self._adopt()
+            raw = self._pack()
+            object.__setattr__(self, "_packed", raw)
+            return raw
+
+        return self._pack()
+
+    def _pack(self):
+        if self._checksum is not None:
+            return self._pack_checksum()
+
+        if self._struct is not None:
+            return self._struct.pack(*self._struct_values())
+
+        if self._envelope is not None:
+            body = b"".join(v.pack() for v in self._fields.values())
+            return self._envelope.pack(len(body)) + body
+
         payload = BytesIO()
 
-        for v in self._fields.values():
+        if self._optional is None:
+            for v in self._fields.values():
+                payload.write(v.pack())
+
+            return payload.getvalue()
+
+        bitmap, fields = self._pack_layout()
+        payload.write(bitmap)
+
+        for v in fields:
             payload.write(v.pack())
 
         return payload.getvalue()
 
-    def unpack(self, data):
+    def _pack_checksum(self):
+        payload = BytesIO()
+        # the checksum is updated as each field is written
+        out = _Checksummed(payload, self._checksum())
+
+        if self._struct is not None:
+            out.write(self._struct.pack(*self._struct_values()))
+        elif self._envelope is not None:
+            chunks = [v.pack() for v in self._fields.values()]
+            out.write(self._envelope.pack(sum(map(len, chunks))))
+            for chunk in chunks:
+                out.write(chunk)
+        else:
+            bitmap, fields = self._pack_layout()
+            out.write(bitmap)
+            for v in fields:
+                out.write(v.pack())
+
+        payload.write(out.checksum.digest())
+        return payload.getvalue()
+
+    def pack_iov(self, threshold=1024):
+        """ Pack the message into a list of buffer segments
+
+            Small fields are coalesced into shared segments while `Bytes`
+            payloads of at least `threshold` bytes are referenced, not copied.
+            The result can be passed to `socket.sendmsg`, `os.writev` or
+            `asyncio` transports `writelines`.
+
+            Arguments:
+                threshold (int): minimum size of a payload kept by reference
+
+            Returns:
+                segments (list): list of bytes-like objects
+        """
+        iov = IOVec(threshold)
+        self._pack_iov(iov)
+
+        return iov.getvalue()
+
+    def _pack_iov(self, iov):
+        if self._packed is not None:
+            iov.write(self._packed)
+            return
+
+        if self._checksum is not None:
+            checksum = self._checksum()
+            self._pack_body_iov(_Checksummed(iov, checksum))
+            iov.write(checksum.digest())
+            return
+
+        self._pack_body_iov(iov)
+
+    def _pack_body_iov(self, iov):
+        if self._struct is not None:
+            iov.write(self._struct.pack(*self._struct_values()))
+            return
+
+        if self._envelope is not None:
+            iov.write(self._envelope.pack(sum(v.size for v in self._fields.values())))
+
+        bitmap, fields = self._pack_layout()
+        if bitmap:
+            iov.write(bitmap)
+
+        for v in fields:
+            v._pack_iov(iov)
+
+    def pack_into(self, buf, offset=0):
+        """ Pack the message into a writable buffer
+
+            Arguments:
+                buf: writable bytes-like object, e.g. a bytearray or the
+                     buffer of a shared memory block
+                offset (int): offset at which the message is written
+
+            Returns:
+                written (int): number of bytes written
+
+            Raises:
+                ValueError: the buffer is too small
+        """
+        buf = memoryview(buf)
+
+        return self._pack_into(buf, offset) - offset
+
+    def _pack_into(self, buf, offset):
+        if self._packed is not None:
+            return write_into(buf, offset, self._packed)
+
+        if self._checksum is not None:
+            end = self._pack_body_into(buf, offset)
+            return write_into(buf, end, self._trailer(buf[offset:end]))
+
+        return self._pack_body_into(buf, offset)
+
+    def _pack_body_into(self, buf, offset):
+        if self._struct is not None:
+            try:
+                self._struct.pack_into(buf, offset, *self._struct_values())
+            except struct.error as e:
+                raise ValueError(f"cannot pack into buffer: {e}.")
+
+            return offset + self._struct.size
+
+        if self._envelope is not None:
+            start = offset
+            offset = write_into(buf, offset, bytes(self._envelope.size))
+            for v in self._fields.values():
+                offset = v._pack_into(buf, offset)
+
+            self._envelope.pack_into(buf, start, offset - start - self._envelope.size)
+            return offset
+
+        bitmap, fields = self._pack_layout()
+        if bitmap:
+            offset = write_into(buf, offset, bitmap)
+
+        for v in fields:
+            offset = v._pack_into(buf, offset)
+
+        return offset
+
+    def _struct_values(self):
+        if self._struct_plain:
+            return [v.val for v in self._fields.values()]
+
+        return [v._struct_value() for v in self._fields.values()]
+
+    def _set_struct_values(self, values):
+        if self._struct_plain:
+            for v, val in zip(self._fields.values(), values):
+                v.val = val
+        else:
+            for v, val in zip(self._fields.values(), values):
+                v._from_struct_value(val)
+
+    def _pack_layout(self):
+        """ Get the presence bitmap and the fields to pack
+        """
+        if self._optional is None:
+            return (b"", self._fields.values())
+
+        present = self._presence()
+        bitmap = pack_bitmap(p for p, opt in zip(present, self._optional) if opt)
+
+        return (bitmap, [v for v, p in zip(self._fields.values(), present) if p])
+
+    def unpack(self, data, trusted=False, limits=None):
         """ Unpack the message
 
             Arguments:
                 data (bytes): bytes to unpack
+                trusted (bool): skip per-field checks, data must have been
+                                checked with `validate`
+                limits (DecodeLimits): limits checked before decoding, unless
+                                       trusted
 
             Returns:
                 processed (int): number of bytes processed
 
             Raises:
-                ValueError: the given data is incomplete
+                ValueError: the given data is incomplete or exceeds the limits
+                AttributeError: the message is frozen
         """
+        if self._frozen:
+            raise AttributeError(f"{self.__class__.__name__} is frozen.")
+
+        if self._cache_enabled:
+            self._invalidate()
+
         data = memoryview(data)
 
+        if limits is not None and not trusted:
+            self._validate_limits(data, limits)
+            trusted = True
+
+        if trusted:
+            return self._unpack_trusted(data, 0)
+
+        if self._checksum is not None:
+            return self._verify(data, 0, self._unpack_body(data))
+
+        return self._unpack_body(data)
+
+    def _unpack_body(self, data):
+        if self._struct is not None:
+            try:
+                self._set_struct_values(self._struct.unpack_from(data, 0))
+            except struct.error:
+                raise ValueError(
+                    f"size too small: {get_length(data)}, expect {self._struct.size}."
+                )
+
+            return self._struct.size
+
+        if self._optional is not None:
+            return self._unpack_optional(data)
+
+        if self._envelope is not None:
+            return self._unpack_envelope(data)
+
         offset = 0
         for v in self._fields.values():
             processed = v.unpack(data[offset:])
@@ -62,24 +406,469 @@ class Message:
 
         return offset
 
+    def _presence(self):
+        return [
+            not (opt and v.is_default())
+            for v, opt in zip(self._fields.values(), self._optional)
+        ]
+
+    def _unpack_optional(self, data):
+        n = sum(self._optional)
+        bits = iter(unpack_bitmap(data, n))
+        offset = bitmap_size(n)
+
+        for (name, v), opt in zip(list(self._fields.items()), self._optional):
+            if opt and not next(bits):
+                # absent field, reset to its default value
+                self._fields[name] = v.__class__()
+                continue
+
+            processed = v.unpack(data[offset:])
+            offset += processed
+
+        return offset
+
+    def _unpack_envelope(self, data):
+        try:
+            length = self._envelope.unpack_from(data, 0)[0]
+        except struct.error:
+            raise ValueError(f"size too small: {get_length(data)}.")
+
+        end = self._envelope.size + length
+        if end > get_length(data):
+            raise ValueError(
+                f"incomplete message, size too small: {get_length(data)}, expect {end}."
+            )
+
+        body = data[self._envelope.size : end]
+        offset = 0
+        for name, v in list(self._fields.items()):
+            if offset < length:
+                offset += v.unpack(body[offset:])
+            else:
+                # field unknown to the writer, reset to its default value
+                self._fields[name] = v.__class__()
+
+        return end
+
+    def _unpack_trusted(self, data, offset):
+        if self._frozen:
+            raise AttributeError(f"{self.__class__.__name__} is frozen.")
+
+        if self._cache_enabled:
+            self._invalidate()
+
+        if self._struct is not None:
+            self._set_struct_values(self._struct.unpack_from(data, offset))
+            return offset + self._struct.size + self._checksum_size
+
+        if self._envelope is not None:
+            end = offset + self._envelope.size
+            end += self._envelope.unpack_from(data, offset)[0]
+            offset += self._envelope.size
+
+            for name, v in list(self._fields.items()):
+                if offset < end:
+                    offset = v._unpack_trusted(data, offset)
+                else:
+                    self._fields[name] = v.__class__()
+
+            return end + self._checksum_size
+
+        if self._optional is None:
+            for v in self._fields.values():
+                offset = v._unpack_trusted(data, offset)
+
+            return offset + self._checksum_size
+
+        n = sum(self._optional)
+        bits = iter(unpack_bitmap(data[offset:], n))
+        offset += bitmap_size(n)
+
+        for (name, v), opt in zip(list(self._fields.items()), self._optional):
+            if opt and not next(bits):
+                self._fields[name] = v.__class__()
+                continue
+
+            offset = v._unpack_trusted(data, offset)
+
+        return offset + self._checksum_size
+
+    @classmethod
+    def validate(cls, data, limits=None):
+        """ Check the structure of an encoded message without decoding it
+
+            The layout is walked in a single pass: length prefixes and array
+            counts are read and checked against the size of data, no field
+            object is created.
+
+            Arguments:
+                data (bytes): bytes to check
+                limits (DecodeLimits): limits to enforce
+
+            Returns:
+                length (int): size of the encoded message
+
+            Raises:
+                ValueError: the given data is incomplete or exceeds the limits
+        """
+        data = memoryview(data)
+
+        if limits is not None:
+            return cls._validate_limits(data, limits)
+
+        return cls._validate(data, 0)
+
+    @classmethod
+    def _validate_limits(cls, data, limits):
+        # data past max_size is never read
+        bounded = data if limits.max_size is None else data[: limits.max_size]
+
+        try:
+            return cls._validate(bounded, 0, limits)
+        except ValueError as e:
+            if get_length(bounded) < get_length(data):
+                raise ValueError(
+                    f"message exceeds size limit {limits.max_size}: {e}"
+                ) from e
+            raise
+
+    @classmethod
+    def _validate(cls, data, offset, limits=None):
+        if cls._checksum is not None:
+            return cls._verify(data, offset, cls._validate_body(data, offset, limits))
+
+        return cls._validate_body(data, offset, limits)
+
+    @classmethod
+    def _validate_body(cls, data, offset, limits=None):
+        # checksums of nested messages are verified field by field
+        if cls._fixed_size is not None and not cls._checksummed:
+            end = offset + cls._fixed_size
+            if end > get_length(data):
+                raise ValueError(
+                    f"size too small: {get_length(data) - offset}, expect {cls._fixed_size}."
+                )
+
+            return end
+
+        if cls._envelope is not None:
+            try:
+                length = cls._envelope.unpack_from(data, offset)[0]
+            except struct.error:
+                raise ValueError(f"size too small: {get_length(data) - offset}.")
+
+            offset += cls._envelope.size
+            end = offset + length
+            if end > get_length(data):
+                raise ValueError(
+                    f"incomplete message, size too small: {get_length(data) - offset}."
+                )
+
+            # fields must end within the envelope, trailing bytes are skipped
+            body = data[:end]
+            for field in cls.Fields:
+                if offset >= end:
+                    break
+                offset = field._validate(body, offset, limits)
+
+            return end
+
+        if cls._optional is None:
+            for field in cls.Fields:
+                offset = field._validate(data, offset, limits)
+
+            return offset
+
+        n = sum(cls._optional)
+        bits = iter(unpack_bitmap(data[offset:], n))
+        offset += bitmap_size(n)
+
+        for field, opt in zip(cls.Fields, cls._optional):
+            if opt and not next(bits):
+                continue
+
+            offset = field._validate(data, offset, limits)
+
+        return offset
+
+    @classmethod
+    def _verify(cls, data, start, end):
+        """ Check the checksum trailer of the body data[start:end]
+        """
+        trailer_end = end + cls._checksum_size
+        if trailer_end > get_length(data):
+            raise ValueError(
+                f"incomplete message, size too small: {get_length(data) - start}, "
+                f"expect {trailer_end - start}."
+            )
+
+        if cls._trailer(data[start:end]) != data[end:trailer_end]:
+            raise ValueError(f"{cls.__name__} checksum mismatch.")
+
+        return trailer_end
+
     @classmethod
-    def from_bytes(cls, data):
+    def _trailer(cls, body):
+        checksum = cls._checksum()
+        checksum.update(body)
+        return checksum.digest()
+
+    def digest(self):
+        """ The checksum of the message, see `ChecksumAlgorithm`
+
+            The checksum is computed while packing, messages with cache
+            enabled and frozen messages return the checksum of their kept
+            bytes. It can be used to deduplicate messages.
+
+            Returns:
+                digest (bytes): the checksum trailer of the packed message
+
+            Raises:
+                TypeError: the message has no checksum
+        """
+        if self._checksum is None:
+            raise TypeError(f"{self.__class__.__name__} has no checksum.")
+
+        return self.pack()[-self._checksum_size :]
+
+    @classmethod
+    def from_bytes(cls, data, trusted=False, frozen=False, limits=None):
         """ Unpack data and return message instance and the number of processed bytes
 
             Arguments:
                 data (bytes): bytes to unpack
+                trusted (bool): skip per-field checks, data must have been
+                                checked with `validate`
+                frozen (bool): return a frozen message, see `freeze`
+                limits (DecodeLimits): limits checked before decoding, unless
+                                       trusted
 
             Returns:
                 tuple(Message, int): the message instance and the number of processed bytes
 
             Raises:
-                ValueError: the given data is incomplete
+                ValueError: the given data is incomplete or exceeds the limits
         """
 
         obj = cls()
-        length = obj.unpack(data)
+        length = obj.unpack(data, trusted=trusted, limits=limits)
+
+        if frozen:
+            obj.freeze()
+
         return (obj, length)
 
+    def freeze(self):
+        """ Make the message immutable
+
+            Nested messages are frozen and arrays turned into tuples of
+            frozen items, lazy arrays decode frozen items. A frozen message keeps its packed bytes, so it can be
+            shared and packed across threads without copying. Frozen messages
+            are compared and hashed by value, mutable ones by identity, so the
+            hash of a message changes when it is frozen.
+
+            Returns:
+                msg (Message): the message itself
+        """
+        if self._frozen:
+            return self
+
+        for v in self._fields.values():
+            if isinstance(v, Message):
+                v.freeze()
+            elif isinstance(v, Array):
+                v.val = _freeze_items(v.val)
+
+        object.__setattr__(self, "_packed", self.pack())
+        object.__setattr__(self, "_frozen", True)
+
+        return self
+
+    def thaw(self):
+        """ Get a mutable copy of the message
+
+            Returns:
+                msg (Message): a new, mutable message
+        """
+        obj = self.__class__()
+        obj.unpack(self.pack(), trusted=True)
+
+        return obj
+
+    def to_dict(self):
+        """ Get the field values as a dict
+
+            Nested messages are converted to dicts and arrays to lists.
+
+            Returns:
+                values (dict): field values keyed by field name
+        """
+        if self._struct is not None:
+            return {name: v.val for name, v in self._fields.items()}
+
+        return {name: _to_plain(v, True) for name, v in self._fields.items()}
+
+    def to_tuple(self):
+        """ Get the field values as a tuple, in field order
+
+            Nested messages are converted to tuples and arrays to lists.
+
+            Returns:
+                values (tuple): field values
+        """
+        if self._struct is not None:
+            return tuple([v.val for v in self._fields.values()])
+
+        return tuple([_to_plain(v, False) for v in self._fields.values()])
+
+    @classmethod
+    def from_dict(cls, values):
+        """ Create a message from field values
+
+            Unlike keyword arguments of the constructor, nested messages are
+            created from dicts as well. Missing or None values are defaulted.
+
+            Arguments:
+                values (dict): field values keyed by field name, in the
+                               layout returned by `to_dict`
+
+            Returns:
+                msg (Message): the message instance
+        """
+        obj = cls.__new__(cls)
+        obj._fields = OrderedDict(
+            (field.__name__, _from_plain(field, values.get(field.__name__)))
+            for field in cls.Fields
+        )
+
+        return obj
+
+    @classmethod
+    def decode_to_dict(cls, data, limits=None):
+        """ Decode data into field values without creating the message
+
+            No message or field object is created, the layout returned is
+            the one of `to_dict`.
+
+            Arguments:
+                data (bytes): bytes to decode
+                limits (DecodeLimits): limits to enforce
+
+            Returns:
+                tuple(dict, int): the field values and the number of processed bytes
+
+            Raises:
+                ValueError: the given data is incomplete or exceeds the limits
+        """
+        length = cls.validate(data, limits=limits)
+        values, _ = _plain_codec(cls)[0](memoryview(data), 0)
+
+        return (values, length)
+
+    @classmethod
+    def encode_from_dict(cls, values):
+        """ Encode field values without creating the message
+
+            Arguments:
+                values (dict): field values keyed by field name, in the
+                               layout returned by `to_dict`. Missing or None
+                               values are defaulted.
+
+            Returns:
+                raw (bytes): Packed data in bytes
+        """
+        out = bytearray()
+        _plain_codec(cls)[1](values, out)
+
+        return bytes(out)
+
+    def enable_cache(self):
+        """ Keep the packed bytes of the message until it is modified
+
+            Nested messages and messages in array fields are cached as well.
+            Setting a field, unpacking, modifying a nested message or an array
+            field (list methods) invalidates the cache of the message and of
+            all its parents, other subtrees are packed from their cached bytes.
+            Primitive items of array fields must be replaced, not modified in
+            place.
+
+            Array fields hold a tracked copy of the assigned lists while the
+            cache is enabled: modify them through the message, not through
+            the original list.
+
+            Returns:
+                msg (Message): the message itself
+        """
+        if not self._frozen:
+            object.__setattr__(self, "_cache_enabled", True)
+            object.__setattr__(self, "_packed", None)
+            self._adopt()
+
+        return self
+
+    def disable_cache(self):
+        """ Stop keeping the packed bytes of the message
+
+            Returns:
+                msg (Message): the message itself
+        """
+        if not self._frozen:
+            object.__setattr__(self, "_cache_enabled", False)
+            object.__setattr__(self, "_packed", None)
+
+        return self
+
+    def _adopt(self):
+        """ Track nested messages and arrays so that they invalidate the cache
+        """
+        for v in self._fields.values():
+            self._track(v)
+
+    def _track(self, v):
+        if isinstance(v, Message):
+            v._attach(self)
+        elif isinstance(v, Array) and isinstance(v.val, list):
+            if not isinstance(v.val, _TrackedList):
+                v.val = _TrackedList(v.val, self)
+
+            for item in v.val:
+                if isinstance(item, Message):
+                    item._attach(self)
+        elif isinstance(v, Array) and isinstance(v.val, _LazyItems):
+            v.val._adopt(self)
+
+    def _attach(self, parent):
+        if self._frozen:
+            return
+
+        # a message may be shared by several parents, which must not be kept
+        # alive by it; keyed by id as frozen parents hash by value
+        if self._parents is None:
+            object.__setattr__(self, "_parents", {})
+
+        self._parents[id(parent)] = weakref.ref(parent)
+        object.__setattr__(self, "_cache_enabled", True)
+
+    def _invalidate(self):
+        pending = [self]
+        seen = set()
+        while pending:
+            msg = pending.pop()
+            if msg is None or msg._frozen or id(msg) in seen:
+                continue
+
+            seen.add(id(msg))
+            object.__setattr__(msg, "_packed", None)
+            if msg._parents is not None:
+                pending.extend(ref() for ref in msg._parents.values())
+
+    @property
+    def frozen(self):
+        """ Whether the message is frozen
+        """
+        return self._frozen
+
     def __repr__(self):
         fields_str = " ".join(f"{k}={str(v)}" for k, v in self._fields.items())
         return f"<{self.__class__.__name__} {fields_str}>"
@@ -101,13 +890,616 @@ class Message:
             object.__setattr__(self, attr, val)
             return
 
-        self._fields[attr].val = val
+        if self._frozen:
+            raise AttributeError(f"{self.__class__.__name__} is frozen.")
+
+        field = self._fields[attr]
+        field.val = val
+
+        if self._cache_enabled:
+            self._track(field)
+            self._invalidate()
+
+    def __eq__(self, other):
+        # mutable messages are compared by identity
+        if not (self._frozen and isinstance(other, Message) and other._frozen):
+            return NotImplemented
+
+        return self.__class__ is other.__class__ and self._packed == other._packed
+
+    def __hash__(self):
+        if not self._frozen:
+            return object.__hash__(self)
+
+        return hash((self.__class__, self._packed))
+
+    @classmethod
+    def fixed_size(cls):
+        """ The encoded size of the message if its layout is fixed, None otherwise
+        """
+        return cls._fixed_size
+
+    @classmethod
+    def field_offset(cls, name):
+        """ The offset of a field in an encoded fixed-layout message
+
+            Arguments:
+                name (str): field name
+
+            Returns:
+                offset (int): offset of the field
+
+            Raises:
+                TypeError: the message layout is not fixed
+                KeyError: the message has no such field
+        """
+        if cls._offsets is None:
+            raise TypeError(f"{cls.__name__} has no fixed layout.")
+
+        return cls._offsets[name]
+
+    @classmethod
+    def view_struct(cls, buf, offset=0):
+        """ Get a view of a fixed-layout message encoded in a buffer
+
+            Field attributes of the view read and write the buffer at the
+            field offsets, without decoding or encoding the message. Nested
+            messages and fixed-size arrays are views as well.
+
+            Arguments:
+                buf: bytes-like object, writable to assign fields
+                offset (int): offset of the message in the buffer
+
+            Returns:
+                view: the message view
+
+            Raises:
+                TypeError: the message layout is not fixed, or it holds
+                           checksums that writes would not update
+                ValueError: the buffer is too small
+        """
+        if cls._offsets is None:
+            raise TypeError(f"{cls.__name__} has no fixed layout.")
+
+        if cls._checksummed:
+            raise TypeError(f"{cls.__name__} has checksums, it cannot be viewed.")
+
+        buf = memoryview(buf)
+        if offset + cls._fixed_size > get_length(buf):
+            raise ValueError(
+                f"size too small: {get_length(buf) - offset}, expect {cls._fixed_size}."
+            )
+
+        view_cls = cls.__dict__.get("_view_cls")
+        if view_cls is None:
+            view_cls = cls._view_cls = _message_view_class(cls)
+
+        return view_cls(buf, offset)
+
+    @classmethod
+    def _byte_order_overrides(cls, order):
+        return {} if cls.ByteOrder == order else {"ByteOrder": order}
+
+    @classmethod
+    def _from_variant(cls, other):
+        """ Convert an instance of another byte order variant of the message
+        """
+        obj = cls.__new__(cls)
+        obj._fields = OrderedDict(
+            (field.__name__, _coerce(other._fields[field.__name__], field))
+            for field in cls.Fields
+        )
+        return obj
+
+    def is_default(self):
+        """ Whether every field of the message holds its default value
+        """
+        return all(field.is_default() for field in self._fields.values())
 
     @property
     def size(self):
         """ The raw (bytes) size of the messages
         """
-        return sum([field.size for field in self._fields.values()])
+        if self._packed is not None:
+            return len(self._packed)
+
+        if self._fixed_size is not None:
+            return self._fixed_size
+
+        size = self._checksum_size
+        if self._envelope is not None:
+            size += self._envelope.size
+
+        if self._optional is None:
+            return size + sum([field.size for field in self._fields.values()])
+
+        present = self._presence()
+        return (
+            size
+            + bitmap_size(sum(self._optional))
+            + sum([field.size for field, p in zip(self._fields.values(), present) if p])
+        )
+
+
+class _Checksummed:
+    """ Writer updating a checksum with the data written through it
+    """
+
+    __slots__ = ("_out", "checksum")
+
+    def __init__(self, out, checksum):
+        self._out = out
+        self.checksum = checksum
+
+    def write(self, data):
+        self.checksum.update(data)
+        self._out.write(data)
+
+
+class _TrackedList(list):
+    """ List invalidating the cache of its owner message on modification
+    """
+
+    __slots__ = ("_owner",)
+
+    def __init__(self, iterable, owner):
+        super().__init__(iterable)
+        self._owner = owner
+
+
+def _tracked(name):
+    method = getattr(list, name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._owner._invalidate()
+        return result
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in (
+    "__setitem__",
+    "__delitem__",
+    "__iadd__",
+    "__imul__",
+    "append",
+    "extend",
+    "insert",
+    "pop",
+    "remove",
+    "clear",
+    "sort",
+    "reverse",
+):
+    setattr(_TrackedList, _name, _tracked(_name))
+
+
+class _View:
+    """ Base class of views over fixed-layout data in a buffer
+    """
+
+    __slots__ = ("_buf", "_offset")
+
+    SIZE = 0
+
+    def __init__(self, buf, offset):
+        self._buf = buf
+        self._offset = offset
+
+    def pack(self):
+        """ The bytes of the viewed data
+        """
+        return self._buf[self._offset : self._offset + self.SIZE].tobytes()
+
+
+class _MessageView(_View):
+    __slots__ = ()
+
+    MESSAGE = None
+
+    def unpack(self):
+        """ Decode the viewed message
+        """
+        return self.MESSAGE.from_bytes(self._buf[self._offset :], trusted=True)[0]
+
+    def __repr__(self):
+        fields = ", ".join(
+            f"{field.__name__}={getattr(self, field.__name__)!r}"
+            for field in self.MESSAGE.Fields
+        )
+        return f"<{self.__class__.__name__} {fields}>"
+
+
+class _ArrayView(_View):
+    """ View over a fixed-size array, items are read and written in place
+    """
+
+    __slots__ = ("_read", "_write", "_count", "_stride")
+
+    def __init__(self, buf, offset, array_cls):
+        super().__init__(buf, offset)
+        self._read, self._write = _accessors(array_cls.TYPE)
+        self._count = array_cls.COUNT
+        self._stride = array_cls.TYPE.fixed_size()
+
+    @property
+    def SIZE(self):
+        return self._count * self._stride
+
+    def __len__(self):
+        return self._count
+
+    def _item_offset(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("array index out of range.")
+
+        return self._offset + i * self._stride
+
+    def __getitem__(self, i):
+        return self._read(self._buf, self._item_offset(i))
+
+    def __setitem__(self, i, value):
+        self._write(self._buf, self._item_offset(i), value)
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def _accessors(field_cls):
+    """ Get read(buf, offset) and write(buf, offset, value) of a fixed-size field
+    """
+    if issubclass(field_cls, Message):
+
+        def read(buf, offset):
+            return field_cls.view_struct(buf, offset)
+
+        def write(buf, offset, value):
+            _coerce(value, field_cls)._pack_into(buf, offset)
+
+    elif issubclass(field_cls, Array):
+
+        def read(buf, offset):
+            return _ArrayView(buf, offset, field_cls)
+
+        def write(buf, offset, values):
+            view = read(buf, offset)
+            if get_length(values) != len(view):
+                raise ValueError(
+                    f"invalid array length: {get_length(values)}, expect {len(view)}."
+                )
+
+            for i, value in enumerate(values):
+                view[i] = value
+
+    else:
+        s = field_cls.STRUCT
+        plain = field_cls._struct_value is Primitive._struct_value
+
+        def read(buf, offset):
+            val = s.unpack_from(buf, offset)[0]
+            if plain:
+                return val
+
+            field = field_cls()
+            field._from_struct_value(val)
+            return field.val
+
+        def write(buf, offset, value):
+            if isinstance(value, field_cls):
+                value = value.val
+
+            try:
+                s.pack_into(
+                    buf, offset, value if plain else field_cls(value)._struct_value()
+                )
+            except struct.error as e:
+                raise ValueError(f"cannot pack into buffer: {e}.")
+
+    return (read, write)
+
+
+def _field_property(field_cls, field_offset):
+    read, write = _accessors(field_cls)
+
+    def getter(self):
+        return read(self._buf, self._offset + field_offset)
+
+    def setter(self, value):
+        write(self._buf, self._offset + field_offset, value)
+
+    return property(getter, setter)
+
+
+def _message_view_class(cls):
+    attrs = {
+        field.__name__: _field_property(field, cls._offsets[field.__name__])
+        for field in cls.Fields
+    }
+
+    return type(
+        f"{cls.__name__}View",
+        (_MessageView,),
+        {**attrs, "MESSAGE": cls, "SIZE": cls._fixed_size, "__slots__": ()},
+    )
+
+
+def _to_plain(v, as_dict):
+    """ Get the plain value of a field, messages as dicts or tuples
+    """
+    if isinstance(v, Message):
+        return v.to_dict() if as_dict else v.to_tuple()
+
+    if isinstance(v, Array):
+        return [_to_plain(item, as_dict) for item in v.val]
+
+    return v.val
+
+
+def _from_plain(field_cls, value):
+    """ Create a field from a plain value
+    """
+    if value is None:
+        return field_cls()
+
+    if issubclass(field_cls, Message):
+        return field_cls.from_dict(value)
+
+    if issubclass(field_cls, Array):
+        return field_cls([_from_plain(field_cls.TYPE, item) for item in value])
+
+    return field_cls(value)
+
+
+# (decode, encode) of plain values, keyed by field class
+_plain_codecs = {}
+
+
+def _plain_codec(field_cls):
+    """ Get decode(data, offset) and encode(value, out) of plain values
+
+        decode reads validated data and returns (value, end), encode appends
+        the encoding of a value, None for the default value, to a bytearray.
+    """
+    codec = _plain_codecs.get(field_cls)
+    if codec is None:
+        if issubclass(field_cls, Message):
+            codec = _message_codec(field_cls)
+        elif issubclass(field_cls, Array):
+            codec = _array_codec(field_cls)
+        elif issubclass(field_cls, Primitive):
+            codec = _primitive_codec(field_cls)
+        elif issubclass(field_cls, (Bytes, String)):
+            codec = _prefixed_codec(field_cls)
+        else:
+            codec = _field_codec(field_cls)
+
+        _plain_codecs[field_cls] = codec
+
+    return codec
+
+
+def _field_codec(field_cls):
+    def decode(data, offset):
+        obj = field_cls()
+        end = obj._unpack_trusted(data, offset)
+        return (_to_plain(obj, True), end)
+
+    def encode(value, out):
+        out += _from_plain(field_cls, value).pack()
+
+    return (decode, encode)
+
+
+def _primitive_codec(field_cls):
+    s = field_cls.STRUCT
+    default = field_cls().val
+
+    if field_cls._from_struct_value is Primitive._from_struct_value:
+
+        def decode(data, offset):
+            return (s.unpack_from(data, offset)[0], offset + s.size)
+
+    else:
+
+        def decode(data, offset):
+            obj = field_cls()
+            obj._from_struct_value(s.unpack_from(data, offset)[0])
+            return (obj.val, offset + s.size)
+
+    if field_cls._struct_value is Primitive._struct_value:
+
+        def encode(value, out):
+            out += s.pack(default if value is None else value)
+
+    else:
+
+        def encode(value, out):
+            out += s.pack(field_cls(value)._struct_value())
+
+    return (decode, encode)
+
+
+def _prefixed_codec(field_cls):
+    s = field_cls.LENGTH_STRUCT
+    text = issubclass(field_cls, String)
+
+    def decode(data, offset):
+        start = offset + s.size
+        end = start + s.unpack_from(data, offset)[0]
+        if text:
+            return (str(data[start:end], "utf-8"), end)
+
+        return (data[start:end].tobytes(), end)
+
+    def encode(value, out):
+        if text and value:
+            value = value.encode("utf-8")
+
+        out += s.pack(get_length(value))
+        if value:
+            out += value
+
+    return (decode, encode)
+
+
+def _array_codec(array_cls):
+    type_ = array_cls.TYPE
+    read_count = array_cls._read_count
+    count_prefix = array_cls._count_prefix
+
+    if (
+        issubclass(type_, Primitive)
+        and type_._struct_value is Primitive._struct_value
+        and type_._from_struct_value is Primitive._from_struct_value
+    ):
+        # all items are unpacked and packed by a single struct call
+        order, code = split_format(type_.STRUCT.format)
+        item_size = type_.STRUCT.size
+
+        def decode(data, offset):
+            count, offset = read_count(data, offset)
+            items = struct.unpack_from(f"{order}{count}{code}", data, offset)
+            return (list(items), offset + count * item_size)
+
+        def encode(values, out):
+            values = [] if values is None else values
+            out += count_prefix(len(values))
+            out += struct.pack(f"{order}{len(values)}{code}", *values)
+
+        return (decode, encode)
+
+    decode_item, encode_item = _plain_codec(type_)
+
+    def decode(data, offset):
+        count, offset = read_count(data, offset)
+        items = []
+        for _ in range(count):
+            item, offset = decode_item(data, offset)
+            items.append(item)
+
+        return (items, offset)
+
+    def encode(values, out):
+        if values is None:
+            out += array_cls().pack()
+            return
+
+        out += count_prefix(len(values))
+        for item in values:
+            encode_item(item, out)
+
+    return (decode, encode)
+
+
+def _message_codec(cls):
+    names = [field.__name__ for field in cls.Fields]
+    codecs = [_plain_codec(field) for field in cls.Fields]
+    checksum_size = cls._checksum_size
+
+    if cls._struct is not None:
+        # a single struct, which holds the padding of native aligned messages
+        s = cls._struct
+        plain = cls._struct_plain
+        defaults = [field().val for field in cls.Fields]
+
+        def from_struct(field_cls, value):
+            obj = field_cls()
+            obj._from_struct_value(value)
+            return obj.val
+
+        def decode(data, offset):
+            values = s.unpack_from(data, offset)
+            if not plain:
+                values = map(from_struct, cls.Fields, values)
+
+            return (dict(zip(names, values)), offset + s.size + checksum_size)
+
+        def encode(values, out):
+            values = values or {}
+            values = [
+                default if v is None else v
+                for v, default in zip(map(values.get, names), defaults)
+            ]
+            if not plain:
+                values = [
+                    field(v)._struct_value() for field, v in zip(cls.Fields, values)
+                ]
+
+            body = s.pack(*values)
+            out += body
+            if checksum_size:
+                out += cls._trailer(body)
+
+        return (decode, encode)
+
+    optional = cls._optional or [False] * len(cls.Fields)
+
+    def decode(data, offset):
+        present = [True] * len(names)
+        end = None
+        if cls._optional is not None:
+            n = sum(cls._optional)
+            bits = iter(unpack_bitmap(data[offset:], n))
+            present = [not opt or next(bits) for opt in cls._optional]
+            offset += bitmap_size(n)
+        elif cls._envelope is not None:
+            end = offset + cls._envelope.size
+            end += cls._envelope.unpack_from(data, offset)[0]
+            offset += cls._envelope.size
+
+        values = {}
+        for field, name, (decode_field, _), p in zip(
+            cls.Fields, names, codecs, present
+        ):
+            if not p or (end is not None and offset >= end):
+                # absent field, or unknown to the writer of an envelope
+                values[name] = _to_plain(field(), True)
+                continue
+
+            values[name], offset = decode_field(data, offset)
+
+        return (values, (offset if end is None else end) + checksum_size)
+
+    def encode(values, out):
+        values = [] if values is None else list(map(values.get, names))
+        values += [None] * (len(names) - len(values))
+        start = len(out)
+
+        if cls._envelope is not None:
+            out += bytes(cls._envelope.size)
+        elif cls._optional is not None:
+            present = [
+                not (opt and (value is None or _from_plain(field, value).is_default()))
+                for field, value, opt in zip(cls.Fields, values, optional)
+            ]
+            out += pack_bitmap(p for p, opt in zip(present, optional) if opt)
+            values = [value if p else _ABSENT for value, p in zip(values, present)]
+
+        for value, (_, encode_field) in zip(values, codecs):
+            if value is not _ABSENT:
+                encode_field(value, out)
+
+        if cls._envelope is not None:
+            size = cls._envelope.size
+            cls._envelope.pack_into(out, start, len(out) - start - size)
+
+        if checksum_size:
+            with memoryview(out) as buf, buf[start:] as body:
+                trailer = cls._trailer(body)
+            out += trailer
+
+    return (decode, encode)
+
+
+_ABSENT = object()
 
 
 __all__ = ["Message"]
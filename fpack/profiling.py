@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+
+""" fpack per-field profiler
+
+    profile replays sample buffers through the decoder and the encoder of a
+    message class, one field at a time, and breaks the time and the memory
+    allocated down per field path, e.g. `Catalog.Items[].Name`.
+
+    Costs are self costs: the cost of a nested message or array excludes the
+    cost of its fields or items, and the measured overhead of the profiler
+    itself. Messages packed with a single struct, arrays of primitives and
+    lazy arrays are measured as a whole.
+"""
+
+import tracemalloc
+from collections import OrderedDict
+from time import perf_counter_ns
+
+from fpack.fields import Array
+from fpack.msg import Message
+from fpack.utils import bitmap_size, unpack_bitmap
+
+_COUNTERS = ("calls", "unpack_ns", "pack_ns", "unpack_alloc", "pack_alloc")
+
+
+def _is_container(cls):
+    if issubclass(cls, Message):
+        return cls._struct is None
+
+    if issubclass(cls, Array):
+        return (
+            not getattr(cls, "LAZY", False)
+            and getattr(cls, "ITEMS_STRUCT", None) is None
+        )
+
+    return False
+
+
+class _Profiler:
+    def __init__(self, measure, calibrate=False):
+        self.measure = measure
+        self.entries = {}
+        self.children = [0]
+        self.overhead = 0
+
+        if calibrate:
+            self.overhead = self._calibrate()
+
+    def _calibrate(self, rounds=1000):
+        """ Estimate the cost of record() outside of the measured call
+        """
+        costs = []
+        for _ in range(rounds):
+            start = self.measure()
+            self.record("", "unpack_ns", lambda: None)
+            costs.append(self.measure() - start - self.children.pop())
+            self.children.append(0)
+
+        self.entries.clear()
+        return sorted(costs)[rounds // 2]
+
+    def record(self, path, key, func):
+        """ Call func and add its self cost to path
+        """
+        self.children.append(0)
+        start = self.measure()
+        result = func()
+        cost = self.measure() - start
+        children = self.children.pop()
+
+        self.children[-1] += cost + self.overhead
+        entry = self.entries.setdefault(path, dict.fromkeys(_COUNTERS, 0))
+        entry[key] += max(cost - children, 0)
+        if key.startswith("unpack"):
+            entry["calls"] += 1
+
+        return result
+
+    def decode(self, cls, data, offset, path, key):
+        if not _is_container(cls):
+            obj = cls()
+            return (obj, offset + obj.unpack(data[offset:]))
+
+        if issubclass(cls, Array):
+            obj = cls([])
+            count, offset = cls._read_count(data, offset)
+            for _ in range(count):
+                item, offset = self.record(
+                    f"{path}[]",
+                    key,
+                    lambda: self.decode(cls.TYPE, data, offset, f"{path}[]", key),
+                )
+                obj.val.append(item)
+
+            return (obj, offset)
+
+        # fields are created as they are decoded, absent ones by default
+        obj = cls.__new__(cls)
+        obj._fields = OrderedDict()
+
+        present = [True] * len(cls.Fields)
+        end = None
+        if cls._optional is not None:
+            n = sum(cls._optional)
+            bits = iter(unpack_bitmap(data[offset:], n))
+            present = [not opt or next(bits) for opt in cls._optional]
+            offset += bitmap_size(n)
+        elif cls._envelope is not None:
+            end = offset + cls._envelope.size
+            end += cls._envelope.unpack_from(data, offset)[0]
+            offset += cls._envelope.size
+
+        for field, p in zip(cls.Fields, present):
+            name = field.__name__
+            if not p or (end is not None and offset >= end):
+                obj._fields[name] = field()
+                continue
+
+            obj._fields[name], offset = self.record(
+                f"{path}.{name}",
+                key,
+                lambda: self.decode(field, data, offset, f"{path}.{name}", key),
+            )
+
+        # checksums were verified when the samples were validated
+        return (obj, (offset if end is None else end) + cls._checksum_size)
+
+    def encode(self, obj, path, key):
+        if not _is_container(obj.__class__) or (
+            isinstance(obj, Array) and not isinstance(obj.val, list)
+        ):
+            return obj.pack()
+
+        if isinstance(obj, Array):
+            chunks = [obj._count_prefix(len(obj.val))]
+            for item in obj.val:
+                chunks.append(
+                    self.record(
+                        f"{path}[]", key, lambda: self.encode(item, f"{path}[]", key)
+                    )
+                )
+
+            return b"".join(chunks)
+
+        bitmap, fields = obj._pack_layout()
+        chunks = [bitmap]
+        for v in fields:
+            name = f"{path}.{v.__class__.__name__}"
+            chunks.append(self.record(name, key, lambda: self.encode(v, name, key)))
+
+        body = b"".join(chunks)
+        if obj._envelope is not None:
+            body = obj._envelope.pack(len(body)) + body
+
+        if obj._checksum is not None:
+            return body + obj._trailer(body)
+
+        return body
+
+    def run(self, cls, samples, key_suffix):
+        path = cls.__name__
+
+        for data in samples:
+            data = memoryview(data)
+            msg, _ = self.record(
+                path,
+                f"unpack_{key_suffix}",
+                lambda: self.decode(cls, data, 0, path, f"unpack_{key_suffix}"),
+            )
+            self.record(
+                path,
+                f"pack_{key_suffix}",
+                lambda: self.encode(msg, path, f"pack_{key_suffix}"),
+            )
+
+
+def _traced_memory():
+    return tracemalloc.get_traced_memory()[0]
+
+
+def profile(cls, samples, repeat=1, trace_memory=True):
+    """ Profile the decoding and encoding of a message class per field
+
+        Arguments:
+            cls (class): message class to profile
+            samples (list): encoded messages of cls
+            repeat (int): number of times the samples are replayed
+            trace_memory (bool): measure allocations with tracemalloc, in a
+                                 separate pass
+
+        Returns:
+            entries (list): one dict per field path with `path`, `calls`,
+                            `unpack_ns`, `pack_ns`, `unpack_alloc` and
+                            `pack_alloc` (bytes allocated and kept), sorted
+                            by decreasing time
+
+        Raises:
+            ValueError: a sample is incomplete
+    """
+    samples = list(samples)
+    for data in samples:
+        cls.validate(data)
+
+    timing = _Profiler(perf_counter_ns, calibrate=True)
+    for _ in range(repeat):
+        timing.run(cls, samples, "ns")
+
+    entries = timing.entries
+
+    if trace_memory:
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+
+        try:
+            memory = _Profiler(_traced_memory)
+            memory.run(cls, samples, "alloc")
+        finally:
+            if not tracing:
+                tracemalloc.stop()
+
+        for path, counters in memory.entries.items():
+            entry = entries[path]
+            entry["unpack_alloc"] = counters["unpack_alloc"] // max(len(samples), 1)
+            entry["pack_alloc"] = counters["pack_alloc"] // max(len(samples), 1)
+
+    result = [dict(path=path, **counters) for path, counters in entries.items()]
+    result.sort(key=lambda entry: entry["unpack_ns"] + entry["pack_ns"], reverse=True)
+
+    return result
+
+
+def format_profile(entries):
+    """ Format profile entries as a text table
+
+        Arguments:
+            entries (list): entries returned by `profile`
+
+        Returns:
+            text (str): the report
+    """
+    total = sum(entry["unpack_ns"] + entry["pack_ns"] for entry in entries) or 1
+    width = max([len("path")] + [len(entry["path"]) for entry in entries])
+
+    lines = [
+        f"{'path':<{width}} {'calls':>8} {'unpack us':>10} {'pack us':>10} "
+        f"{'share':>6} {'unpack B':>9} {'pack B':>9}"
+    ]
+    for entry in entries:
+        share = (entry["unpack_ns"] + entry["pack_ns"]) / total
+        lines.append(
+            f"{entry['path']:<{width}} {entry['calls']:>8} "
+            f"{entry['unpack_ns'] / 1000:>10.1f} {entry['pack_ns'] / 1000:>10.1f} "
+            f"{share:>6.1%} {entry['unpack_alloc']:>9} {entry['pack_alloc']:>9}"
+        )
+
+    return "\n".join(lines) + "\n"
+
+
+__all__ = ["profile", "format_profile"]
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+""" fpack shared memory transport
+
+    RingBuffer passes messages of one class between a producer and a consumer
+    process through a ring of fixed-size slots in a shared memory block.
+    Producers pack messages directly into the slots and consumers decode them
+    from the mapped memory, so no intermediate copy or syscall is needed per
+    message.
+
+    Each slot starts with a sequence number, the payload length and the number
+    of messages in the slot. The producer writes the payload first and commits
+    the slot by storing `seq + 1`; the consumer decodes a slot only when it
+    holds the expected sequence number and releases it by storing 0. The ring
+    supports a single producer and a single consumer.
+"""
+
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+_HEADER = struct.Struct("=4sII")
+_COUNTERS = struct.Struct("=Q")
+_SLOT_HEADER = struct.Struct("=QII")
+
+_MAGIC = b"FPRB"
+_HEAD_OFFSET = 64
+_TAIL_OFFSET = 128
+_SLOTS_OFFSET = 192
+
+POLL_INTERVAL = 0.00005
+
+# names of the blocks created by this process
+_created = set()
+
+
+class RingBuffer:
+    """ RingBuffer
+
+        Single-producer single-consumer ring buffer over shared memory.
+
+        Arguments:
+            cls (class): message class carried by the ring
+            name (str): name of the shared memory block, a random name is used
+                        when creating a block without name
+            slots (int): number of slots, used when creating the block
+            slot_size (int): maximum payload size of a slot in bytes, used when
+                             creating the block
+            create (bool): create a new block, or attach to an existing one
+    """
+
+    def __init__(self, cls, name=None, slots=1024, slot_size=4096, create=True):
+        self.cls = cls
+
+        if create:
+            size = _SLOTS_OFFSET + slots * (_SLOT_HEADER.size + slot_size)
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            _created.add(self._shm._name)
+            _HEADER.pack_into(self._shm.buf, 0, _MAGIC, slots, slot_size)
+        else:
+            self._shm = _attach(name)
+            magic, slots, slot_size = _HEADER.unpack_from(self._shm.buf, 0)
+            if magic != _MAGIC:
+                self._shm.close()
+                raise ValueError(f"{name} is not a fpack ring buffer.")
+
+        self.slots = slots
+        self.slot_size = slot_size
+        self._buf = self._shm.buf
+        self._stride = _SLOT_HEADER.size + slot_size
+
+    @property
+    def name(self):
+        """ Name of the shared memory block
+        """
+        return self._shm.name
+
+    def _counter(self, offset):
+        return _COUNTERS.unpack_from(self._buf, offset)[0]
+
+    def _slot(self, seq):
+        return _SLOTS_OFFSET + (seq % self.slots) * self._stride
+
+    def __len__(self):
+        return self._counter(_HEAD_OFFSET) - self._counter(_TAIL_OFFSET)
+
+    def send(self, msg, block=True, timeout=None):
+        """ Send a message
+
+            Arguments:
+                msg (Message): message to send
+                block (bool): wait for a free slot
+                timeout (float): maximum time to wait in seconds
+
+            Returns:
+                sent (bool): False if no slot was free
+
+            Raises:
+                ValueError: the message does not fit in a slot
+        """
+        return self.send_batch([msg], block=block, timeout=timeout)
+
+    def send_batch(self, msgs, block=True, timeout=None):
+        """ Send several messages in a single slot
+
+            Arguments:
+                msgs (list): messages to send
+                block (bool): wait for a free slot
+                timeout (float): maximum time to wait in seconds
+
+            Returns:
+                sent (bool): False if no slot was free
+
+            Raises:
+                ValueError: the messages do not fit in a slot
+        """
+        seq = self._counter(_HEAD_OFFSET)
+        slot = self._slot(seq)
+
+        if not _wait(lambda: self._counter(slot) == 0, block, timeout):
+            return False
+
+        start = slot + _SLOT_HEADER.size
+        payload = self._buf[start : start + self.slot_size]
+        try:
+            offset = 0
+            for msg in msgs:
+                offset += msg.pack_into(payload, offset)
+        finally:
+            payload.release()
+
+        _SLOT_HEADER.pack_into(self._buf, slot, 0, offset, len(msgs))
+        _COUNTERS.pack_into(self._buf, slot, seq + 1)
+        _COUNTERS.pack_into(self._buf, _HEAD_OFFSET, seq + 1)
+
+        return True
+
+    def recv(self, block=True, timeout=None):
+        """ Receive a message
+
+            Arguments:
+                block (bool): wait for a message
+                timeout (float): maximum time to wait in seconds
+
+            Returns:
+                msg (Message): the message, None if no message was available
+        """
+        msgs = self.recv_batch(block=block, timeout=timeout)
+
+        return msgs[0] if msgs else None
+
+    def recv_batch(self, block=True, timeout=None):
+        """ Receive the messages of the next slot
+
+            Arguments:
+                block (bool): wait for a message
+                timeout (float): maximum time to wait in seconds
+
+            Returns:
+                msgs (list): the messages, empty if no message was available
+        """
+        seq = self._counter(_TAIL_OFFSET)
+        slot = self._slot(seq)
+
+        if not _wait(lambda: self._counter(slot) == seq + 1, block, timeout):
+            return []
+
+        _, length, count = _SLOT_HEADER.unpack_from(self._buf, slot)
+        start = slot + _SLOT_HEADER.size
+        payload = self._buf[start : start + length]
+        try:
+            msgs = []
+            offset = 0
+            for _ in range(count):
+                msg = self.cls()
+                offset += msg.unpack(payload[offset:])
+                msgs.append(msg)
+        finally:
+            payload.release()
+
+        _COUNTERS.pack_into(self._buf, slot, 0)
+        _COUNTERS.pack_into(self._buf, _TAIL_OFFSET, seq + 1)
+
+        return msgs
+
+    def close(self):
+        """ Detach from the shared memory block
+        """
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self):
+        """ Destroy the shared memory block
+        """
+        self._shm.unlink()
+        _created.discard(self._shm._name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    # python < 3.13 has no track argument: the resource tracker would unlink
+    # the block when the attaching process exits. Blocks created by this
+    # process, or its parent when forked, share the registration of the
+    # creator, which unlinks them.
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name == "posix" and shm._name not in _created:
+        resource_tracker.unregister(shm._name, "shared_memory")
+
+    return shm
+
+
+def _wait(ready, block, timeout):
+    if ready():
+        return True
+
+    if not block:
+        return False
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not ready():
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
+
+    return True
+
+
+__all__ = ["RingBuffer"]
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+""" fpack codec instrumentation
+
+    Opt-in per-class counters for `Message.pack`, `Message.unpack`,
+    `Message.from_bytes` and the array codecs. Instrumentation swaps the
+    codec methods for timing wrappers on `enable()` and restores the
+    original methods on `disable()`, so it costs nothing while disabled.
+"""
+
+import threading
+from collections import deque
+from time import perf_counter_ns
+
+from fpack.fields import Array
+from fpack.msg import Message
+
+SAMPLES = 1024
+QUANTILES = (0.5, 0.9, 0.99)
+
+_lock = threading.Lock()
+_counters = {}
+_names = {}
+_originals = []
+
+
+class _Counter:
+    __slots__ = ("calls", "bytes", "errors", "time_ns", "samples")
+
+    def __init__(self):
+        self.calls = 0
+        self.bytes = 0
+        self.errors = 0
+        self.time_ns = 0
+        self.samples = deque(maxlen=SAMPLES)
+
+
+def _name(cls):
+    """ Name of the class declared by the user
+
+        Message classes generated by `field_factory` and `with_byte_order`
+        are counted under the message class they derive from.
+    """
+    name = _names.get(cls)
+    if name is None:
+        declared = cls
+        if issubclass(cls, Message):
+            declared = next(c for c in cls.__mro__ if "__slots__" not in vars(c))
+        name = _names[cls] = declared.__name__
+
+    return name
+
+
+def _record(name, op, elapsed, nbytes, error=False):
+    with _lock:
+        counter = _counters.get((name, op))
+        if counter is None:
+            counter = _counters[(name, op)] = _Counter()
+
+        counter.calls += 1
+        counter.bytes += nbytes
+        counter.errors += error
+        counter.time_ns += elapsed
+        counter.samples.append(elapsed)
+
+
+def _wrap_pack(func):
+    def pack(self):
+        start = perf_counter_ns()
+        try:
+            raw = func(self)
+        except Exception:
+            _record(_name(self.__class__), "pack", perf_counter_ns() - start, 0, True)
+            raise
+
+        _record(_name(self.__class__), "pack", perf_counter_ns() - start, len(raw))
+        return raw
+
+    return pack
+
+
+def _wrap_unpack(func):
+    def unpack(self, data, *args, **kwargs):
+        start = perf_counter_ns()
+        try:
+            processed = func(self, data, *args, **kwargs)
+        except Exception:
+            _record(_name(self.__class__), "unpack", perf_counter_ns() - start, 0, True)
+            raise
+
+        _record(_name(self.__class__), "unpack", perf_counter_ns() - start, processed)
+        return processed
+
+    return unpack
+
+
+def _wrap_from_bytes(func):
+    def from_bytes(cls, data, *args, **kwargs):
+        start = perf_counter_ns()
+        try:
+            obj, length = func(cls, data, *args, **kwargs)
+        except Exception:
+            _record(_name(cls), "from_bytes", perf_counter_ns() - start, 0, True)
+            raise
+
+        _record(_name(cls), "from_bytes", perf_counter_ns() - start, length)
+        return (obj, length)
+
+    return classmethod(from_bytes)
+
+
+_WRAPPERS = {
+    "pack": _wrap_pack,
+    "unpack": _wrap_unpack,
+}
+
+
+def _subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _subclasses(subclass)
+
+
+def _swap(cls, attr, wrapper):
+    original = cls.__dict__[attr]
+    func = original.__func__ if isinstance(original, classmethod) else original
+
+    _originals.append((cls, attr, original))
+    setattr(cls, attr, wrapper(func))
+
+
+def enable():
+    """ Enable instrumentation
+
+        Message classes are instrumented through the `Message` base class.
+        Array fields are instrumented if their class exists when `enable()`
+        is called.
+    """
+    if _originals:
+        return
+
+    _swap(Message, "from_bytes", _wrap_from_bytes)
+
+    for cls in (Message, *_subclasses(Message), *_subclasses(Array)):
+        for attr, wrapper in _WRAPPERS.items():
+            if attr in cls.__dict__:
+                _swap(cls, attr, wrapper)
+
+
+def disable():
+    """ Disable instrumentation and restore the original codec methods
+    """
+    while _originals:
+        cls, attr, original = _originals.pop()
+        setattr(cls, attr, original)
+
+
+def is_enabled():
+    """ Whether instrumentation is enabled
+    """
+    return bool(_originals)
+
+
+def reset():
+    """ Clear all counters
+    """
+    with _lock:
+        _counters.clear()
+
+
+def _quantile(samples, q):
+    return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+def snapshot():
+    """ Get a copy of the counters
+
+        Returns:
+            stats (dict): `{class name: {op: counters}}`, where counters hold
+                          `calls`, `bytes`, `errors`, `time_ns` and
+                          `quantiles` (`{q: ns}` over the most recent calls)
+    """
+    result = {}
+
+    with _lock:
+        for (name, op), counter in _counters.items():
+            samples = sorted(counter.samples)
+            result.setdefault(name, {})[op] = {
+                "calls": counter.calls,
+                "bytes": counter.bytes,
+                "errors": counter.errors,
+                "time_ns": counter.time_ns,
+                "quantiles": {q: _quantile(samples, q) for q in QUANTILES},
+            }
+
+    return result
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus(prefix="fpack"):
+    """ Export the counters in Prometheus text format
+
+        Arguments:
+            prefix (str): metric name prefix
+
+        Returns:
+            text (str): the exposition text
+    """
+    stats = snapshot()
+    series = [
+        (f'message="{_escape(name)}",op="{op}"', counters)
+        for name, ops in sorted(stats.items())
+        for op, counters in sorted(ops.items())
+    ]
+
+    lines = []
+    for metric, key, help_ in (
+        ("calls_total", "calls", "Number of codec calls."),
+        ("bytes_total", "bytes", "Number of bytes packed or unpacked."),
+        ("errors_total", "errors", "Number of failed codec calls."),
+    ):
+        lines.append(f"# HELP {prefix}_{metric} {help_}")
+        lines.append(f"# TYPE {prefix}_{metric} counter")
+        for labels, counters in series:
+            lines.append(f"{prefix}_{metric}{{{labels}}} {counters[key]}")
+
+    lines.append(f"# HELP {prefix}_duration_seconds Codec call duration.")
+    lines.append(f"# TYPE {prefix}_duration_seconds summary")
+    for labels, counters in series:
+        for q, ns in counters["quantiles"].items():
+            lines.append(
+                f'{prefix}_duration_seconds{{{labels},quantile="{q}"}} {ns / 1e9}'
+            )
+        lines.append(
+            f"{prefix}_duration_seconds_sum{{{labels}}} {counters['time_ns'] / 1e9}"
+        )
+        lines.append(f"{prefix}_duration_seconds_count{{{labels}}} {counters['calls']}")
+
+    return "\n".join(lines) + "\n"
+
+
+__all__ = [
+    "enable",
+    "disable",
+    "is_enabled",
+    "reset",
+    "snapshot",
+    "to_prometheus",
+]
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+""" fpack stream decoding
+
+    read_message decodes a message from a binary stream, e.g. a file or
+    `socket.makefile("rb")`, reading each field as it is decoded. `Bytes`
+    fields can be streamed to a sink chunk by chunk instead of being kept in
+    the message, so that large payloads never sit whole in memory.
+"""
+
+from fpack.fields import Array, Bytes, DecodeLimits, String
+from fpack.msg import Message
+from fpack.utils import bitmap_size, unpack_bitmap
+
+CHUNK_SIZE = 65536
+
+
+class _Reader:
+    def __init__(self, stream, sinks, limits, chunk_size):
+        self.stream = stream
+        self.sinks = sinks
+        self.limits = limits
+        self.chunk_size = chunk_size
+        self.count = 0
+        # checksums of the messages being read, updated with every read
+        self.checksums = []
+
+    def read(self, n):
+        """ Read exactly n bytes
+        """
+        if self.limits.max_size is not None and self.count + n > self.limits.max_size:
+            raise ValueError(f"message exceeds size limit {self.limits.max_size}.")
+
+        chunks = []
+        remaining = n
+        while remaining:
+            chunk = self.stream.read(remaining)
+            if not chunk:
+                raise ValueError(
+                    f"incomplete message, stream ended after {self.count} bytes."
+                )
+
+            chunks.append(chunk)
+            remaining -= len(chunk)
+            self.count += len(chunk)
+
+        data = b"".join(chunks)
+        for checksum in self.checksums:
+            checksum.update(data)
+
+        return data
+
+    def stream_to(self, sink, n):
+        write = sink.write if hasattr(sink, "write") else sink
+
+        while n:
+            chunk = self.read(min(n, self.chunk_size))
+            write(chunk)
+            n -= len(chunk)
+
+    def skip(self, n):
+        while n:
+            n -= len(self.read(min(n, self.chunk_size)))
+
+    def message(self, cls, path):
+        if cls._checksum is None:
+            return self.fields(cls, path)
+
+        checksum = cls._checksum()
+        self.checksums.append(checksum)
+        try:
+            obj = self.fields(cls, path)
+        finally:
+            self.checksums.pop()
+
+        if self.read(cls._checksum_size) != checksum.digest():
+            raise ValueError(f"{cls.__name__} checksum mismatch.")
+
+        return obj
+
+    def fields(self, cls, path):
+        obj = cls()
+
+        if cls._envelope is not None:
+            end = self.count + cls._envelope.size
+            end += cls._envelope.unpack(self.read(cls._envelope.size))[0]
+
+            for field in cls.Fields:
+                if self.count >= end:
+                    break
+                name = field.__name__
+                obj._fields[name] = self.field(field, f"{path}{name}")
+
+            if self.count > end:
+                raise ValueError(f"field {name} exceeds the message envelope.")
+
+            self.skip(end - self.count)
+            return obj
+
+        present = [True] * len(cls.Fields)
+        if cls._optional is not None:
+            n = sum(cls._optional)
+            bits = iter(unpack_bitmap(self.read(bitmap_size(n)), n))
+            present = [not opt or next(bits) for opt in cls._optional]
+
+        for field, p in zip(cls.Fields, present):
+            if p:
+                name = field.__name__
+                obj._fields[name] = self.field(field, f"{path}{name}")
+
+        return obj
+
+    def field(self, cls, path):
+        # fixed-size fields hold no Bytes field, they are read at once
+        fixed_size = cls.fixed_size()
+        if fixed_size is not None:
+            obj = cls()
+            obj.unpack(self.read(fixed_size))
+            return obj
+
+        if issubclass(cls, Message):
+            return self.message(cls, f"{path}." if path else "")
+
+        if issubclass(cls, Array):
+            if hasattr(cls, "COUNT"):
+                count = cls.COUNT
+            else:
+                raw = self.read(cls.LENGTH_STRUCT.size)
+                count = cls.LENGTH_STRUCT.unpack(raw)[0]
+                self.limits.check_array_count(count)
+
+            return cls([self.field(cls.TYPE, path) for _ in range(count)])
+
+        if issubclass(cls, (Bytes, String)):
+            prefix = self.read(cls.LENGTH_STRUCT.size)
+            length = cls.LENGTH_STRUCT.unpack(prefix)[0]
+            self.limits.check_field_length(length)
+
+            sink = self.sinks.get(path)
+            if sink is not None and issubclass(cls, Bytes):
+                self.stream_to(sink, length)
+                return cls(None)
+
+            obj = cls()
+            obj.unpack(prefix + self.read(length))
+            return obj
+
+        raise TypeError(f"unsupported field type {cls.__name__}.")
+
+
+def read_message(cls, stream, sinks=None, limits=None, chunk_size=CHUNK_SIZE):
+    """ Read a message from a binary stream
+
+        Arguments:
+            cls (class): message class to read
+            stream: binary file-like object with a `read` method
+            sinks (dict): `Bytes` fields to stream instead of keeping them in
+                          the message, keyed by dotted field path, e.g.
+                          "Attachment.Data". A sink is a callable or has a
+                          `write` method, and receives the payload in chunks
+                          of at most chunk_size bytes. Every item of an array
+                          is streamed to the sink of the array. Streamed
+                          fields are None in the returned message.
+            limits (DecodeLimits): limits checked before each read
+            chunk_size (int): maximum size of a streamed chunk
+
+        Returns:
+            tuple(Message, int): the message instance and the number of read bytes
+
+        Raises:
+            ValueError: the stream ended early or the message exceeds the limits
+    """
+    reader = _Reader(stream, sinks or {}, limits or DecodeLimits(), chunk_size)
+    msg = reader.field(cls, "")
+
+    return (msg, reader.count)
+
+
+__all__ = ["read_message"]
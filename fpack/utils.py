@@ -3,8 +3,13 @@
 """ utility functions used by fpack
 """
 
+import hashlib
+import struct
+import zlib
 from io import BytesIO
 
+BYTE_ORDERS = "@=<>!"
+
 
 def get_length(data):
     """ Get length of data
@@ -29,4 +34,230 @@ def get_length(data):
     raise ValueError(f"invalid type {type(data)}.")
 
 
-__all__ = ["get_length"]
+def write_into(buf, offset, data):
+    """ Copy data into buf at offset
+
+        Arguments:
+            buf (memoryview): writable buffer
+            offset (int): offset at which data is written
+            data: bytes-like object to write
+
+        Returns:
+            end (int): offset following the written data
+
+        Raises:
+            ValueError: the buffer is too small
+    """
+
+    end = offset + get_length(data)
+    if end > get_length(buf):
+        raise ValueError(f"buffer too small: {get_length(buf)}, expect {end}.")
+
+    buf[offset:end] = data
+    return end
+
+
+def split_format(fmt):
+    """ Split a single-value struct format into byte order and type code
+
+        Arguments:
+            fmt (str): struct format, e.g. "!I"
+
+        Returns:
+            tuple(str, str): the byte order character ("" if there is none)
+                             and the type code
+    """
+
+    if fmt[0] in BYTE_ORDERS:
+        return (fmt[0], fmt[1:])
+
+    return ("", fmt)
+
+
+def combine_structs(structs):
+    """ Combine single-value structs into a single struct
+
+        Arguments:
+            structs: iterable of struct.Struct
+
+        Returns:
+            struct (struct.Struct): the combined struct, None if the
+                                    structs have different byte orders
+    """
+
+    orders = set()
+    codes = []
+
+    for s in structs:
+        order, code = split_format(s.format)
+        if order:
+            orders.add(order)
+        codes.append(code)
+
+    if len(orders) > 1:
+        return None
+
+    return struct.Struct((orders.pop() if orders else "!") + "".join(codes))
+
+
+def bitmap_size(n):
+    """ Get the size in bytes of a bitmap holding n bits
+
+        Arguments:
+            n (int): number of bits
+    """
+
+    return (n + 7) >> 3
+
+
+def pack_bitmap(bits):
+    """ Pack booleans into a bitmap
+
+        Bit i is stored in byte i // 8 at position i % 8 (LSB first).
+
+        Arguments:
+            bits: iterable of booleans
+
+        Returns:
+            bitmap (bytes): the packed bitmap
+    """
+
+    bits = list(bits)
+    bitmap = bytearray(bitmap_size(len(bits)))
+
+    for i, bit in enumerate(bits):
+        if bit:
+            bitmap[i >> 3] |= 1 << (i & 7)
+
+    return bytes(bitmap)
+
+
+def unpack_bitmap(data, n):
+    """ Unpack a bitmap of n bits
+
+        Arguments:
+            data (bytes): bytes starting with the bitmap
+            n (int): number of bits
+
+        Returns:
+            bits (list): list of n booleans
+
+        Raises:
+            ValueError: the given data is shorter than the bitmap
+    """
+
+    size = bitmap_size(n)
+    if get_length(data) < size:
+        raise ValueError(f"size too short: {get_length(data)}, expect {size}.")
+
+    bitmap = bytes(data[:size])
+
+    return [bool(bitmap[i >> 3] & (1 << (i & 7))) for i in range(n)]
+
+
+class _ZlibChecksum:
+    """ Incremental zlib checksum with the update/digest interface of hashlib
+    """
+
+    __slots__ = ("_func", "_struct", "_value")
+
+    def __init__(self, func, start, struct_):
+        self._func = func
+        self._struct = struct_
+        self._value = start
+
+    def update(self, data):
+        self._value = self._func(data, self._value)
+
+    def digest(self):
+        return self._struct.pack(self._value)
+
+
+_ZLIB_CHECKSUMS = {"crc32": (zlib.crc32, 0), "adler32": (zlib.adler32, 1)}
+
+
+def checksum_factory(name, byte_order="!"):
+    """ Get a constructor of incremental checksums
+
+        Arguments:
+            name (str): "crc32", "adler32" or the name of a hashlib algorithm
+                        with a fixed digest size, e.g. "sha256"
+            byte_order (str): struct byte order of zlib checksums
+
+        Returns:
+            tuple(callable, int): constructor of objects with `update(data)`
+                                  and `digest()` methods, and the digest size
+
+        Raises:
+            ValueError: the algorithm is unknown or has a variable digest size
+    """
+
+    if name in _ZLIB_CHECKSUMS:
+        func, start = _ZLIB_CHECKSUMS[name]
+        s = struct.Struct(f"{byte_order}I")
+        return (lambda: _ZlibChecksum(func, start, s), s.size)
+
+    size = hashlib.new(name).digest_size
+    if not size:
+        raise ValueError(f"checksum {name} has no fixed digest size.")
+
+    # named constructors are faster than hashlib.new
+    new = getattr(hashlib, name, None)
+    return (new if callable(new) else lambda: hashlib.new(name), size)
+
+
+class IOVec:
+    """ IOVec
+
+        Collect buffer segments for scatter-gather output such as
+        `socket.sendmsg` or `os.writev`. Small writes are coalesced into a
+        single segment, buffers of at least `threshold` bytes are kept by
+        reference as segments of their own.
+
+        Arguments:
+            threshold (int): minimum size of a buffer kept by reference
+    """
+
+    def __init__(self, threshold=1024):
+        self.threshold = threshold
+        self.segments = []
+        self._pending = bytearray()
+
+    def write(self, data):
+        """ Append data, by reference if it is large enough
+
+            Arguments:
+                data: bytes-like object to append
+        """
+        if get_length(data) < self.threshold:
+            self._pending += data
+            return
+
+        self._flush()
+        self.segments.append(data)
+
+    def _flush(self):
+        if self._pending:
+            self.segments.append(bytes(self._pending))
+            self._pending = bytearray()
+
+    def getvalue(self):
+        """ Get the collected segments
+
+            Returns:
+                segments (list): list of bytes-like objects
+        """
+        self._flush()
+        return self.segments
+
+
+__all__ = [
+    "get_length",
+    "write_into",
+    "split_format",
+    "combine_structs",
+    "bitmap_size",
+    "pack_bitmap",
+    "unpack_bitmap",
+    "IOVec",
+]
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+
+import unittest
+from array import array
+
+try:
+    from fpack import *
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.abspath(os.path.join(".", "..")))
+    from fpack import *
+
+
+class Item(Message):
+    Fields = [
+        field_factory("Name", String),
+        field_factory("Price", Uint32),
+    ]
+
+
+class Quote(Message):
+    Fields = [
+        field_factory("Bid", Int32),
+        field_factory("Ask", Int32),
+        field_factory("Size", Uint16),
+        field_factory("Flags", Uint8),
+    ]
+
+
+class Order(Message):
+    Fields = [
+        field_factory("OrderID", Uint64),
+        field_factory("Blob", Bytes),
+        field_factory("Item", Item),
+        optional_field_factory("Note", String),
+        array_field_factory("Tags", String),
+    ]
+
+
+Items = array_field_factory("Items", Item)
+Quotes = array_field_factory("Quotes", Quote)
+Orders = array_field_factory("Orders", Order)
+Prices = array_field_factory("Prices", Uint32)
+
+
+class TestColumnar(unittest.TestCase):
+    def test_unpack_columns(self):
+        items = Items([Item(Name="Camera", Price=10), Item(Name="Computer", Price=12)])
+        packed = items.pack()
+
+        columns, length = unpack_columns(Items, packed + b"trailing")
+
+        self.assertEqual(length, len(packed))
+        self.assertEqual(columns["Name"], ["Camera", "Computer"])
+        self.assertEqual(columns["Price"], array("I", [10, 12]))
+        self.assertEqual(pack_columns(Items, columns), packed)
+
+    def test_offsets(self):
+        items = Items([Item(Name="Camera", Price=10), Item(Name="", Price=12)])
+        packed = items.pack()
+
+        columns, _ = unpack_columns(Items, packed, offsets=True)
+        offsets, buffer = columns["Name"]
+
+        self.assertEqual(list(offsets), [0, 6, 6])
+        self.assertEqual(buffer, b"Camera")
+        self.assertEqual(pack_columns(Items, columns), packed)
+
+    def test_struct_fast_path(self):
+        quotes = Quotes(
+            [Quote(Bid=-i, Ask=i, Size=i * 2, Flags=i % 2) for i in range(100)]
+        )
+        packed = quotes.pack()
+
+        columns, length = unpack_columns(Quotes, packed)
+
+        self.assertEqual(length, len(packed))
+        self.assertEqual(columns["Bid"], array("i", [-i for i in range(100)]))
+        self.assertEqual(columns["Flags"], array("B", [i % 2 for i in range(100)]))
+        self.assertEqual(pack_columns(Quotes, columns), packed)
+
+    def test_primitive_array(self):
+        prices = Prices([Uint32(i) for i in range(10)])
+        packed = prices.pack()
+
+        column, _ = unpack_columns(Prices, packed)
+
+        self.assertEqual(column, array("I", range(10)))
+        self.assertEqual(pack_columns(Prices, column), packed)
+
+    def test_nested(self):
+        orders = []
+        for i in range(5):
+            order = Order(OrderID=i, Blob=bytes([i]) * i)
+            order.Item.Name = f"item{i}"
+            order.Item.Price = i
+            order.Note = "note" if i % 2 else ""
+            order.Tags = [String(str(j)) for j in range(i)]
+            orders.append(order)
+
+        packed = Orders(orders).pack()
+        columns, length = unpack_columns(Orders, packed)
+
+        self.assertEqual(length, len(packed))
+        self.assertEqual(columns["Item"]["Name"], [f"item{i}" for i in range(5)])
+        self.assertEqual(columns["Note"], ["", "note", "", "note", ""])
+        self.assertEqual(columns["Tags"][2], ["0", "1"])
+        self.assertEqual(pack_columns(Orders, columns), packed)
+
+        columns, _ = unpack_columns(Orders, packed, offsets=True)
+        self.assertEqual(pack_columns(Orders, columns), packed)
+
+    def test_empty(self):
+        packed = Quotes().pack()
+        columns, length = unpack_columns(Quotes, packed)
+
+        self.assertEqual(length, 2)
+        self.assertEqual(len(columns["Bid"]), 0)
+        self.assertEqual(pack_columns(Quotes, columns), packed)
+
+    def test_incomplete(self):
+        packed = Items([Item(Name="Camera", Price=10)]).pack()
+
+        with self.assertRaises(ValueError):
+            unpack_columns(Items, packed[:-1])
+
+    def test_fixed_array(self):
+        class Tick(Message):
+            Fields = [
+                fixed_string_field_factory("Symbol", 4),
+                fixed_array_field_factory("Levels", Double, 2),
+            ]
+
+        Ticks = fixed_array_field_factory("Ticks", Tick, 3)
+        ticks = Ticks(
+            [
+                Tick(Symbol=s, Levels=[Double(i), Double(-i)])
+                for i, s in enumerate("abc")
+            ]
+        )
+        packed = ticks.pack()
+
+        columns, length = unpack_columns(Ticks, packed)
+        self.assertEqual(length, len(packed))
+        self.assertEqual(columns["Symbol"], ["a", "b", "c"])
+        self.assertEqual(columns["Levels"][2], array("d", [2, -2]))
+        self.assertEqual(pack_columns(Ticks, columns), packed)
+
+        with self.assertRaises(ValueError):
+            pack_columns(Ticks, {"Symbol": ["a"], "Levels": [array("d", [1, 2])]})
+
+    def test_native_aligned(self):
+        class Record(Message):
+            ByteOrder = "@"
+            Fields = [
+                fixed_bytes_field_factory("A", 3),
+                field_factory("B", Int16),
+            ]
+
+        Records = array_field_factory("Records", Record)
+        records = Records([Record(A=b"xyz", B=300), Record(A=b"q", B=-1)])
+        packed = records.pack()
+        self.assertEqual(len(packed), 2 + 2 * Record.fixed_size())
+
+        columns, length = unpack_columns(Records, packed)
+        self.assertEqual(length, len(packed))
+        self.assertEqual(columns["A"], [b"xyz", b"q\x00\x00"])
+        self.assertEqual(columns["B"], array("h", [300, -1]))
+        self.assertEqual(pack_columns(Records, columns), packed)
+
+        # decoded one row at a time in nested messages
+        class Entry(Message):
+            Fields = [
+                field_factory("Name", String),
+                field_factory("Record", Record),
+            ]
+
+        Entries = array_field_factory("Entries", Entry)
+        entry = Entry(Name="e")
+        entry.Record.A, entry.Record.B = b"ab", 300
+        packed = Entries([entry]).pack()
+        columns, _ = unpack_columns(Entries, packed)
+        self.assertEqual(columns["Record"]["B"], array("h", [300]))
+        self.assertEqual(pack_columns(Entries, columns), packed)
+
+    def test_mismatched_columns(self):
+        with self.assertRaises(ValueError):
+            pack_columns(Items, {"Name": ["a", "b"], "Price": array("I", [1])})
+
+    def test_empty_nested_message(self):
+        class Empty(Message):
+            Fields = []
+
+        class Row(Message):
+            Fields = [
+                field_factory("Empty", Empty),
+                field_factory("Value", Uint8),
+            ]
+
+        Rows = array_field_factory("Rows", Row)
+        packed = Rows([Row(Value=1), Row(Value=2)]).pack()
+
+        columns, _ = unpack_columns(Rows, packed)
+        self.assertEqual(columns["Empty"], {})
+        self.assertEqual(pack_columns(Rows, columns), packed)
+
+        Empties = fixed_array_field_factory("Empties", Empty, 2)
+        self.assertEqual(pack_columns(Empties, {}), b"")
+
+    def test_extensible(self):
+        class ItemV1(Message):
+            Extensible = True
+            Fields = [field_factory("Price", Uint32)]
+
+        class ItemV2(Message):
+            Extensible = True
+            Fields = [
+                field_factory("Price", Uint32),
+                field_factory("Name", String),
+            ]
+
+        ItemsV1 = array_field_factory("ItemsV1", ItemV1)
+        ItemsV2 = array_field_factory("ItemsV2", ItemV2)
+        packed = ItemsV2([ItemV2(Price=1, Name="a"), ItemV2(Price=2)]).pack()
+
+        columns, length = unpack_columns(ItemsV1, packed)
+        self.assertEqual(length, len(packed))
+        self.assertEqual(columns["Price"], array("I", [1, 2]))
+
+        columns, _ = unpack_columns(ItemsV2, pack_columns(ItemsV1, columns))
+        self.assertEqual(columns["Name"], ["", ""])
+
+        columns, _ = unpack_columns(ItemsV2, packed)
+        self.assertEqual(pack_columns(ItemsV2, columns), packed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+import math
+import unittest
+
+try:
+    from fpack import *
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.abspath(os.path.join(".", "..")))
+    from fpack import *
+
+
+class Item(Message):
+    Fields = [
+        field_factory("Name", String),
+        field_factory("Price", Uint32),
+    ]
+
+
+class Tick(Message):
+    Fields = [
+        field_factory("Seq", Uint64),
+        field_factory("Delta", Int16),
+        field_factory("Symbol", String),
+        field_factory("Payload", Bytes),
+        field_factory("Item", Item),
+        array_field_factory("Items", Item),
+    ]
+
+
+def make_tick(seq, delta=0, symbol="AAPL", name="Camera", items=()):
+    tick = Tick(Seq=seq, Delta=delta, Symbol=symbol, Payload=b"\x01\x02")
+    tick.Item.Name = name
+    tick.Item.Price = 10
+    tick.Items = [Item(Name=x, Price=i) for i, x in enumerate(items)]
+    return tick
+
+
+class TestDelta(unittest.TestCase):
+    def assertSameMessage(self, a, b):
+        self.assertEqual(a.pack(), b.pack())
+
+    def test_roundtrip(self):
+        encoder = DeltaEncoder(Tick)
+        decoder = DeltaDecoder(Tick)
+
+        ticks = [
+            make_tick(1000),
+            make_tick(1001),
+            make_tick(1001, delta=-5),
+            make_tick(999, delta=-5, symbol="MSFT"),
+            make_tick(999, delta=-5, symbol="MSFT", name="Computer"),
+            make_tick(999, delta=-5, symbol="MSFT", items=["a", "b"]),
+            make_tick(2 ** 64 - 1, delta=32767, items=["a", "b"]),
+            make_tick(0, delta=-32768),
+        ]
+
+        for tick in ticks:
+            frame = encoder.encode(tick)
+            decoded, length = decoder.decode(frame)
+
+            self.assertEqual(length, len(frame))
+            self.assertSameMessage(decoded, tick)
+
+    def test_unchanged_frame_is_small(self):
+        encoder = DeltaEncoder(Tick)
+        tick = make_tick(1000, items=["a", "b", "c"])
+
+        keyframe = encoder.encode(tick)
+        self.assertEqual(keyframe, b"\x01" + tick.pack())
+
+        self.assertEqual(encoder.encode(tick), b"\x00\x00")
+        self.assertEqual(
+            encoder.encode(make_tick(1001, items=["a", "b", "c"])), b"\x00\x01\x02"
+        )
+
+    def test_keyframe_interval(self):
+        encoder = DeltaEncoder(Tick, keyframe_interval=3)
+        frames = [encoder.encode(make_tick(i)) for i in range(7)]
+
+        self.assertEqual([f[0] for f in frames], [1, 0, 0, 1, 0, 0, 1])
+
+    def test_without_numeric_delta(self):
+        encoder = DeltaEncoder(Tick, numeric_delta=False)
+        decoder = DeltaDecoder(Tick, numeric_delta=False)
+
+        encoder.encode(make_tick(1000))
+        frame = encoder.encode(make_tick(1001))
+        self.assertEqual(frame, b"\x00\x01" + b"\x00" * 6 + b"\x03\xe9")
+
+        encoder.reset()
+        for tick in (make_tick(1000), make_tick(1001)):
+            decoded, _ = decoder.decode(encoder.encode(tick))
+            self.assertSameMessage(decoded, tick)
+
+    def test_delta_before_keyframe(self):
+        encoder = DeltaEncoder(Tick)
+        encoder.encode(make_tick(1))
+        frame = encoder.encode(make_tick(2))
+
+        with self.assertRaises(ValueError):
+            DeltaDecoder(Tick).decode(frame)
+
+    def test_truncated_frame(self):
+        encoder = DeltaEncoder(Tick)
+        decoder = DeltaDecoder(Tick)
+        decoder.decode(encoder.encode(make_tick(1)))
+        frame = encoder.encode(make_tick(300, symbol="MSFT"))
+
+        with self.assertRaises(ValueError):
+            decoder.decode(b"")
+
+        with self.assertRaises(ValueError):
+            decoder.decode(frame[:-1])
+
+        with self.assertRaises(ValueError):
+            decoder.decode(frame[:3])
+
+    def test_negative_zero(self):
+        class Sample(Message):
+            Fields = [field_factory("Value", Double), field_factory("Ratio", Float)]
+
+        encoder = DeltaEncoder(Sample)
+        decoder = DeltaDecoder(Sample)
+
+        for value in (0.0, -0.0, -0.0, 0.0):
+            decoded, _ = decoder.decode(
+                encoder.encode(Sample(Value=value, Ratio=value))
+            )
+            self.assertEqual(decoded.pack(), Sample(Value=value, Ratio=value).pack())
+            self.assertEqual(math.copysign(1, decoded.Value), math.copysign(1, value))
+
+    def test_incompatible_type(self):
+        with self.assertRaises(TypeError):
+            DeltaEncoder(Tick).encode(Item())
+
+
+if __name__ == "__main__":
+    unittest.main()
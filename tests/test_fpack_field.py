@@ -469,6 +469,132 @@ class TestArrayField(unittest.TestCase):
         with self.assertRaises(ValueError):
             unpacked, s = StringArray.from_bytes(raw[:-1])
 
+    def test_lazy_array(self):
+        Strings = array_field_factory("Strings", String, lazy=True)
+        values = [f"item{i}" for i in range(1000)]
+        packed = Strings([String(v) for v in values]).pack()
+
+        unpacked, len_ = Strings.from_bytes(packed + b"trailing")
+        self.assertEqual(len_, len(packed))
+        self.assertEqual(len(unpacked.val), 1000)
+        self.assertEqual(unpacked.val._items, {})
+        self.assertEqual(unpacked.pack(), packed)
+        self.assertEqual(unpacked.size, len(packed))
+
+        items = iter(unpacked.val)
+        self.assertEqual([next(items).val, next(items).val], ["item0", "item1"])
+        self.assertIsNone(unpacked.val._offsets)
+        self.assertEqual(len(unpacked.val._items), 2)
+        self.assertEqual(unpacked.val[-1].val, "item999")
+        self.assertEqual(len(unpacked.val._offsets), 1001)
+        self.assertIs(unpacked.val[500], unpacked.val[500])
+        self.assertEqual([x.val for x in unpacked.val], values)
+
+        # decoded items are packed from their value
+        unpacked.val[3].val = "changed"
+        self.assertEqual(Strings.from_bytes(unpacked.pack())[0].val[3].val, "changed")
+        self.assertEqual(unpacked.size, len(packed) + len("changed") - len("item3"))
+
+        with self.assertRaises(IndexError):
+            unpacked.val[1000]
+
+        with self.assertRaises(ValueError):
+            Strings.from_bytes(packed[:-1])
+
+    def test_lazy_array_fixed_items(self):
+        Values = array_field_factory("Values", Uint32, lazy=True)
+        packed = Values([Uint32(i) for i in range(10)]).pack()
+
+        unpacked, _ = Values.from_bytes(packed)
+        self.assertEqual(unpacked.val[7].val, 7)
+        self.assertIsNone(unpacked.val._offsets)
+        self.assertEqual(list(unpacked.val._items), [7])
+        self.assertEqual(unpacked.pack(), packed)
+
+        unpacked.val = [Uint32(1)]
+        self.assertEqual(unpacked.pack(), b"\x00\x01\x00\x00\x00\x01")
+
+
+class TestFixedFields(unittest.TestCase):
+    def test_fixed_bytes(self):
+        Hash = fixed_bytes_field_factory("Hash", 4)
+
+        field = Hash(b"ab")
+        self.assertEqual(field.pack(), b"ab\x00\x00")
+        self.assertEqual(field.size, 4)
+        self.assertEqual(Hash.fixed_size(), 4)
+
+        unpacked, length = Hash.from_bytes(b"abcdef")
+        self.assertEqual(unpacked.val, b"abcd")
+        self.assertEqual(length, 4)
+
+        self.assertTrue(Hash().is_default())
+        self.assertTrue(Hash.from_bytes(b"\x00" * 4)[0].is_default())
+
+    def test_fixed_bytes_errors(self):
+        Hash = fixed_bytes_field_factory("Hash", 4)
+
+        with self.assertRaises(ValueError):
+            Hash(b"abcde").pack()
+
+        with self.assertRaises(ValueError):
+            Hash.from_bytes(b"abc")
+
+    def test_fixed_string(self):
+        Code = fixed_string_field_factory("Code", 4)
+
+        field = Code("ab")
+        self.assertEqual(field.pack(), b"ab\x00\x00")
+        self.assertEqual(str(field), '"ab"')
+
+        unpacked, length = Code.from_bytes(b"ab\x00\x00")
+        self.assertEqual(unpacked.val, "ab")
+        self.assertEqual(length, 4)
+
+        with self.assertRaises(ValueError):
+            Code("\u00e9\u00e9\u00e9").pack()
+
+    def test_fixed_array(self):
+        Doubles = fixed_array_field_factory("Doubles", Double, 4)
+
+        array = Doubles()
+        self.assertEqual(len(array), 4)
+        self.assertEqual(array.pack(), b"\x00" * 32)
+        self.assertEqual(Doubles.fixed_size(), 32)
+
+        array = Doubles([Double(x / 2) for x in range(4)])
+        packed = array.pack()
+        self.assertEqual(packed, struct.pack("!4d", 0, 0.5, 1, 1.5))
+        self.assertEqual(array.size, len(packed))
+
+        unpacked, length = Doubles.from_bytes(packed + b"trailing")
+        self.assertEqual(length, len(packed))
+        self.assertEqual([x.val for x in unpacked.val], [0, 0.5, 1, 1.5])
+
+    def test_fixed_array_variable_items(self):
+        Strings = fixed_array_field_factory("Strings", String, 2)
+        array = Strings([String("a"), String("bc")])
+        packed = array.pack()
+
+        self.assertEqual(packed, b"\x00\x01a\x00\x02bc")
+        self.assertIsNone(Strings.fixed_size())
+
+        unpacked, length = Strings.from_bytes(packed)
+        self.assertEqual(length, len(packed))
+        self.assertEqual([x.val for x in unpacked.val], ["a", "bc"])
+
+    def test_fixed_array_errors(self):
+        Doubles = fixed_array_field_factory("Doubles", Double, 4)
+
+        with self.assertRaises(ValueError):
+            Doubles([Double(1)]).pack()
+
+        with self.assertRaises(TypeError):
+            Doubles([Double(1), Double(2), Double(3), Float(4)]).pack()
+
+        with self.assertRaises(ValueError):
+            Doubles.from_bytes(b"\x00" * 31)
+
 
 class TestFieldFactory(unittest.TestCase):
     def test_field_factory(self):
@@ -483,6 +609,15 @@ class TestFieldFactory(unittest.TestCase):
         self.assertEqual(fieldClass.__name__, "TestArray")
         self.assertTrue(issubclass(fieldClass, Array))
 
+    def test_optional_field_factory(self):
+        fieldClass = optional_field_factory("Test", Uint8)
+
+        self.assertEqual(fieldClass.__name__, "Test")
+        self.assertTrue(issubclass(fieldClass, Uint8))
+        self.assertTrue(issubclass(fieldClass, Optional))
+        self.assertTrue(fieldClass().is_default())
+        self.assertFalse(fieldClass(1).is_default())
+
 
 if __name__ == "__main__":
     unittest.main()
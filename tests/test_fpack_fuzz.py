@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+
+""" Generative round-trip tests
+
+    Random message schemas are built from every field type, filled with
+    random values and run through every codec path. Failures report the
+    seed of the schema, set FPACK_FUZZ_SEED to reproduce a run. Throughput
+    gates only run when FPACK_THROUGHPUT_SCALE is set, e.g. to 1; CI runs
+    them in a separate step without coverage.
+"""
+
+import io
+import os
+import random
+import struct
+import sys
+import time
+import unittest
+
+try:
+    from fpack import *
+except ImportError:
+    sys.path.append(os.path.abspath(os.path.join(".", "..")))
+    from fpack import *
+
+SEED = int(os.environ.get("FPACK_FUZZ_SEED", "20201019"))
+SCHEMAS = 60
+INSTANCES = 4
+MAX_DEPTH = 3
+
+# minimum messages per second, scaled by FPACK_THROUGHPUT_SCALE (unset or 0
+# disables the gates, they are not meaningful under coverage or a debugger)
+THROUGHPUT_SCALE = float(os.environ.get("FPACK_THROUGHPUT_SCALE", "0"))
+MIN_THROUGHPUT = {
+    "pack": 20000,
+    "unpack": 10000,
+    "trusted": 10000,
+    "struct": 50000,
+}
+
+INTEGERS = {
+    Int8: (-(2 ** 7), 2 ** 7 - 1),
+    Uint8: (0, 2 ** 8 - 1),
+    Int16: (-(2 ** 15), 2 ** 15 - 1),
+    Uint16: (0, 2 ** 16 - 1),
+    Int32: (-(2 ** 31), 2 ** 31 - 1),
+    Uint32: (0, 2 ** 32 - 1),
+    Int64: (-(2 ** 63), 2 ** 63 - 1),
+    Uint64: (0, 2 ** 64 - 1),
+}
+PRIMITIVES = [*INTEGERS, Float, Double]
+BYTE_ORDERS = "!<>=@"
+CHECKSUMS = ("crc32", "adler32", "sha1")
+CHARS = "az09 é€\U0001f600"
+
+
+class SchemaGenerator:
+    """ Build random message classes and instances
+    """
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.count = 0
+
+    def name(self, prefix):
+        self.count += 1
+        return f"{prefix}{self.count}"
+
+    def message(self, depth=0):
+        # nested messages have fields, columns cannot count empty messages
+        count = self.rng.randint(0 if depth == 0 else 1, 5)
+        fields = [self.field(depth) for _ in range(count)]
+        attrs = {"Fields": fields}
+        if self.rng.random() < 0.3:
+            attrs["ByteOrder"] = self.rng.choice(BYTE_ORDERS)
+        if self.rng.random() < 0.2 and not any(
+            issubclass(field, Optional) for field in fields
+        ):
+            attrs["Extensible"] = True
+        if self.rng.random() < 0.2:
+            attrs["ChecksumAlgorithm"] = self.rng.choice(CHECKSUMS)
+
+        return type(self.name("Message"), (Message,), attrs)
+
+    def item_type(self, depth):
+        choice = self.rng.random()
+        if choice < 0.5:
+            return self.rng.choice(PRIMITIVES)
+        if choice < 0.7 or depth >= MAX_DEPTH:
+            return self.rng.choice([String, Bytes])
+
+        return self.message(depth + 1)
+
+    def field(self, depth):
+        name = self.name("Field")
+        choice = self.rng.randrange(9)
+
+        if choice < 3:
+            return field_factory(name, self.rng.choice(PRIMITIVES))
+        if choice == 3:
+            return field_factory(name, self.rng.choice([String, Bytes]))
+        if choice == 4:
+            factory = self.rng.choice(
+                [fixed_bytes_field_factory, fixed_string_field_factory]
+            )
+            return factory(name, self.rng.randint(0, 8))
+        if choice == 5:
+            return array_field_factory(
+                name, self.item_type(depth), lazy=self.rng.random() < 0.3
+            )
+        if choice == 6:
+            return fixed_array_field_factory(
+                name, self.item_type(depth), self.rng.randint(0, 4)
+            )
+        if choice == 7:
+            return optional_field_factory(
+                name, self.rng.choice([*PRIMITIVES, String, Bytes])
+            )
+        if depth < MAX_DEPTH:
+            return field_factory(name, self.message(depth + 1))
+
+        return field_factory(name, self.rng.choice(PRIMITIVES))
+
+    def text(self, max_length):
+        return "".join(
+            self.rng.choice(CHARS) for _ in range(self.rng.randint(0, max_length))
+        )
+
+    def value(self, field_cls):
+        """ Random value of a primitive, string or bytes field
+        """
+        rng = self.rng
+
+        if field_cls in INTEGERS or issubclass(field_cls, tuple(INTEGERS)):
+            low, high = next(
+                bounds for t, bounds in INTEGERS.items() if issubclass(field_cls, t)
+            )
+            return rng.choice([low, high, 0, rng.randint(low, high)])
+        if issubclass(field_cls, FixedString):
+            size = field_cls.STRUCT.size
+            text = self.text(size)
+            while len(text.encode("utf-8")) > size:
+                text = text[:-1]
+            return text
+        if issubclass(field_cls, FixedBytes):
+            return bytes(rng.getrandbits(8) for _ in range(rng.randint(0, 8)))[
+                : field_cls.STRUCT.size
+            ]
+        if issubclass(field_cls, (Float, Double)):
+            return rng.choice([0.0, -1.5, rng.uniform(-1e6, 1e6)])
+        if issubclass(field_cls, String):
+            return self.text(8)
+        if issubclass(field_cls, Bytes):
+            return bytes(rng.getrandbits(8) for _ in range(rng.randint(0, 16)))
+
+        raise TypeError(field_cls.__name__)
+
+    def item(self, field_cls):
+        if issubclass(field_cls, Message):
+            return self.fill(field_cls())
+
+        return field_cls(self.value(field_cls))
+
+    def fill(self, msg):
+        for field_cls in msg.Fields:
+            name = field_cls.__name__
+
+            if issubclass(field_cls, Message):
+                self.fill(getattr(msg, name))
+            elif issubclass(field_cls, Array):
+                count = getattr(field_cls, "COUNT", None)
+                if count is None:
+                    count = self.rng.randint(0, 4)
+                setattr(msg, name, [self.item(field_cls.TYPE) for _ in range(count)])
+            elif issubclass(field_cls, Optional) and self.rng.random() < 0.5:
+                continue
+            else:
+                setattr(msg, name, self.value(field_cls))
+
+        return msg
+
+
+def _reference_pack(msg):
+    """ Pack a message field by field, without the message level fast paths
+    """
+    if msg._optional is not None:
+        return msg.pack()
+
+    if msg._struct is not None:
+        # fields are padded by the struct in native aligned byte order
+        body = msg._struct.pack(*msg._struct_values())
+    else:
+        body = b"".join(
+            _reference_pack(field) if isinstance(field, Message) else field.pack()
+            for field in msg._fields.values()
+        )
+    if msg._envelope is not None:
+        body = msg._envelope.pack(len(body)) + body
+    if msg._checksum is not None:
+        return body + msg._trailer(body)
+
+    return body
+
+
+class TestFuzz(unittest.TestCase):
+    def schemas(self):
+        """ Yield (seed, generator, message class) of the random schemas
+        """
+        for seed in range(SEED, SEED + SCHEMAS):
+            generator = SchemaGenerator(random.Random(seed))
+            yield (seed, generator, generator.message())
+
+    def check_codecs(self, msg):
+        cls = msg.__class__
+        packed = msg.pack()
+
+        self.assertEqual(len(packed), msg.size)
+        self.assertEqual(packed, _reference_pack(msg))
+        self.assertEqual(cls.validate(packed), len(packed))
+
+        for trusted in (False, True):
+            decoded, len_ = cls.from_bytes(packed, trusted=trusted)
+            self.assertEqual(len_, len(packed))
+            self.assertEqual(decoded.pack(), packed)
+
+        decoded, len_ = cls.from_bytes(packed + b"\xff\x00")
+        self.assertEqual(len_, len(packed))
+        self.assertEqual(decoded.pack(), msg.pack())
+
+        frozen, _ = cls.from_bytes(packed, frozen=True)
+        self.assertEqual(frozen.pack(), packed)
+
+        values, len_ = cls.decode_to_dict(packed)
+        self.assertEqual(len_, len(packed))
+        self.assertEqual(values, decoded.to_dict())
+        self.assertEqual(cls.encode_from_dict(values), packed)
+        self.assertEqual(cls.encode_from_dict(msg.to_dict()), packed)
+        self.assertEqual(cls.from_dict(values).pack(), packed)
+        self.assertEqual(len(decoded.to_tuple()), len(cls.Fields))
+
+        self.assertEqual(b"".join(msg.pack_iov(threshold=16)), packed)
+        self.assertEqual(b"".join(msg.pack_iov()), packed)
+
+        streamed, len_ = read_message(cls, io.BytesIO(packed + b"\xff"))
+        self.assertEqual(len_, len(packed))
+        self.assertEqual(streamed.pack(), packed)
+
+        buf = bytearray(len(packed) + 3)
+        self.assertEqual(msg.pack_into(buf, 3), len(packed))
+        self.assertEqual(bytes(buf[3:]), packed)
+
+        if cls.fixed_size() is not None:
+            self.assertEqual(cls.fixed_size(), len(packed))
+            if not cls._checksummed:
+                self.assertEqual(cls.view_struct(packed).pack(), packed)
+
+        if cls._checksum is not None:
+            self.assertEqual(msg.digest(), packed[-cls._checksum_size :])
+
+        return packed
+
+    def check_truncated(self, cls, packed, rng):
+        cuts = set(rng.sample(range(len(packed)), min(len(packed), 8)))
+        for cut in cuts:
+            with self.assertRaises(ValueError):
+                cls.from_bytes(packed[:cut])
+            with self.assertRaises(ValueError):
+                cls.validate(packed[:cut])
+
+    def check_corrupted(self, cls, packed, rng):
+        # every byte of a message with a checksum is covered by its trailer
+        corrupted = bytearray(packed)
+        corrupted[rng.randrange(len(packed))] ^= 1 << rng.randrange(8)
+
+        with self.assertRaises(ValueError):
+            cls.from_bytes(corrupted)
+        with self.assertRaises(ValueError):
+            cls.validate(corrupted)
+        with self.assertRaises(ValueError):
+            read_message(cls, io.BytesIO(corrupted))
+
+    def test_round_trip(self):
+        for seed, generator, cls in self.schemas():
+            with self.subTest(seed=seed):
+                for _ in range(INSTANCES):
+                    msg = generator.fill(cls())
+                    packed = self.check_codecs(msg)
+                    self.check_truncated(cls, packed, generator.rng)
+                    if cls._checksum is not None:
+                        self.check_corrupted(cls, packed, generator.rng)
+
+    def test_default_round_trip(self):
+        for seed, _, cls in self.schemas():
+            with self.subTest(seed=seed):
+                self.check_codecs(cls())
+
+    def test_encode_cache(self):
+        for seed, generator, cls in self.schemas():
+            with self.subTest(seed=seed):
+                msg = generator.fill(cls())
+                msg.enable_cache()
+
+                self.assertEqual(msg.pack(), _reference_pack(msg))
+                generator.fill(msg)
+                self.assertEqual(msg.pack(), _reference_pack(msg))
+
+    def test_columns(self):
+        for seed, generator, cls in self.schemas():
+            with self.subTest(seed=seed):
+                msg = generator.fill(cls())
+
+                for field in msg._fields.values():
+                    if not isinstance(field, Array):
+                        continue
+
+                    array_cls = field.__class__
+                    packed = field.pack()
+                    for offsets in (False, True):
+                        columns, len_ = unpack_columns(
+                            array_cls, packed, offsets=offsets
+                        )
+                        self.assertEqual(len_, len(packed))
+                        self.assertEqual(pack_columns(array_cls, columns), packed)
+
+    def test_delta(self):
+        for seed, generator, cls in self.schemas():
+            with self.subTest(seed=seed):
+                encoder = DeltaEncoder(cls, keyframe_interval=3)
+                decoder = DeltaDecoder(cls)
+
+                for _ in range(INSTANCES * 2):
+                    msg = generator.fill(cls())
+                    frame = encoder.encode(msg)
+                    decoded, len_ = decoder.decode(frame)
+                    self.assertEqual(len_, len(frame))
+                    self.assertEqual(decoded.pack(), msg.pack())
+
+    def test_prefix_limits(self):
+        class Limits(Message):
+            Fields = [
+                field_factory("Data", Bytes),
+                field_factory("Text", String),
+                array_field_factory("Items", Uint8),
+            ]
+
+        text = "é" * 32767 + "a"
+        msg = Limits(
+            Data=b"\xff" * 65535,
+            Text=text,
+            Items=[Uint8(i % 256) for i in range(65535)],
+        )
+        packed = self.check_codecs(msg)
+        self.assertEqual(len(packed), 3 * (2 + 65535))
+
+        decoded, _ = Limits.from_bytes(packed)
+        self.assertEqual(decoded.Text, text)
+        self.check_truncated(Limits, packed, random.Random(SEED))
+
+        for name, value in (
+            ("Data", b"\xff" * 65536),
+            ("Text", "é" * 32768),
+            ("Items", [Uint8()] * 65536),
+        ):
+            with self.subTest(field=name), self.assertRaises(struct.error):
+                Limits(**{name: value}).pack()
+
+
+@unittest.skipUnless(THROUGHPUT_SCALE, "set FPACK_THROUGHPUT_SCALE to enable")
+class TestThroughput(unittest.TestCase):
+    """ Offline throughput regression gates
+
+        Opt-in: thresholds are far below the expected throughput so that only
+        large regressions fail, scale them with FPACK_THROUGHPUT_SCALE. Gates
+        are skipped while a tracer (coverage, debugger) is active.
+    """
+
+    DURATION = 0.1
+
+    class Order(Message):
+        Fields = [
+            field_factory("OrderID", Uint64),
+            field_factory("Symbol", String),
+            field_factory("Price", Double),
+            field_factory("Quantity", Uint32),
+            array_field_factory("Tags", String),
+        ]
+
+    class Tick(Message):
+        Fields = [
+            field_factory("Seq", Uint64),
+            field_factory("Bid", Double),
+            field_factory("Ask", Double),
+            field_factory("Size", Uint32),
+        ]
+
+    def setUp(self):
+        if sys.gettrace() is not None:
+            self.skipTest("tracer active")
+
+    def rate(self, func):
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < self.DURATION:
+            for _ in range(100):
+                func()
+            count += 100
+
+        return count / (time.perf_counter() - start)
+
+    def assertThroughput(self, name, func):
+        minimum = MIN_THROUGHPUT[name] * THROUGHPUT_SCALE
+        rate = self.rate(func)
+        self.assertGreaterEqual(
+            rate, minimum, f"{name}: {rate:.0f} msg/s, expect {minimum:.0f} msg/s"
+        )
+
+    def test_throughput(self):
+        order = self.Order(
+            OrderID=1, Symbol="AAPL", Price=1.5, Quantity=10, Tags=[String("a")]
+        )
+        packed = order.pack()
+
+        self.assertThroughput("pack", order.pack)
+        self.assertThroughput("unpack", lambda: self.Order.from_bytes(packed))
+        self.assertThroughput(
+            "trusted", lambda: self.Order.from_bytes(packed, trusted=True)
+        )
+
+    def test_struct_throughput(self):
+        tick = self.Tick(Seq=1, Bid=1.5, Ask=1.75, Size=100)
+        packed = tick.pack()
+
+        self.assertThroughput("struct", lambda: self.Tick.from_bytes(packed))
@@ -1,11 +1,16 @@
 #!/usr/bin/env python
 
+import hashlib
+import os
+import socket
+import struct
 import unittest
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     from fpack import *
 except ImportError:
-    import os
     import sys
 
     sys.path.append(os.path.abspath(os.path.join(".", "..")))
@@ -104,3 +109,1210 @@ class TestMessage(unittest.TestCase):
         self.assertEqual(catalog.CatalogID, 1)
         self.assertEqual(catalog.Item.Name, "Computer")
         self.assertEqual(catalog.Item.Price, 100)
+
+    def test_optional_fields(self):
+        class Header(Message):
+            Fields = [
+                field_factory("Subject", String),
+                field_factory("Priority", Uint8),
+            ]
+
+        class Config(Message):
+            Fields = [
+                field_factory("Version", Uint8),
+                optional_field_factory("Timeout", Uint32),
+                optional_field_factory("Name", String),
+                optional_field_factory("Blob", Bytes),
+                optional_field_factory("Header", Header),
+                optional_field_factory("Tags", array_field_factory("Tags", String)),
+            ]
+
+        config = Config(Version=1)
+        packed = config.pack()
+
+        self.assertEqual(packed, b"\x00\x01")
+        self.assertEqual(config.size, len(packed))
+
+        msg, len_ = Config.from_bytes(packed)
+        self.assertEqual(len_, len(packed))
+        self.assertEqual(msg.Version, 1)
+        self.assertEqual(msg.Timeout, 0)
+        self.assertEqual(msg.Name, "")
+        self.assertTrue(msg.Header.is_default())
+
+        config.Timeout = 30
+        config.Header.Priority = 3
+        config.Tags = [String("a")]
+        packed = config.pack()
+
+        self.assertEqual(
+            packed, b"\x19\x01\x00\x00\x00\x1e\x00\x00\x03\x00\x01\x00\x01a",
+        )
+        self.assertEqual(config.size, len(packed))
+
+        msg, len_ = Config.from_bytes(packed)
+        self.assertEqual(len_, len(packed))
+        self.assertEqual(msg.Timeout, 30)
+        self.assertEqual(msg.Header.Priority, 3)
+        self.assertEqual(msg.Tags[0].val, "a")
+
+    def test_optional_fields_reset_on_unpack(self):
+        class Config(Message):
+            Fields = [
+                optional_field_factory("Timeout", Uint32),
+                optional_field_factory("Name", String),
+            ]
+
+        msg = Config(Timeout=30, Name="x")
+        msg.unpack(Config(Name="y").pack())
+
+        self.assertEqual(msg.Timeout, 0)
+        self.assertEqual(msg.Name, "y")
+
+    def test_optional_negative_zero(self):
+        class Reading(Message):
+            Fields = [optional_field_factory("Value", Double)]
+
+        self.assertEqual(Reading(Value=0.0).pack(), b"\x00")
+
+        packed = Reading(Value=-0.0).pack()
+        self.assertEqual(packed, b"\x01" + struct.pack("!d", -0.0))
+        self.assertEqual(Reading.from_bytes(packed)[0].pack(), packed)
+
+        Readings = array_field_factory("Readings", Reading)
+        columns, _ = unpack_columns(Readings, Readings([Reading(Value=-0.0)]).pack())
+        self.assertEqual(pack_columns(Readings, columns), b"\x00\x01" + packed)
+
+    def test_optional_fields_undersized(self):
+        class Config(Message):
+            Fields = [optional_field_factory("Timeout", Uint32)]
+
+        with self.assertRaises(ValueError):
+            Config.from_bytes(b"")
+
+        with self.assertRaises(ValueError):
+            Config.from_bytes(b"\x01\x00")
+
+    def test_validate(self):
+        class Item(Message):
+            Fields = [
+                field_factory("Name", String),
+                field_factory("Price", Uint32),
+                field_factory("Tag", Bytes),
+            ]
+
+        class Catalog(Message):
+            Fields = [
+                field_factory("CatalogID", Uint8),
+                array_field_factory("Items", Item),
+                optional_field_factory("Note", String),
+            ]
+
+        catalog = Catalog(
+            CatalogID=1, Items=[Item(Name="Camera", Price=10, Tag=b"\x01")]
+        )
+        packed = catalog.pack()
+
+        self.assertEqual(Catalog.validate(packed), len(packed))
+        self.assertEqual(Catalog.validate(packed + b"garbage"), len(packed))
+
+        for i in range(len(packed)):
+            with self.assertRaises(ValueError):
+                Catalog.validate(packed[:i])
+
+    def test_validate_does_not_decode(self):
+        created = []
+
+        class Item(Message):
+            Fields = [field_factory("Name", String)]
+
+            def __init__(self, *args, **kwargs):
+                created.append(self)
+                super().__init__(*args, **kwargs)
+
+        ItemArray = array_field_factory("Items", Item)
+
+        class Catalog(Message):
+            Fields = [ItemArray]
+
+        packed = b"\x00\x02\x00\x01a\x00\x01b"
+        self.assertEqual(Catalog.validate(packed), len(packed))
+        self.assertEqual(created, [])
+
+    def test_trusted_unpack(self):
+        class Item(Message):
+            Fields = [
+                field_factory("Name", String),
+                field_factory("Price", Uint32),
+                field_factory("Tag", Bytes),
+            ]
+
+        class Catalog(Message):
+            Fields = [
+                field_factory("CatalogID", Uint8),
+                array_field_factory("Items", Item),
+                optional_field_factory("Note", String),
+                optional_field_factory("Count", Uint16),
+                field_factory("Item", Item),
+            ]
+
+        catalog = Catalog(
+            CatalogID=1,
+            Items=[Item(Name="Camera", Price=10, Tag=b"\x01"), Item(Name="Pen")],
+            Count=2,
+        )
+        catalog.Item.Name = "Computer"
+        packed = catalog.pack()
+
+        Catalog.validate(packed)
+        msg, len_ = Catalog.from_bytes(packed, trusted=True)
+
+        self.assertEqual(len_, len(packed))
+        self.assertEqual(msg.pack(), packed)
+        self.assertEqual(msg.Items[0].Name, "Camera")
+        self.assertEqual(msg.Item.Name, "Computer")
+        self.assertEqual(msg.Note, "")
+        self.assertEqual(msg.Count, 2)
+
+    def test_frozen_message(self):
+        class Item(Message):
+            Fields = [
+                field_factory("Name", String),
+                field_factory("Price", Uint32),
+            ]
+
+        class Catalog(Message):
+            Fields = [
+                field_factory("CatalogID", Uint8),
+                field_factory("Item", Item),
+                array_field_factory("Items", Item),
+            ]
+
+        catalog = Catalog(CatalogID=1, Items=[Item(Name="Camera", Price=10)])
+        packed = catalog.pack()
+
+        frozen, len_ = Catalog.from_bytes(packed, frozen=True)
+        self.assertEqual(len_, len(packed))
+        self.assertTrue(frozen.frozen)
+        self.assertTrue(frozen.Item.frozen)
+        self.assertTrue(frozen.Items[0].frozen)
+        self.assertEqual(frozen.pack(), packed)
+        self.assertNotEqual(frozen, catalog)
+
+        with self.assertRaises(AttributeError):
+            frozen.CatalogID = 2
+
+        with self.assertRaises(AttributeError):
+            frozen.Item.Name = "Computer"
+
+        with self.assertRaises(AttributeError):
+            frozen.Items.append(Item())
+
+        with self.assertRaises(AttributeError):
+            frozen.unpack(packed)
+
+        # mutable messages are compared and hashed by identity
+        copy = Catalog.from_bytes(packed)[0]
+        self.assertNotEqual(copy, catalog)
+        self.assertEqual(len({catalog, copy, catalog}), 2)
+        self.assertEqual({catalog: 1}[catalog], 1)
+
+        self.assertEqual(hash(frozen), hash(copy.freeze()))
+        self.assertEqual(frozen, copy)
+        self.assertEqual(len({frozen, catalog.freeze()}), 1)
+
+        # primitive items of arrays are frozen as well
+        Values = array_field_factory("Values", Uint32)
+
+        class Series(Message):
+            Fields = [Values, array_field_factory("Rows", Values)]
+
+        series = Series(Values=[Uint32(1)], Rows=[Values([Uint32(2)])]).freeze()
+        with self.assertRaises(AttributeError):
+            series.Values[0].val = 99
+        with self.assertRaises(AttributeError):
+            series.Rows[0].val[0].val = 99
+        with self.assertRaises(AttributeError):
+            series.Rows[0].val = []
+        self.assertIsInstance(series.Values[0], Uint32)
+        self.assertEqual(series.Values[0].val, 1)
+        self.assertEqual(series.thaw().pack(), series.pack())
+
+    def test_thaw(self):
+        class Item(Message):
+            Fields = [
+                field_factory("Name", String),
+                field_factory("Price", Uint32),
+            ]
+
+        class Catalog(Message):
+            Fields = [
+                field_factory("CatalogID", Uint8),
+                array_field_factory("Items", Item),
+            ]
+
+        frozen = Catalog(CatalogID=1, Items=[Item(Name="Camera")]).freeze()
+        thawed = frozen.thaw()
+
+        self.assertFalse(thawed.frozen)
+        self.assertEqual(thawed.pack(), frozen.pack())
+
+        thawed.CatalogID = 2
+        thawed.Items.append(Item(Name="Computer"))
+
+        self.assertEqual(frozen.CatalogID, 1)
+        self.assertEqual(len(frozen.Items), 1)
+        self.assertNotEqual(thawed.pack(), frozen.pack())
+
+    def test_array_default_not_shared(self):
+        class Catalog(Message):
+            Fields = [array_field_factory("Items", Uint8)]
+
+        a, b = Catalog(), Catalog()
+        a.Items.append(Uint8(1))
+
+        self.assertEqual(len(b.Items), 0)
+
+    def test_frozen_concurrent_pack(self):
+        class Item(Message):
+            Fields = [
+                field_factory("Name", String),
+                field_factory("Price", Uint32),
+            ]
+
+        class Catalog(Message):
+            Fields = [
+                field_factory("CatalogID", Uint8),
+                array_field_factory("Items", Item),
+            ]
+
+        messages = [
+            Catalog(
+                CatalogID=i, Items=[Item(Name=str(j), Price=j) for j in range(i)]
+            ).freeze()
+            for i in range(16)
+        ]
+        golden = [msg.pack() for msg in messages]
+
+        def worker(seed):
+            results = []
+            for i in range(2000):
+                msg = messages[(seed + i) % len(messages)]
+                results.append((msg.pack(), msg.thaw().pack(), hash(msg)))
+            return seed, results
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for seed, results in executor.map(worker, range(8)):
+                for i, (packed, thawed, hash_) in enumerate(results):
+                    msg = messages[(seed + i) % len(messages)]
+                    self.assertEqual(packed, golden[(seed + i) % len(messages)])
+                    self.assertEqual(thawed, packed)
+                    self.assertEqual(hash_, hash(msg))
+
+    def test_pack_iov(self):
+        class Item(Message):
+            Fields = [
+                field_factory("Name", String),
+                field_factory("Blob", Bytes),
+            ]
+
+        class Envelope(Message):
+            Fields = [
+                field_factory("MsgID", Uint8),
+                field_factory("Payload", Bytes),
+                field_factory("Seq", Uint32),
+                array_field_factory("Items", Item),
+                optional_field_factory("Note", String),
+            ]
+
+        payload = os.urandom(4096)
+        blob = os.urandom(2048)
+        msg = Envelope(
+            MsgID=1,
+            Payload=payload,
+            Seq=2,
+            Items=[Item(Name="a", Blob=b"small"), Item(Name="b", Blob=blob)],
+        )
+
+        segments = msg.pack_iov()
+        self.assertEqual(b"".join(segments), msg.pack())
+        self.assertEqual(len(segments), 4)
+        self.assertIs(segments[1], payload)
+        self.assertIs(segments[3], blob)
+
+        segments = msg.pack_iov(threshold=1 << 16)
+        self.assertEqual(segments, [msg.pack()])
+
+        frozen = msg.freeze()
+        self.assertEqual(b"".join(frozen.pack_iov()), frozen.pack())
+
+    def test_pack_iov_sendmsg(self):
+        class Envelope(Message):
+            Fields = [
+                field_factory("MsgID", Uint8),
+                field_factory("Payload", Bytes),
+            ]
+
+        msg = Envelope(MsgID=1, Payload=b"x" * 2048)
+        packed = msg.pack()
+
+        a, b = socket.socketpair()
+        with a, b:
+            self.assertEqual(a.sendmsg(msg.pack_iov()), len(packed))
+
+            received = b""
+            while len(received) < len(packed):
+                received += b.recv(len(packed))
+
+        self.assertEqual(received, packed)
+
+        r, w = os.pipe()
+        try:
+            self.assertEqual(os.writev(w, msg.pack_iov()), len(packed))
+            self.assertEqual(os.read(r, len(packed)), packed)
+        finally:
+            os.close(r)
+            os.close(w)
+
+    def test_pack_into(self):
+        class Item(Message):
+            Fields = [
+                field_factory("Name", String),
+                field_factory("Blob", Bytes),
+            ]
+
+        class Envelope(Message):
+            Fields = [
+                field_factory("MsgID", Uint8),
+                field_factory("Seq", Uint32),
+                array_field_factory("Items", Item),
+                optional_field_factory("Note", String),
+                field_factory("Item", Item),
+            ]
+
+        msg = Envelope(MsgID=1, Seq=2, Items=[Item(Name="a", Blob=b"\x01")])
+        msg.Item.Name = "b"
+        packed = msg.pack()
+
+        buf = bytearray(len(packed) + 4)
+        self.assertEqual(msg.pack_into(buf, 2), len(packed))
+        self.assertEqual(bytes(buf[2:-2]), packed)
+        self.assertEqual(bytes(buf[:2] + buf[-2:]), b"\x00" * 4)
+
+        frozen = msg.freeze()
+        self.assertEqual(frozen.pack_into(buf), len(packed))
+        self.assertEqual(bytes(buf[: len(packed)]), packed)
+
+    def test_pack_into_too_small(self):
+        class Hello(Message):
+            Fields = [
+                field_factory("MsgID", Uint8),
+                field_factory("Greetings", String),
+                field_factory("Seq", Uint32),
+            ]
+
+        msg = Hello(MsgID=1, Greetings="helloworld", Seq=2)
+        size = len(msg.pack())
+
+        for i in range(size):
+            with self.assertRaises(ValueError):
+                msg.pack_into(bytearray(i))
+
+            buf = bytearray(size)
+            with self.assertRaises(ValueError):
+                msg.pack_into(buf, size - i + 1)
+            self.assertEqual(len(buf), size)
+
+    def test_encode_cache(self):
+        class Header(Message):
+            Fields = [
+                field_factory("Subject", String),
+                field_factory("Priority", Uint8),
+            ]
+
+        class Item(Message):
+            Fields = [
+                field_factory("Name", String),
+                field_factory("Price", Uint32),
+            ]
+
+        class Mail(Message):
+            Fields = [
+                field_factory("Header", Header),
+                field_factory("Seq", Uint32),
+                array_field_factory("Items", Item),
+            ]
+
+        def reference(msg):
+            return msg.thaw().disable_cache().pack()
+
+        mail = Mail(Seq=1, Items=[Item(Name="Camera", Price=10)])
+        mail.Header.Subject = "hello"
+        mail.enable_cache()
+
+        packed = mail.pack()
+        self.assertIs(mail.pack(), packed)
+        self.assertIs(mail.Header.pack(), mail.Header.pack())
+        self.assertEqual(mail.size, len(packed))
+
+        header = mail.Header.pack()
+        mail.Seq = 2
+        self.assertIs(mail.Header.pack(), header)
+        self.assertEqual(mail.pack(), reference(mail))
+        self.assertNotEqual(mail.pack(), packed)
+
+        packed = mail.pack()
+        mail.Header.Priority = 3
+        self.assertNotEqual(mail.pack(), packed)
+        self.assertEqual(
+            mail.Header.Priority, Mail.from_bytes(mail.pack())[0].Header.Priority
+        )
+
+        packed = mail.pack()
+        mail.Items[0].Price = 12
+        self.assertNotEqual(mail.pack(), packed)
+        self.assertEqual(
+            mail.Items[0].Price, Mail.from_bytes(mail.pack())[0].Items[0].Price
+        )
+
+        packed = mail.pack()
+        mail.Items.append(Item(Name="Computer"))
+        self.assertNotEqual(mail.pack(), packed)
+        self.assertEqual(len(Mail.from_bytes(mail.pack())[0].Items), 2)
+
+        packed = mail.pack()
+        mail.Items[1].Name = "Pen"
+        self.assertEqual(Mail.from_bytes(mail.pack())[0].Items[1].Name, "Pen")
+
+        mail.Items = [Item(Name="Book")]
+        decoded = Mail.from_bytes(mail.pack())[0]
+        self.assertEqual(decoded.Items[0].Name, "Book")
+
+        mail.Items[0].Price = 7
+        self.assertEqual(Mail.from_bytes(mail.pack())[0].Items[0].Price, 7)
+
+        other = Mail(Seq=9)
+        mail.unpack(other.pack())
+        self.assertEqual(mail.pack(), other.pack())
+
+        self.assertEqual(b"".join(mail.pack_iov()), reference(mail))
+        buf = bytearray(mail.size)
+        mail.pack_into(buf)
+        self.assertEqual(bytes(buf), reference(mail))
+
+    def test_encode_cache_trusted(self):
+        class Inner(Message):
+            Fields = [field_factory("A", Uint8)]
+
+        class Outer(Message):
+            Fields = [
+                field_factory("I", Inner),
+                field_factory("Name", String),
+            ]
+
+        other = Outer(Name="b")
+        other.I.A = 2
+        other = other.pack()
+
+        for kwargs in ({"trusted": True}, {"limits": DecodeLimits(max_size=64)}):
+            outer = Outer(Name="a").enable_cache()
+            outer.I.A = 1
+            outer.pack()
+            outer.unpack(other, **kwargs)
+            self.assertEqual(outer.I.A, 2)
+            self.assertEqual(outer.pack(), other)
+
+            outer.I.freeze()
+            with self.assertRaises(AttributeError):
+                outer.unpack(Outer(Name="c").pack(), **kwargs)
+
+    def test_encode_cache_shared(self):
+        class Item(Message):
+            Fields = [field_factory("Name", String)]
+
+        class Cart(Message):
+            Fields = [array_field_factory("Items", Item)]
+
+        item = Item(Name="hdr")
+        first = Cart(Items=[item]).enable_cache()
+        second = Cart(Items=[item]).enable_cache()
+        packed = first.pack(), second.pack()
+
+        item.Name = "changed"
+        self.assertNotEqual(first.pack(), packed[0])
+        self.assertNotEqual(second.pack(), packed[1])
+        self.assertEqual(Cart.from_bytes(first.pack())[0].Items[0].Name, "changed")
+        self.assertEqual(Cart.from_bytes(second.pack())[0].Items[0].Name, "changed")
+
+        del first
+        item.Name = "again"
+        self.assertEqual(Cart.from_bytes(second.pack())[0].Items[0].Name, "again")
+
+    def test_encode_cache_aliasing(self):
+        class Item(Message):
+            Fields = [field_factory("Name", String)]
+
+        class Cart(Message):
+            Fields = [array_field_factory("Items", Item)]
+
+        items = [Item(Name="Pen")]
+        cart = Cart(Items=items).enable_cache()
+        self.assertIsNot(cart.Items, items)
+        packed = cart.pack()
+
+        # the cached message holds a tracked copy of the list
+        items.append(Item(Name="Book"))
+        self.assertIs(cart.pack(), packed)
+
+        cart.Items.append(Item(Name="Book"))
+        self.assertEqual(len(Cart.from_bytes(cart.pack())[0].Items), 2)
+
+        items = [Item(Name="Cup")]
+        cart.Items = items
+        self.assertIsNot(cart.Items, items)
+        cart.Items.append(Item(Name="Mug"))
+        self.assertEqual(len(Cart.from_bytes(cart.pack())[0].Items), 2)
+
+    def test_encode_cache_disabled(self):
+        class Hello(Message):
+            Fields = [field_factory("MsgID", Uint8)]
+
+        hello = Hello(MsgID=1)
+        hello.enable_cache()
+        hello.pack()
+        hello.disable_cache()
+        hello.MsgID = 2
+        self.assertEqual(hello.pack(), b"\x02")
+
+    def test_fixed_layout(self):
+        class Quote(Message):
+            Fields = [
+                field_factory("Seq", Uint64),
+                fixed_string_field_factory("Symbol", 4),
+                fixed_bytes_field_factory("Hash", 8),
+                field_factory("Price", Double),
+                field_factory("Flags", Uint8),
+            ]
+
+        class Book(Message):
+            Fields = [
+                field_factory("BookID", Uint16),
+                field_factory("Quote", Quote),
+                fixed_array_field_factory("Levels", Int32, 4),
+            ]
+
+        class Variable(Message):
+            Fields = [field_factory("Name", String)]
+
+        self.assertEqual(Quote.fixed_size(), 8 + 4 + 8 + 8 + 1)
+        self.assertEqual(Book.fixed_size(), 2 + Quote.fixed_size() + 16)
+        self.assertIsNone(Variable.fixed_size())
+
+        self.assertEqual(Quote.field_offset("Price"), 20)
+        self.assertEqual(Book.field_offset("Levels"), 2 + Quote.fixed_size())
+
+        with self.assertRaises(TypeError):
+            Variable.field_offset("Name")
+
+        book = Book(BookID=1, Levels=[Int32(-i) for i in range(4)])
+        book.Quote.Seq = 7
+        book.Quote.Symbol = "AAPL"
+        book.Quote.Hash = b"\x01" * 8
+        book.Quote.Price = 1.5
+
+        packed = book.pack()
+        self.assertEqual(len(packed), Book.fixed_size())
+        self.assertEqual(book.size, Book.fixed_size())
+        self.assertEqual(
+            packed[Book.field_offset("Quote") :][: Quote.fixed_size()],
+            book.Quote.pack(),
+        )
+
+        decoded, len_ = Book.from_bytes(packed)
+        self.assertEqual(len_, len(packed))
+        self.assertEqual(decoded.Quote.Symbol, "AAPL")
+        self.assertEqual(decoded.Quote.Price, 1.5)
+        self.assertEqual([x.val for x in decoded.Levels], [0, -1, -2, -3])
+
+        trusted, _ = Book.from_bytes(packed, trusted=True)
+        self.assertEqual(trusted.pack(), decoded.pack())
+        self.assertEqual(Book.validate(packed), len(packed))
+
+        with self.assertRaises(ValueError):
+            Book.validate(packed[:-1])
+
+        with self.assertRaises(ValueError):
+            Quote.from_bytes(packed[2:-1][: Quote.fixed_size() - 1])
+
+        buf = bytearray(len(packed))
+        self.assertEqual(book.pack_into(buf), len(packed))
+        self.assertEqual(bytes(buf), packed)
+        self.assertEqual(b"".join(book.pack_iov()), packed)
+
+    def test_struct_codec_matches_fields(self):
+        class Quote(Message):
+            Fields = [
+                field_factory("Bid", Int32),
+                field_factory("Ask", Uint64),
+                field_factory("Flags", Int8),
+                field_factory("Price", Float),
+            ]
+
+        quote = Quote(Bid=-1, Ask=2, Flags=-3, Price=0.5)
+        reference = b"".join(f.pack() for f in quote._fields.values())
+
+        self.assertIsNotNone(Quote._struct)
+        self.assertEqual(quote.pack(), reference)
+        self.assertEqual(Quote.from_bytes(reference)[0].Flags, -3)
+
+    def test_byte_order(self):
+        class Point(Message):
+            ByteOrder = "<"
+            Fields = [
+                field_factory("X", Int32),
+                field_factory("Y", Uint16),
+                field_factory("Scale", Double),
+            ]
+
+        class Shape(Message):
+            ByteOrder = "<"
+            Fields = [
+                field_factory("Name", String),
+                field_factory("Origin", Point),
+                array_field_factory("Points", Point),
+                fixed_array_field_factory("Tags", Uint16, 2),
+            ]
+
+        point = Point(X=-2, Y=3, Scale=0.5)
+        self.assertEqual(point.pack(), struct.pack("<iHd", -2, 3, 0.5))
+
+        # array items are instances of the little endian item class
+        Tags = Shape.Fields[3]
+        self.assertIsNot(Tags.TYPE, Uint16)
+        shape = Shape(
+            Name="a", Points=[point, point], Tags=[Tags.TYPE(1), Tags.TYPE(2)]
+        )
+        shape.Origin.X, shape.Origin.Y, shape.Origin.Scale = -2, 3, 0.5
+        packed = shape.pack()
+        self.assertEqual(
+            packed,
+            struct.pack("<H", 1)
+            + b"a"
+            + point.pack()
+            + struct.pack("<H", 2)
+            + point.pack() * 2
+            + struct.pack("<HH", 1, 2),
+        )
+
+        decoded, len_ = Shape.from_bytes(packed)
+        self.assertEqual(len_, len(packed))
+        self.assertEqual(decoded.pack(), shape.pack())
+        self.assertEqual(Shape.from_bytes(packed, trusted=True)[0].pack(), packed)
+        self.assertEqual(b"".join(shape.pack_iov()), packed)
+
+        # fields keep their network byte order outside of the message
+        self.assertEqual(Uint16(1).pack(), b"\x00\x01")
+
+    def test_byte_order_base_items(self):
+        class Item(Message):
+            Fields = [
+                field_factory("Name", String),
+                field_factory("Price", Uint32),
+            ]
+
+        class Cart(Message):
+            ByteOrder = "<"
+            Fields = [
+                array_field_factory("Items", Item),
+                array_field_factory("Counts", Uint32),
+                fixed_array_field_factory("Pair", Uint16, 2),
+            ]
+
+        # instances of the item classes are encoded through their variants
+        cart = Cart(
+            Items=[Item(Name="a", Price=5)], Counts=[Uint32(5)], Pair=[Uint16(1)] * 2
+        )
+        packed = cart.pack()
+        self.assertEqual(
+            packed,
+            struct.pack("<HH", 1, 1) + b"a" + struct.pack("<IHIHH", 5, 1, 5, 1, 1),
+        )
+        self.assertEqual(cart.size, len(packed))
+        self.assertEqual(b"".join(cart.pack_iov()), packed)
+        buf = bytearray(len(packed))
+        cart.pack_into(buf)
+        self.assertEqual(bytes(buf), packed)
+
+        decoded = Cart.from_bytes(packed)[0]
+        self.assertEqual(decoded.Items[0].Price, 5)
+        self.assertEqual(decoded.Counts[0].val, 5)
+
+        cart.Counts = [Uint16(5)]
+        with self.assertRaises(TypeError):
+            cart.pack()
+
+    def test_byte_order_aligned(self):
+        class Native(Message):
+            ByteOrder = "@"
+            Fields = [
+                field_factory("Flags", Uint8),
+                field_factory("Value", Uint32),
+                field_factory("Count", Uint16),
+            ]
+
+        msg = Native(Flags=1, Value=2, Count=3)
+        self.assertEqual(msg.pack(), struct.pack("@BIH", 1, 2, 3))
+        self.assertEqual(Native.fixed_size(), struct.calcsize("@BIH"))
+        self.assertEqual(Native.field_offset("Value"), struct.calcsize("@BxxxI") - 4)
+        self.assertEqual(Native.field_offset("Count"), struct.calcsize("@BI"))
+        self.assertEqual(Native.from_bytes(msg.pack())[0].pack(), msg.pack())
+
+    def test_with_byte_order(self):
+        class Inner(Message):
+            Fields = [field_factory("Value", Uint32)]
+
+        class Outer(Message):
+            Fields = [
+                field_factory("Inner", Inner),
+                field_factory("Data", Bytes),
+            ]
+
+        Little = with_byte_order(Outer, "<")
+        self.assertIs(with_byte_order(Outer, "<"), Little)
+        self.assertIs(with_byte_order(Outer, "!"), Outer)
+        self.assertIs(with_byte_order(Uint8, "<"), Uint8)
+        self.assertEqual(Little.__name__, "Outer")
+
+        msg = Little(Data=b"xy")
+        msg.Inner.Value = 1
+        self.assertEqual(msg.pack(), struct.pack("<IH", 1, 2) + b"xy")
+
+        big = Outer(Data=b"xy")
+        big.Inner.Value = 1
+        self.assertEqual(big.pack(), struct.pack("!IH", 1, 2) + b"xy")
+
+        with self.assertRaises(ValueError):
+            with_byte_order(Outer, "little")
+
+    def test_view_struct(self):
+        class Quote(Message):
+            Fields = [
+                field_factory("Seq", Uint32),
+                fixed_string_field_factory("Symbol", 4),
+                field_factory("Price", Double),
+            ]
+
+        class Book(Message):
+            Fields = [
+                field_factory("BookID", Uint16),
+                field_factory("Quote", Quote),
+                fixed_array_field_factory("Levels", Int32, 3),
+                fixed_array_field_factory("Quotes", Quote, 2),
+            ]
+
+        book = Book(BookID=1, Levels=[Int32(i) for i in range(3)])
+        book.Quote.Symbol = "AAPL"
+        book.Quote.Price = 1.5
+        buf = bytearray(b"\xff" + book.pack())
+
+        view = Book.view_struct(buf, 1)
+        self.assertEqual(view.BookID, 1)
+        self.assertEqual(view.Quote.Symbol, "AAPL")
+        self.assertEqual(view.Quote.Price, 1.5)
+        self.assertEqual(list(view.Levels), [0, 1, 2])
+        self.assertEqual(view.Levels[-1], 2)
+        self.assertEqual(len(view.Quotes), 2)
+        self.assertEqual(view.pack(), book.pack())
+
+        view.BookID = 7
+        view.Quote.Seq = 9
+        view.Quote.Symbol = "MSFT"
+        view.Levels[1] = -5
+        view.Quotes[1].Price = 2.5
+        view.Levels = [Int32(3), 4, 5]
+
+        decoded = Book.from_bytes(buf[1:])[0]
+        self.assertEqual(decoded.BookID, 7)
+        self.assertEqual(decoded.Quote.Seq, 9)
+        self.assertEqual(decoded.Quote.Symbol, "MSFT")
+        self.assertEqual([x.val for x in decoded.Levels], [3, 4, 5])
+        self.assertEqual(decoded.Quotes[1].Price, 2.5)
+        self.assertEqual(view.unpack().pack(), decoded.pack())
+        self.assertEqual(buf[0], 0xFF)
+
+        quote = Quote(Seq=3, Symbol="IBM", Price=0.25)
+        view.Quotes[0] = quote
+        self.assertEqual(view.Quotes[0].pack(), quote.pack())
+
+        view.Quote = quote
+        self.assertEqual(view.Quote.pack(), quote.pack())
+        self.assertEqual(Book.from_bytes(buf[1:])[0].Quote.Symbol, "IBM")
+
+        with self.assertRaises(IndexError):
+            view.Levels[3]
+
+        with self.assertRaises(ValueError):
+            view.Levels = [1, 2]
+
+        with self.assertRaises(ValueError):
+            view.BookID = -1
+
+        with self.assertRaises(TypeError):
+            view.Quote = book
+
+        with self.assertRaises(AttributeError):
+            view.Unknown = 1
+
+    def test_view_struct_invalid(self):
+        class Variable(Message):
+            Fields = [field_factory("Name", String)]
+
+        class Fixed(Message):
+            Fields = [field_factory("Value", Uint32)]
+
+        with self.assertRaises(TypeError):
+            Variable.view_struct(b"\x00" * 8)
+
+        with self.assertRaises(ValueError):
+            Fixed.view_struct(b"\x00" * 4, 1)
+
+        view = Fixed.view_struct(b"\x00\x00\x00\x01")
+        self.assertEqual(view.Value, 1)
+
+        with self.assertRaises(TypeError):
+            view.Value = 2
+
+    def test_view_struct_byte_order(self):
+        class Native(Message):
+            ByteOrder = "@"
+            Fields = [
+                field_factory("Flags", Uint8),
+                field_factory("Value", Uint32),
+            ]
+
+        buf = bytearray(Native.fixed_size())
+        view = Native.view_struct(buf)
+        view.Flags = 1
+        view.Value = 2
+        self.assertEqual(bytes(buf), struct.pack("@BI", 1, 2))
+
+    def test_lazy_array(self):
+        class Item(Message):
+            Fields = [
+                field_factory("Name", String),
+                field_factory("Price", Uint32),
+            ]
+
+        class Catalog(Message):
+            Fields = [
+                array_field_factory("Items", Item, lazy=True),
+                field_factory("Total", Uint32),
+            ]
+
+        catalog = Catalog(
+            Items=[Item(Name=str(i), Price=i) for i in range(100)], Total=100
+        )
+        packed = catalog.pack()
+
+        for trusted in (False, True):
+            decoded, len_ = Catalog.from_bytes(packed, trusted=trusted)
+            self.assertEqual(len_, len(packed))
+            self.assertEqual(decoded.Total, 100)
+            self.assertEqual(len(decoded.Items), 100)
+            self.assertEqual(decoded.Items[42].Name, "42")
+            self.assertEqual(decoded.pack(), catalog.pack())
+            self.assertEqual(b"".join(decoded.pack_iov()), packed)
+
+        self.assertEqual(Catalog.from_bytes(packed, frozen=True)[0].pack(), packed)
+
+        # items of frozen lazy arrays are frozen
+        frozen = Catalog.from_bytes(packed, frozen=True)[0]
+        self.assertTrue(frozen.Items[3].frozen)
+        with self.assertRaises(AttributeError):
+            frozen.Items[3].Name = "changed"
+        decoded = Catalog.from_bytes(packed)[0]
+        decoded.Items[5]
+        self.assertTrue(decoded.freeze().Items[5].frozen)
+
+        # items of cached lazy arrays invalidate the cache
+        cached = Catalog.from_bytes(packed)[0]
+        cached.Items[1]
+        cached.enable_cache()
+        packed = cached.pack()
+        cached.Items[1].Name = "first"
+        cached.Items[7].Name = "seventh"
+        self.assertNotEqual(cached.pack(), packed)
+        decoded = Catalog.from_bytes(cached.pack())[0]
+        self.assertEqual(decoded.Items[1].Name, "first")
+        self.assertEqual(decoded.Items[7].Name, "seventh")
+
+    def test_decode_limits(self):
+        class Inner(Message):
+            Fields = [field_factory("Data", Bytes)]
+
+        class Outer(Message):
+            Fields = [
+                field_factory("Name", String),
+                array_field_factory("Items", Inner),
+            ]
+
+        msg = Outer(Name="abc", Items=[Inner(Data=b"x" * 100) for _ in range(10)])
+        packed = msg.pack()
+
+        for limits in (
+            DecodeLimits(max_size=len(packed) - 1),
+            DecodeLimits(max_array_count=9),
+            DecodeLimits(max_field_length=99),
+        ):
+            with self.assertRaises(ValueError):
+                Outer.from_bytes(packed, limits=limits)
+            with self.assertRaises(ValueError):
+                Outer.validate(packed, limits=limits)
+
+        limits = DecodeLimits(
+            max_size=len(packed), max_array_count=10, max_field_length=100
+        )
+        decoded, len_ = Outer.from_bytes(packed + b"trailing", limits=limits)
+        self.assertEqual(len_, len(packed))
+        self.assertEqual(decoded.pack(), msg.pack())
+        self.assertEqual(Outer.validate(packed, limits=limits), len(packed))
+
+        with self.assertRaises(ValueError):
+            Outer.from_bytes(packed[:-1], limits=limits)
+
+        # the array count is rejected before its items are checked
+        forged = b"\x00\x00\xff\xff"
+        with self.assertRaises(ValueError) as cm:
+            Outer.validate(forged, limits=DecodeLimits(max_array_count=10))
+        self.assertIn("exceeds limit", str(cm.exception))
+
+    def test_extensible(self):
+        class ItemV1(Message):
+            Extensible = True
+            Fields = [
+                field_factory("Name", String),
+                field_factory("Price", Uint32),
+            ]
+
+        class ItemV2(Message):
+            Extensible = True
+            Fields = [
+                field_factory("Name", String),
+                field_factory("Price", Uint32),
+                field_factory("Stock", Uint16),
+                array_field_factory("Tags", String),
+            ]
+
+        class OrderV1(Message):
+            Fields = [
+                array_field_factory("Items", ItemV1),
+                field_factory("Total", Uint32),
+            ]
+
+        class OrderV2(Message):
+            Fields = [
+                array_field_factory("Items", ItemV2),
+                field_factory("Total", Uint32),
+            ]
+
+        v1 = ItemV1(Name="camera", Price=10)
+        v2 = ItemV2(Name="camera", Price=10, Stock=3, Tags=[String("new")])
+        self.assertEqual(
+            v1.pack(), b"\x00\x00\x00\x0c" + b"\x00\x06camera" + bytes(3) + b"\n"
+        )
+        self.assertEqual(v1.size, len(v1.pack()))
+        self.assertIsNone(ItemV1.fixed_size())
+
+        # older readers skip the new fields
+        for trusted in (False, True):
+            old, len_ = ItemV1.from_bytes(v2.pack() + b"trailing", trusted=trusted)
+            self.assertEqual(len_, len(v2.pack()))
+            self.assertEqual((old.Name, old.Price), ("camera", 10))
+
+        # newer readers default the missing fields
+        new = ItemV2(Stock=9, Tags=[String("x")])
+        self.assertEqual(new.unpack(v1.pack()), len(v1.pack()))
+        self.assertEqual(
+            (new.Name, new.Price, new.Stock, new.Tags), ("camera", 10, 0, [])
+        )
+        self.assertEqual(ItemV2.from_bytes(v1.pack(), trusted=True)[0].Stock, 0)
+
+        order = OrderV2(Items=[v2, v2], Total=20)
+        packed = order.pack()
+        self.assertEqual(OrderV1.validate(packed), len(packed))
+        old, len_ = OrderV1.from_bytes(packed)
+        self.assertEqual(len_, len(packed))
+        self.assertEqual(old.Total, 20)
+        self.assertEqual(old.Items[1].Name, "camera")
+
+        self.assertEqual(b"".join(order.pack_iov()), packed)
+        buf = bytearray(len(packed))
+        self.assertEqual(order.pack_into(buf), len(packed))
+        self.assertEqual(bytes(buf), packed)
+
+        # fields must end within the envelope
+        truncated = b"\x00\x00\x00\x03" + v1.pack()[4:]
+        for data in (truncated, v1.pack()[:-1], b"\x00\x00"):
+            with self.assertRaises(ValueError):
+                ItemV1.from_bytes(data)
+            with self.assertRaises(ValueError):
+                ItemV1.validate(data)
+
+        with self.assertRaises(TypeError):
+
+            class Invalid(Message):
+                Extensible = True
+                Fields = [optional_field_factory("Note", String)]
+
+    def test_checksum(self):
+        class Point(Message):
+            ChecksumAlgorithm = "crc32"
+            Fields = [field_factory("X", Int16), field_factory("Y", Int16)]
+
+        point = Point(X=1, Y=-1)
+        body = b"\x00\x01\xff\xff"
+        self.assertEqual(point.pack(), body + struct.pack("!I", zlib.crc32(body)))
+        self.assertEqual(point.digest(), point.pack()[-4:])
+        self.assertEqual(Point.fixed_size(), 8)
+        self.assertEqual(point.size, 8)
+
+        corrupted = b"\x00\x02" + point.pack()[2:]
+        for data in (corrupted, point.pack()[:-1]):
+            with self.assertRaises(ValueError):
+                Point.from_bytes(data)
+            with self.assertRaises(ValueError):
+                Point.validate(data)
+            with self.assertRaises(ValueError):
+                Point.from_bytes(data, limits=DecodeLimits())
+
+        # trusted data is not verified
+        self.assertEqual(Point.from_bytes(corrupted, trusted=True)[0].X, 2)
+
+        with self.assertRaises(TypeError):
+            Point.view_struct(point.pack())
+        with self.assertRaises(TypeError):
+            Message().digest()
+        with self.assertRaises(ValueError):
+
+            class Invalid(Message):
+                ChecksumAlgorithm = "shake_128"
+
+    def test_checksum_nested(self):
+        class Blob(Message):
+            ChecksumAlgorithm = "sha256"
+            Fields = [field_factory("Data", Bytes)]
+
+            packs = 0
+
+            def _pack(self):
+                Blob.packs += 1
+                return super()._pack()
+
+        BlobArray = array_field_factory("Blobs", Blob)
+
+        class Store(Message):
+            ChecksumAlgorithm = "adler32"
+            Fields = [BlobArray, field_factory("Version", Uint32)]
+
+        blobs = [Blob(Data=bytes([i]) * 2000) for i in range(3)]
+        store = Store(Blobs=blobs, Version=1)
+        store.enable_cache()
+        packed = store.pack()
+
+        self.assertEqual(Blob.packs, 3)
+        self.assertEqual(packed[-4:], struct.pack("!I", zlib.adler32(packed[:-4])))
+        self.assertEqual(
+            blobs[0].digest(), hashlib.sha256(blobs[0].pack()[:-32]).digest()
+        )
+
+        # unchanged blobs are packed from their kept bytes and digests
+        store.Version = 2
+        blobs[1].Data = b"changed"
+        packed = store.pack()
+        self.assertEqual(Blob.packs, 4)
+        self.assertEqual(Store.from_bytes(packed)[0].Blobs[1].Data, b"changed")
+
+        self.assertEqual(b"".join(store.disable_cache().pack_iov(threshold=16)), packed)
+        buf = bytearray(len(packed))
+        self.assertEqual(store.pack_into(buf), len(packed))
+        self.assertEqual(bytes(buf), packed)
+
+        # nested checksums are verified as well, the array starts the store
+        corrupted = bytearray(packed)
+        corrupted[10] ^= 1
+        for data in (bytes(corrupted), BlobArray(blobs).pack()[:-1]):
+            with self.assertRaises(ValueError):
+                BlobArray.from_bytes(data)
+        with self.assertRaises(ValueError):
+            Store.from_bytes(bytes(corrupted), limits=DecodeLimits())
+
+    def test_plain_values(self):
+        class Point(Message):
+            Fields = [field_factory("X", Int16), field_factory("Y", Int16)]
+
+        class Shape(Message):
+            Fields = [
+                field_factory("Name", String),
+                Point,
+                array_field_factory("Vertices", Point),
+                array_field_factory("Tags", Uint8),
+                optional_field_factory("Note", String),
+                fixed_string_field_factory("Code", 4),
+            ]
+
+        values = {
+            "Name": "triangle",
+            "Point": {"X": 1, "Y": 2},
+            "Vertices": [{"X": 0, "Y": 0}, {"X": 3, "Y": -4}],
+            "Tags": [7, 8],
+            "Note": "",
+            "Code": "tri",
+        }
+        shape = Shape.from_dict(values)
+        packed = shape.pack()
+
+        self.assertEqual(shape.Point.Y, 2)
+        self.assertEqual(shape.to_dict(), values)
+        self.assertEqual(
+            shape.to_tuple(),
+            ("triangle", (1, 2), [(0, 0), (3, -4)], [7, 8], "", "tri"),
+        )
+        self.assertEqual(Point(X=5).to_dict(), {"X": 5, "Y": 0})
+
+        self.assertEqual(Shape.encode_from_dict(values), packed)
+        self.assertEqual(
+            Shape.decode_to_dict(packed + b"trailing"), (values, len(packed))
+        )
+
+        # missing and None values are defaulted
+        self.assertEqual(Shape.encode_from_dict({}), Shape().pack())
+        self.assertEqual(Shape.encode_from_dict({"Point": None}), Shape().pack())
+        self.assertEqual(
+            Shape.from_dict({"Note": "n"}).pack(),
+            Shape.encode_from_dict({"Note": "n"}),
+        )
+        self.assertEqual(
+            Point.encode_from_dict({"Y": 1}), Point.from_dict({"Y": 1}).pack()
+        )
+
+        with self.assertRaises(ValueError):
+            Shape.decode_to_dict(packed[:-1])
+        with self.assertRaises(ValueError):
+            Shape.decode_to_dict(packed, limits=DecodeLimits(max_array_count=1))
+
+    def test_plain_values_aligned(self):
+        class Record(Message):
+            ByteOrder = "@"
+            Fields = [
+                fixed_bytes_field_factory("A", 3),
+                field_factory("B", Int16),
+            ]
+
+        packed = Record(A=b"xyz", B=300).pack()
+        self.assertEqual(len(packed), struct.calcsize("@3sh"))
+
+        values, len_ = Record.decode_to_dict(packed)
+        self.assertEqual(values, {"A": b"xyz", "B": 300})
+        self.assertEqual(len_, len(packed))
+        self.assertEqual(Record.encode_from_dict(values), packed)
+        self.assertEqual(Record.encode_from_dict({}), Record().pack())
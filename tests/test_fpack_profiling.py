@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+import unittest
+
+try:
+    from fpack import *
+    from fpack.profiling import _Profiler
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.abspath(os.path.join(".", "..")))
+    from fpack import *
+    from fpack.profiling import _Profiler
+
+
+class Item(Message):
+    Extensible = True
+    Fields = [
+        field_factory("Name", String),
+        field_factory("Price", Uint32),
+    ]
+
+
+class Tick(Message):
+    Fields = [
+        field_factory("Bid", Double),
+        field_factory("Ask", Double),
+    ]
+
+
+class Catalog(Message):
+    Fields = [
+        field_factory("CatalogID", Uint64),
+        array_field_factory("Items", Item),
+        field_factory("Tick", Tick),
+        optional_field_factory("Note", String),
+        fixed_array_field_factory("Levels", Uint16, 2),
+    ]
+
+
+def _catalog(n):
+    return Catalog(
+        CatalogID=1,
+        Items=[Item(Name="x" * i, Price=i) for i in range(n)],
+        Levels=[Uint16(1), Uint16(2)],
+    )
+
+
+class TestProfile(unittest.TestCase):
+    def test_profile(self):
+        samples = [_catalog(3).pack(), _catalog(5).pack()]
+        entries = profile(Catalog, samples, repeat=2)
+        by_path = {entry["path"]: entry for entry in entries}
+
+        self.assertEqual(
+            set(by_path),
+            {
+                "Catalog",
+                "Catalog.CatalogID",
+                "Catalog.Items",
+                "Catalog.Items[]",
+                "Catalog.Items[].Name",
+                "Catalog.Items[].Price",
+                "Catalog.Tick",
+                "Catalog.Levels",
+            },
+        )
+        self.assertEqual(by_path["Catalog"]["calls"], 4)
+        self.assertEqual(by_path["Catalog.Items[].Name"]["calls"], 16)
+        self.assertTrue(all(entry["unpack_ns"] >= 0 for entry in entries))
+
+        costs = [entry["unpack_ns"] + entry["pack_ns"] for entry in entries]
+        self.assertEqual(costs, sorted(costs, reverse=True))
+
+        report = format_profile(entries)
+        self.assertTrue(report.startswith("path"))
+        self.assertIn("Catalog.Items[].Name", report)
+
+    def test_trace_memory(self):
+        samples = [_catalog(10).pack()]
+
+        entries = profile(Catalog, samples, trace_memory=False)
+        self.assertTrue(all(entry["unpack_alloc"] == 0 for entry in entries))
+
+        entries = profile(Catalog, samples)
+        by_path = {entry["path"]: entry for entry in entries}
+        self.assertGreater(by_path["Catalog.Items[].Name"]["unpack_alloc"], 0)
+
+    def test_replay_matches_codec(self):
+        profiler = _Profiler(lambda: 0)
+        msg = _catalog(4)
+        msg.Note = "note"
+        packed = msg.pack()
+
+        decoded, length = profiler.decode(
+            Catalog, memoryview(packed), 0, "Catalog", "unpack_ns"
+        )
+        self.assertEqual(length, len(packed))
+        self.assertEqual(decoded.pack(), msg.pack())
+        self.assertEqual(profiler.encode(msg, "Catalog", "pack_ns"), packed)
+
+    def test_invalid_sample(self):
+        with self.assertRaises(ValueError):
+            profile(Catalog, [_catalog(1).pack()[:-1]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+import multiprocessing
+import os
+import subprocess
+import sys
+import unittest
+
+try:
+    from fpack import *
+except ImportError:
+    sys.path.append(os.path.abspath(os.path.join(".", "..")))
+    from fpack import *
+
+try:
+    from fpack.shm import RingBuffer
+except ImportError:
+    # multiprocessing.shared_memory requires python 3.8
+    RingBuffer = None
+
+
+class Tick(Message):
+    Fields = [
+        field_factory("Seq", Uint64),
+        field_factory("Symbol", String),
+        field_factory("Payload", Bytes),
+    ]
+
+
+def produce(name, count):
+    with RingBuffer(Tick, name=name, create=False) as ring:
+        for i in range(count):
+            ring.send(Tick(Seq=i, Symbol=f"S{i}", Payload=bytes(i % 64)))
+
+
+@unittest.skipIf(RingBuffer is None, "requires multiprocessing.shared_memory")
+class TestRingBuffer(unittest.TestCase):
+    def setUp(self):
+        self.ring = RingBuffer(Tick, slots=4, slot_size=128)
+
+    def tearDown(self):
+        self.ring.close()
+        self.ring.unlink()
+
+    def test_send_recv(self):
+        msg = Tick(Seq=1, Symbol="AAPL", Payload=b"\x01\x02")
+
+        self.assertTrue(self.ring.send(msg))
+        self.assertEqual(len(self.ring), 1)
+
+        received = self.ring.recv(block=False)
+        self.assertEqual(received.pack(), msg.pack())
+        self.assertEqual(len(self.ring), 0)
+        self.assertIsNone(self.ring.recv(block=False))
+        self.assertIsNone(self.ring.recv(timeout=0.01))
+
+    def test_batch(self):
+        msgs = [Tick(Seq=i, Symbol=str(i)) for i in range(5)]
+
+        self.assertTrue(self.ring.send_batch(msgs))
+        self.assertEqual(
+            [m.pack() for m in self.ring.recv_batch(block=False)],
+            [m.pack() for m in msgs],
+        )
+        self.assertEqual(self.ring.recv_batch(block=False), [])
+
+    def test_full(self):
+        for i in range(4):
+            self.assertTrue(self.ring.send(Tick(Seq=i), block=False))
+
+        self.assertFalse(self.ring.send(Tick(Seq=4), block=False))
+        self.assertFalse(self.ring.send(Tick(Seq=4), timeout=0.01))
+
+        self.assertEqual(self.ring.recv().Seq, 0)
+        self.assertTrue(self.ring.send(Tick(Seq=4), block=False))
+
+        self.assertEqual([self.ring.recv().Seq for _ in range(4)], [1, 2, 3, 4])
+
+    def test_oversized(self):
+        with self.assertRaises(ValueError):
+            self.ring.send(Tick(Payload=bytes(256)))
+
+        self.assertEqual(len(self.ring), 0)
+        self.assertTrue(self.ring.send(Tick(Seq=1)))
+        self.assertEqual(self.ring.recv().Seq, 1)
+
+    def test_attach(self):
+        with RingBuffer(Tick, name=self.ring.name, create=False) as other:
+            self.assertEqual(other.slots, 4)
+            self.assertEqual(other.slot_size, 128)
+
+            self.ring.send(Tick(Seq=7))
+            self.assertEqual(other.recv().Seq, 7)
+
+    def test_attach_unrelated_process(self):
+        # a process not started by multiprocessing has its own resource
+        # tracker, which must not unlink the block when the process exits
+        script = (
+            "import sys\n"
+            "from fpack import *\n"
+            "from fpack.shm import RingBuffer\n"
+            "class Tick(Message):\n"
+            "    Fields = [field_factory('Seq', Uint64),\n"
+            "              field_factory('Symbol', String),\n"
+            "              field_factory('Payload', Bytes)]\n"
+            "with RingBuffer(Tick, name=sys.argv[1], create=False) as ring:\n"
+            "    ring.send(Tick(Seq=42))\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=root)
+        result = subprocess.run(
+            [sys.executable, "-c", script, self.ring.name],
+            env=env,
+            capture_output=True,
+            timeout=60,
+        )
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertNotIn(b"leaked", result.stderr)
+        self.assertEqual(self.ring.recv(timeout=10).Seq, 42)
+
+        with RingBuffer(Tick, name=self.ring.name, create=False) as other:
+            self.assertEqual(other.slots, 4)
+
+    def test_cross_process(self):
+        count = 100
+        process = multiprocessing.Process(target=produce, args=(self.ring.name, count))
+        process.start()
+
+        try:
+            for i in range(count):
+                msg = self.ring.recv(timeout=10)
+                self.assertEqual(msg.Seq, i)
+                self.assertEqual(msg.Symbol, f"S{i}")
+                self.assertEqual(msg.Payload, bytes(i % 64))
+        finally:
+            process.join()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+import unittest
+
+try:
+    from fpack import *
+    from fpack import stats
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.abspath(os.path.join(".", "..")))
+    from fpack import *
+    from fpack import stats
+
+
+class Item(Message):
+    Fields = [
+        field_factory("Name", String),
+        field_factory("Price", Uint32),
+    ]
+
+
+class Catalog(Message):
+    Fields = [
+        field_factory("CatalogID", Uint8),
+        array_field_factory("Items", Item),
+    ]
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        stats.reset()
+
+    def tearDown(self):
+        stats.disable()
+        stats.reset()
+
+    def test_disabled_by_default(self):
+        pack = Message.__dict__["pack"]
+
+        self.assertFalse(stats.is_enabled())
+        Catalog(CatalogID=1).pack()
+        self.assertEqual(stats.snapshot(), {})
+
+        stats.enable()
+        self.assertTrue(stats.is_enabled())
+        self.assertIsNot(Message.__dict__["pack"], pack)
+
+        stats.disable()
+        self.assertFalse(stats.is_enabled())
+        self.assertIs(Message.__dict__["pack"], pack)
+
+    def test_counters(self):
+        stats.enable()
+
+        catalog = Catalog(CatalogID=1, Items=[Item(Name="Camera", Price=10)])
+        packed = catalog.pack()
+        Catalog.from_bytes(packed)
+
+        with self.assertRaises(ValueError):
+            Catalog.from_bytes(packed[:-1])
+
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot["Catalog"]["pack"]["calls"], 1)
+        self.assertEqual(snapshot["Catalog"]["pack"]["bytes"], len(packed))
+        self.assertEqual(snapshot["Catalog"]["from_bytes"]["calls"], 2)
+        self.assertEqual(snapshot["Catalog"]["from_bytes"]["errors"], 1)
+        self.assertEqual(snapshot["Catalog"]["from_bytes"]["bytes"], len(packed))
+        self.assertEqual(snapshot["Items"]["pack"]["calls"], 1)
+        self.assertEqual(snapshot["Items"]["unpack"]["calls"], 2)
+        self.assertEqual(snapshot["Item"]["pack"]["calls"], 1)
+
+        quantiles = snapshot["Catalog"]["pack"]["quantiles"]
+        self.assertEqual(set(quantiles), set(stats.QUANTILES))
+        self.assertLessEqual(
+            quantiles[0.5], snapshot["Catalog"]["pack"]["time_ns"],
+        )
+
+    def test_nested_message_names(self):
+        class Person(Message):
+            Fields = [field_factory("Name", String)]
+
+        class Mail(Message):
+            Fields = [
+                field_factory("Sender", Person),
+                field_factory("Receiver", Person),
+            ]
+
+        class Ack(Message):
+            Fields = [field_factory("Sender", Uint8)]
+
+        stats.enable()
+        Mail().pack()
+        with_byte_order(Mail, "<")().pack()
+        Ack().pack()
+
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot["Person"]["pack"]["calls"], 4)
+        self.assertEqual(snapshot["Mail"]["pack"]["calls"], 2)
+        self.assertEqual(snapshot["Ack"]["pack"]["calls"], 1)
+        self.assertNotIn("Sender", snapshot)
+        self.assertNotIn("Receiver", snapshot)
+
+    def test_prometheus(self):
+        stats.enable()
+        Catalog(CatalogID=1).pack()
+
+        text = stats.to_prometheus()
+        self.assertIn("# TYPE fpack_calls_total counter", text)
+        self.assertIn('fpack_calls_total{message="Catalog",op="pack"} 1', text)
+        self.assertIn('fpack_bytes_total{message="Catalog",op="pack"} 3', text)
+        self.assertIn(
+            'fpack_duration_seconds_count{message="Catalog",op="pack"} 1', text
+        )
+        self.assertTrue(text.endswith("\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
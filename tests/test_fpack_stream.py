@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+import io
+import unittest
+
+try:
+    from fpack import *
+except ImportError:
+    import os
+    import sys
+
+    sys.path.append(os.path.abspath(os.path.join(".", "..")))
+    from fpack import *
+
+
+class Attachment(Message):
+    Fields = [
+        field_factory("Name", String),
+        field_factory("Data", Bytes),
+    ]
+
+
+class Mail(Message):
+    Fields = [
+        field_factory("MailID", Uint32),
+        field_factory("Subject", String),
+        optional_field_factory("Flags", Uint8),
+        field_factory("Body", Bytes),
+        array_field_factory("Attachments", Attachment),
+        fixed_array_field_factory("Checksum", Uint16, 2),
+    ]
+
+
+class SlowStream(io.BytesIO):
+    """ Stream returning at most 3 bytes per read
+    """
+
+    def read(self, n=-1):
+        return super().read(min(n, 3))
+
+
+def _mail():
+    return Mail(
+        MailID=7,
+        Subject="hello",
+        Body=b"b" * 1000,
+        Attachments=[
+            Attachment(Name="a.txt", Data=b"a" * 300),
+            Attachment(Name="b.txt", Data=b"b" * 200),
+        ],
+        Checksum=[Uint16(1), Uint16(2)],
+    )
+
+
+class TestStream(unittest.TestCase):
+    def test_read_message(self):
+        mail = _mail()
+        packed = mail.pack()
+
+        for stream in (io.BytesIO(packed + b"next"), SlowStream(packed)):
+            msg, length = read_message(Mail, stream)
+            self.assertEqual(length, len(packed))
+            self.assertEqual(msg.pack(), mail.pack())
+
+        self.assertEqual(stream.read(), b"")
+
+    def test_sinks(self):
+        mail = _mail()
+        body = io.BytesIO()
+        chunks = []
+
+        msg, length = read_message(
+            Mail,
+            io.BytesIO(mail.pack()),
+            sinks={"Body": body, "Attachments.Data": chunks.append},
+            chunk_size=128,
+        )
+
+        self.assertEqual(length, len(mail.pack()))
+        self.assertEqual(body.getvalue(), b"b" * 1000)
+        self.assertEqual(b"".join(chunks), b"a" * 300 + b"b" * 200)
+        self.assertTrue(all(len(chunk) <= 128 for chunk in chunks))
+        self.assertIsNone(msg.Body)
+        self.assertIsNone(msg.Attachments[0].Data)
+        self.assertEqual(msg.Attachments[1].Name, "b.txt")
+        self.assertEqual(msg.Subject, "hello")
+        self.assertEqual([x.val for x in msg.Checksum], [1, 2])
+
+    def test_incomplete(self):
+        packed = _mail().pack()
+
+        for cut in (0, 3, 10, len(packed) - 1):
+            with self.assertRaises(ValueError):
+                read_message(Mail, io.BytesIO(packed[:cut]))
+
+    def test_limits(self):
+        packed = _mail().pack()
+
+        with self.assertRaises(ValueError):
+            read_message(Mail, io.BytesIO(packed), limits=DecodeLimits(max_size=100))
+
+        with self.assertRaises(ValueError):
+            read_message(
+                Mail, io.BytesIO(packed), limits=DecodeLimits(max_field_length=999)
+            )
+
+        with self.assertRaises(ValueError):
+            read_message(
+                Mail, io.BytesIO(packed), limits=DecodeLimits(max_array_count=1)
+            )
+
+        # the limit applies to streamed fields too
+        with self.assertRaises(ValueError):
+            read_message(
+                Mail,
+                io.BytesIO(packed),
+                sinks={"Body": io.BytesIO()},
+                limits=DecodeLimits(max_field_length=999),
+            )
+
+        msg, _ = read_message(
+            Mail,
+            io.BytesIO(packed),
+            limits=DecodeLimits(
+                max_size=len(packed), max_field_length=1000, max_array_count=2
+            ),
+        )
+        self.assertEqual(msg.pack(), _mail().pack())
+
+    def test_extensible(self):
+        class HeaderV1(Message):
+            Extensible = True
+            Fields = [field_factory("Kind", Uint8)]
+
+        class HeaderV2(Message):
+            Extensible = True
+            Fields = [
+                field_factory("Kind", Uint8),
+                field_factory("Data", Bytes),
+            ]
+
+        packed = HeaderV2(Kind=1, Data=b"x" * 100).pack()
+
+        msg, length = read_message(HeaderV1, io.BytesIO(packed), chunk_size=16)
+        self.assertEqual(length, len(packed))
+        self.assertEqual(msg.Kind, 1)
+
+        msg, length = read_message(HeaderV2, io.BytesIO(HeaderV1(Kind=2).pack()))
+        self.assertEqual((msg.Kind, msg.Data), (2, b""))
+
+
+if __name__ == "__main__":
+    unittest.main()
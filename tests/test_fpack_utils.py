@@ -4,13 +4,13 @@ import io
 import unittest
 
 try:
-    from fpack.utils import get_length
+    from fpack.utils import IOVec, get_length
 except ImportError:
     import os
     import sys
 
     sys.path.append(os.path.abspath(os.path.join(".", "..")))
-    from fpack.utils import get_length
+    from fpack.utils import IOVec, get_length
 
 
 class TestGetLength(unittest.TestCase):
@@ -47,5 +47,22 @@ class TestGetLength(unittest.TestCase):
         self.assertEqual(get_length({"hello": "world"}), 1)
 
 
+class TestIOVec(unittest.TestCase):
+    def test_iovec_coalesce(self):
+        large = b"x" * 16
+        iov = IOVec(threshold=16)
+        iov.write(b"ab")
+        iov.write(b"cd")
+        iov.write(large)
+        iov.write(b"ef")
+
+        segments = iov.getvalue()
+        self.assertEqual(segments, [b"abcd", large, b"ef"])
+        self.assertIs(segments[1], large)
+
+    def test_iovec_empty(self):
+        self.assertEqual(IOVec().getvalue(), [])
+
+
 if __name__ == "__main__":
     unittest.main()